@@ -0,0 +1,75 @@
+import os
+import time
+import logging
+
+# 워커별 입장 제어와 단계적 성능 저하(degradation tier)
+# - 세션 수가 MAX_SESSIONS_PER_WORKER 에 도달하면 새 /ws_stats 연결을 재시도 안내(1013)와 함께 거절합니다.
+# - 프레임 수신부터 추론 완료까지의 지연(lag)을 측정해, 과부하 시 모든 세션의 분석 단계를 함께 줄입니다.
+#     0: 전체 분석
+#     1: 얼굴 인증 일시 중지
+#     2: + Pose 생략 (자세/턱 괴기 판정 중지)
+#     3: + FaceMesh 생략 (YOLO 자리 비움 판정만)
+#   보정(Calibrating) 중인 세션은 기준값을 잡아야 하므로 2, 3 단계에서도 전체 분석을 수행합니다.
+
+logger = logging.getLogger(__name__)
+
+MAX_SESSIONS_PER_WORKER = int(os.environ.get("MAX_SESSIONS_PER_WORKER", 4 * (os.cpu_count() or 4)))
+SESSION_RETRY_AFTER_SECONDS = int(os.environ.get("SESSION_RETRY_AFTER_SECONDS", "30"))
+
+DEGRADE_LAG_SECONDS = float(os.environ.get("DEGRADE_LAG_SECONDS", "0.5"))
+RECOVER_LAG_SECONDS = float(os.environ.get("RECOVER_LAG_SECONDS", "0.25"))
+TIER_HOLD_SECONDS = float(os.environ.get("TIER_HOLD_SECONDS", "5.0"))
+LAG_SMOOTHING = 0.2
+
+TIER_FULL = 0
+TIER_NO_VERIFICATION = 1
+TIER_NO_POSE = 2
+TIER_PRESENCE_ONLY = 3
+MAX_TIER = TIER_PRESENCE_ONLY
+
+
+class AdmissionController:
+    """
+    이벤트 루프에서만 호출되므로 잠금이 필요 없습니다.
+    """
+    def __init__(self, max_sessions: int = MAX_SESSIONS_PER_WORKER, retry_after: int = SESSION_RETRY_AFTER_SECONDS):
+        self.max_sessions = max_sessions
+        self.retry_after = retry_after
+        self.active = 0
+        self.rejected = 0
+
+    def try_admit(self) -> bool:
+        if self.max_sessions > 0 and self.active >= self.max_sessions:
+            self.rejected += 1
+            return False
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active = max(0, self.active - 1)
+
+
+class DegradationGovernor:
+    """
+    지연의 지수 이동 평균으로 단계를 정합니다. 단계는 TIER_HOLD_SECONDS 마다 최대 한 칸씩 움직이며,
+    올릴 때와 내릴 때의 기준을 달리해(hysteresis) 경계에서 흔들리지 않게 합니다.
+    """
+    def __init__(self):
+        self.tier = TIER_FULL
+        self.lag = 0.0
+        self.last_change_time = 0.0
+
+    def observe(self, lag_seconds: float, now: float | None = None) -> int:
+        now = now if now is not None else time.time()
+        self.lag += LAG_SMOOTHING * (lag_seconds - self.lag)
+
+        if now - self.last_change_time >= TIER_HOLD_SECONDS:
+            if self.lag > DEGRADE_LAG_SECONDS and self.tier < MAX_TIER:
+                self.tier += 1
+                self.last_change_time = now
+                logger.warning("Degradation: lag %.0fms, tier -> %s", self.lag * 1000, self.tier)
+            elif self.lag < RECOVER_LAG_SECONDS and self.tier > TIER_FULL:
+                self.tier -= 1
+                self.last_change_time = now
+                logger.info("Degradation: lag %.0fms, tier -> %s", self.lag * 1000, self.tier)
+        return self.tier
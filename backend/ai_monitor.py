@@ -1,90 +1,210 @@
-print("===== ai_monitor.py 파일 새로 읽음 (버전 21.0 + DB 얼굴 인증) =====")
 import cv2
 import mediapipe as mp
 import math
 import time
-from ultralytics import YOLO                    # type: ignore
 import numpy as np
-import threading        # type: ignore      
+import threading
 import base64
 import os 
+import logging
+from array import array
+from enum import IntEnum
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from timeline import TransitionTimeline
+
+from face_pool import FACE_VERIFICATION_POOL, VerificationSlot, analyze_enrollment_frame
+from profiles import get_profile, load_models
+from admission import TIER_FULL, TIER_NO_VERIFICATION, TIER_NO_POSE, TIER_PRESENCE_ONLY
+from log import HOT_PATH
+
+logger = logging.getLogger(__name__)
+logger.info("===== ai_monitor.py 파일 새로 읽음 (버전 21.0 + DB 얼굴 인증) =====")
 
 try:
     import face_recognition
-    import threading             # type: ignore               
-    from queue import Queue         # type: ignore            
     FACE_RECOGNITION_ENABLED = True
-    print("AI Engine: face_recognition 모듈 로드 성공. 얼굴 인증 기능이 활성화됩니다.")
+    logger.info("AI Engine: face_recognition 모듈 로드 성공. 얼굴 인증 기능이 활성화됩니다.")
 except ImportError as e:
     FACE_RECOGNITION_ENABLED = False
-    print(f"AI Engine Warning: face_recognition 모듈 로드 실패. {e}")
-    print("AI Engine Warning: 얼굴 인증 기능이 비활성화됩니다. (Apple Silicon: brew install cmake && pip install dlib)")
-    class Queue:
-        def __init__(self, maxsize=0): pass
-        def empty(self): return True
-        def put_nowait(self, item): pass
-        def get(self, timeout=0): raise Exception("Queue is disabled")
-    class threading:
-        class Lock:
-            def __enter__(self): pass
-            def __exit__(self, exc_type, exc_value, traceback): pass
-        class Thread:
-            def __init__(self, target=None, daemon=None): pass
-            def start(self): pass
-            def is_alive(self): return False
-            def join(self, timeout=0): pass
+    logger.warning("AI Engine Warning: face_recognition 모듈 로드 실패. %s", e)
+    logger.warning("AI Engine Warning: 얼굴 인증 기능이 비활성화됩니다. (Apple Silicon: brew install cmake && pip install dlib)")
+
+
+class NonStudyState(IntEnum):
+    """
+    비공부 상태. 앞의 5개는 누적 배열(횟수/초)의 인덱스로도 사용됩니다.
+    """
+    DROWSY = 0
+    AWAY = 1
+    LYING_DOWN = 2
+    LEANING_BACK = 3
+    LOOKING_AWAY = 4
+    IDLE = 5
+
+
+# 누적 배열 인덱스 순서대로의 DB/응답 필드 키 (daily_<key>_count, daily_<key>_seconds, ...)
+TRACKED_STATE_KEYS = ("drowsy", "away", "lying_down", "leaning_back", "looking_away")
+_NO_EVENTS_COUNTED = bytes(len(TRACKED_STATE_KEYS))
+# Pose 를 생략한 프레임에 넘기는 "검출 없음" 결과
+_NO_POSE_RESULTS = SimpleNamespace(pose_landmarks=None)
+
+# 한 프레임 안의 독립 단계(FaceMesh, Pose)를 YOLO 와 동시에 실행하는 프로세스 공용 실행기.
+# mediapipe/torch 는 추론 중 GIL 을 놓으므로 스레드로도 겹쳐 실행됩니다. 크기를 제한해 과부하 시에도
+# 스레드 수가 세션 수에 비례해 늘지 않게 합니다.
+INFERENCE_STAGE_WORKERS = int(os.environ.get("INFERENCE_STAGE_WORKERS", os.cpu_count() or 4))
+INFERENCE_STAGE_EXECUTOR = ThreadPoolExecutor(max_workers=INFERENCE_STAGE_WORKERS, thread_name_prefix="inference-stage")
+
+
+class Status(IntEnum):
+    INITIALIZING = 0
+    INITIALIZING_MODELS = 1
+    CALIBRATING = 2
+    STUDYING = 3
+    AWAY_UNKNOWN_PERSON = 4
+    AWAY_NOT_DETECTED = 5
+    LYING_DOWN = 6
+    LOOKING_AWAY = 7
+    DROWSY_CHIN = 8
+    DROWSY_EYES = 9
+    LEANING_BACK = 10
+    IDLE = 11
+
+
+STATUS_LABELS = (
+    "Initializing",
+    "Initializing Models",
+    "Calibrating",
+    "Studying",
+    "Away (Unknown Person)",
+    "Away (Not Detected)",
+    "Lying Down",
+    "Looking Away",
+    "Drowsy (Chin)",
+    "Drowsy (Eyes)",
+    "Leaning Back",
+    "Idle",
+)
+
+# 비공부 조건 비트. 낮은 비트일수록 우선순위가 높습니다.
+COND_CALIBRATING = 1 << 0
+COND_UNKNOWN_PERSON = 1 << 1
+COND_AWAY = 1 << 2
+COND_LYING_DOWN = 1 << 3
+COND_LOOKING_AWAY = 1 << 4
+COND_DROWSY_CHIN = 1 << 5
+COND_DROWSY_EYES = 1 << 6
+COND_LEANING_BACK = 1 << 7
+
+# 상태 전이 테이블: (가장 낮은 조건 비트의 인덱스) -> (표시 상태, 비공부 타이머 상태)
+# 조건 비트가 하나도 없으면 Studying 입니다.
+STATUS_TRANSITIONS = (
+    (Status.CALIBRATING, NonStudyState.IDLE),
+    (Status.AWAY_UNKNOWN_PERSON, NonStudyState.AWAY),
+    (Status.AWAY_NOT_DETECTED, NonStudyState.AWAY),
+    (Status.LYING_DOWN, NonStudyState.LYING_DOWN),
+    (Status.LOOKING_AWAY, NonStudyState.LOOKING_AWAY),
+    (Status.DROWSY_CHIN, NonStudyState.DROWSY),
+    (Status.DROWSY_EYES, NonStudyState.DROWSY),
+    (Status.LEANING_BACK, NonStudyState.LEANING_BACK),
+)
 
 
 class AIEngine:
-    def __init__(self, supabase_client=None):
-        print("===== AIEngine 클래스 초기화 시작 (버전 21.0 + DB 얼굴 인증) =====")
+    # --- 판정 설정값 (모든 세션이 공유하는 클래스 상수) ---
+    # 모든 판정 구간은 프레임 수가 아닌 프레임 캡처 시각 기준(초)입니다.
+    # (서버/클라이언트가 fps를 낮춰도 판정 기준이 바뀌지 않도록)
+    EAR_THRESHOLD = 0.20
+    DROWSY_SECONDS = 4.8                  # 기존 48프레임 @10fps
+    AWAY_DETECT_SECONDS = 8.0
+    HEAD_TILT_RATIO_THRESHOLD = 0.55 
+    LYING_DOWN_NOSE_DOWN_THRESHOLD = 0.05 
+    LYING_DOWN_SECONDS = 10.0
+    HEAD_DOWN_SECONDS = 10.0 
+    HEAD_UP_GRACE_SECONDS = 1.0           # 기존 10프레임 @10fps
+    LYING_DOWN_NOSE_GRACE = -0.02
+    LEANING_BACK_RATIO_THRESHOLD = 0.75
+    LEANING_BACK_SECONDS = 10.0
+    HEAD_TURN_RATIO_THRESHOLD = 1.8 
+    LOOKING_AWAY_SECONDS = 10.0
+    CHIN_WRIST_THRESHOLD = 0.4 
+    CHIN_RESTING_SECONDS = 10.0
+    CALIBRATION_SECONDS = 10.0            # 기존 100프레임 @10fps
+    CALIBRATION_MIN_SAMPLES = 5
+    # 얼굴 인증 주기: 장면 변화(얼굴 재검출, 얼굴 크기/위치 급변, YOLO 인원 수 변화)가 있으면 곧바로,
+    # 등록 사용자로 확인된 안정 구간에서는 최소 간격부터 두 배씩 늘려 최대 간격까지 (기존 고정 3초)
+    FACE_VERIFICATION_MIN_INTERVAL_SECONDS = 1.0
+    FACE_VERIFICATION_MAX_INTERVAL_SECONDS = 24.0
+    FACE_JUMP_WIDTH_RATIO = 0.3                # 마지막 인증 때보다 얼굴 폭이 30% 넘게 달라짐
+    FACE_JUMP_DISTANCE = 0.2                   # 코끝이 프레임 크기 대비 20% 넘게 이동
+    UNKNOWN_PERSON_SECONDS = 5.0               # 기존 50프레임 @10fps
+    # 앞 프레임과 이보다 멀리 떨어진 프레임은 끊긴 구간으로 보고, 그 사이 시간은 어떤 상태로도 집계하지 않습니다.
+    # (최저 캡처 fps 1 과 추론 지연을 충분히 넘는 값. 클라이언트가 보낸 시각이 타이머를 늘리지 못하게 하는 상한)
+    MAX_FRAME_GAP_SECONDS = 10.0
+    face_distance_threshold = 0.55
+
+    LEFT_EYE_INDICES = (362, 385, 387, 263, 373, 380)
+    RIGHT_EYE_INDICES = (33, 160, 158, 133, 153, 144)
+    PERSON_CLASS_ID = 0
+
+    # --- 세션별 상태 (수천 개의 유휴 세션을 상주시키기 위해 __dict__ 없이 슬롯으로 보관) ---
+    __slots__ = (
+        "mp_face_mesh", "mp_pose", "yolo_model", "_models_loaded", "_model_load_lock",
+        "frame_time", "status",
+        "head_tilt_ratio", "head_turn_ratio",
+        "is_studying", "is_drowsy", "is_person_present", "is_lying_down", "is_leaning_back",
+        "is_looking_away", "is_looking_down", "is_chin_resting", "face_detected", "pose_detected",
+        "drowsy_start_time", "person_not_detected_start_time", "head_down_start_time", "head_up_start_time",
+        "lying_down_start_time", "leaning_back_start_time", "looking_away_start_time", "chin_resting_start_time",
+        "initial_shoulder", "initial_face_width", "initial_head_turn_ratio",
+        "is_calibrating", "calibration_start_time", "calibration_sample_count", "calibration_sums",
+        "event_counts", "event_seconds", "event_counted",
+        "current_daily_study_time", "study_session_start_time", "is_timer_running",
+        "current_non_study_state", "non_study_start_time", "session_start_daily_stats",
+        "delta_nose_y", "delta_face_ratio", "debug_chin_wrist_dist",
+        "supabase", "user_email", "registered_face_encoding", "is_face_registered",
+        "last_verification_submit_time", "unknown_person_start_time",
+        "verification_interval", "verification_reference", "verification_face_lost",
+        "person_count", "face_width", "face_x", "face_y",
+        "verification_slot", "is_authenticated_user",
+        "timeline", "rgb_buffer", "verification_snapshot", "tier",
+        "profile", "stage_executor",
+    )
+
+    def __init__(self, supabase_client=None, profile=None, stage_executor=None):
+        """
+        profile: 추론 품질 프로필 이름 (profiles.py). None 이면 INFERENCE_PROFILE 기본값.
+        stage_executor: FaceMesh/Pose 를 실행할 실행기. None 이면 INFERENCE_STAGE_EXECUTOR (섀도 엔진은 별도 실행기 사용).
+        """
+        logger.debug("===== AIEngine 클래스 초기화 시작 (버전 21.0 + DB 얼굴 인증) =====")
         
+        self.profile = get_profile(profile)
+        self.stage_executor = stage_executor if stage_executor is not None else INFERENCE_STAGE_EXECUTOR
         self.mp_face_mesh = None
         self.mp_pose = None
         self.yolo_model = None
         
         self._models_loaded = False
         self._model_load_lock = threading.Lock()
-        
-        self.EAR_THRESHOLD = 0.20
-        self.DROWSY_CONSEC_FRAMES = 48
-        self.AWAY_DETECT_SECONDS = 8.0
-        self.HEAD_TILT_RATIO_THRESHOLD = 0.55 
-        self.LYING_DOWN_NOSE_DOWN_THRESHOLD = 0.05 
-        self.LYING_DOWN_SECONDS = 10.0
-        self.HEAD_DOWN_SECONDS = 10.0 
-        self.LYING_DOWN_NOSE_GRACE = -0.02
-        self.LEANING_BACK_RATIO_THRESHOLD = 0.75
-        self.LEANING_BACK_SECONDS = 10.0
-        self.HEAD_TURN_RATIO_THRESHOLD = 1.8 
-        self.LOOKING_AWAY_SECONDS = 10.0
-        self.CHIN_WRIST_THRESHOLD = 0.4 
-        self.CHIN_RESTING_SECONDS = 10.0
-
-        self.LEFT_EYE_INDICES = [362, 385, 387, 263, 373, 380]
-        self.RIGHT_EYE_INDICES = [33, 160, 158, 133, 153, 144]
-        self.PERSON_CLASS_ID = 0
 
+        self.frame_time = time.time()
+        self.status = Status.INITIALIZING
         self.head_tilt_ratio = 0.0
         self.head_turn_ratio = 1.0 
-        self.current_status = "Initializing"
         self.is_studying = False
         self.is_drowsy = False
         self.is_person_present = True
         self.is_lying_down = False
         self.is_leaning_back = False 
         self.is_looking_away = False 
+        self.is_looking_down = False 
         self.is_chin_resting = False 
         self.face_detected = True 
         self.pose_detected = False 
-        self.drowsy_counter = 0
+        self.drowsy_start_time = None
         self.person_not_detected_start_time = None
-        self.head_down_counter = 0
-        self.head_up_counter = 0
-        
-        self.HEAD_DOWN_CONSEC_FRAMES = int(self.HEAD_DOWN_SECONDS * 10) 
-        self.HEAD_UP_GRACE_FRAMES = 10 
-        
+        self.head_down_start_time = None
+        self.head_up_start_time = None
         self.lying_down_start_time = None
         self.leaning_back_start_time = None
         self.looking_away_start_time = None 
@@ -93,21 +213,17 @@ class AIEngine:
         self.initial_face_width = 0.0 
         self.initial_head_turn_ratio = 1.0 
         self.is_calibrating = True
-        self.calibration_frames = []
-        self.drowsy_count, self.away_count, self.lying_down_count = 0, 0, 0
-        self.leaning_back_count = 0 
-        self.looking_away_count = 0 
-        self.drowsy_event_counted, self.away_event_counted, self.lying_down_event_counted = False, False, False
-        self.leaning_back_event_counted = False 
-        self.looking_away_event_counted = False 
+        self.calibration_start_time = None
+        self.calibration_sample_count = 0
+        # shoulder_y, nose_y, face_width, head_turn_ratio 의 누적합
+        self.calibration_sums = array('d', (0.0, 0.0, 0.0, 0.0))
+        # NonStudyState 인덱스 기반 누적 배열 (횟수 / 초 / 이번 이탈에서 카운트 여부)
+        self.event_counts = array('q', [0]) * len(TRACKED_STATE_KEYS)
+        self.event_seconds = array('d', [0.0]) * len(TRACKED_STATE_KEYS)
+        self.event_counted = bytearray(_NO_EVENTS_COUNTED)
         self.current_daily_study_time = 0.0
         self.study_session_start_time = None
         self.is_timer_running = False
-        self.drowsy_seconds = 0.0
-        self.away_seconds = 0.0
-        self.lying_down_seconds = 0.0
-        self.leaning_back_seconds = 0.0 
-        self.looking_away_seconds = 0.0 
         self.current_non_study_state = None 
         self.non_study_start_time = None
         self.session_start_daily_stats = {}
@@ -120,24 +236,34 @@ class AIEngine:
         self.user_email = None          
         self.registered_face_encoding = None  
         self.is_face_registered = False
-        self.face_verification_interval = 30
-        self.face_distance_threshold = 0.55
-        self.frame_count = 0
-        self.unknown_person_consecutive_frames = 0
-        self.unknown_person_frame_threshold = 50
-        self.face_verification_queue = Queue(maxsize=1)
-        self.face_verification_result = {"verified": True, "present": True}
-        self.face_verification_lock = threading.Lock()
-        self.face_verification_thread = None
-        self.face_verification_running = False
+        self.last_verification_submit_time = None
+        self.unknown_person_start_time = None
+        self.verification_interval = self.FACE_VERIFICATION_MIN_INTERVAL_SECONDS
+        # 마지막 인증 요청 때의 장면: 인원 수, 얼굴 폭, 코끝 x, y
+        self.verification_reference = array('d', (0.0, 0.0, 0.0, 0.0))
+        self.verification_face_lost = False
+        self.person_count = 0
+        self.face_width = 0.0
+        self.face_x = 0.0
+        self.face_y = 0.0
+        self.verification_slot = VerificationSlot()
         self.is_authenticated_user = True 
+        self.timeline = TransitionTimeline()
+        # 세션별로 재사용하는 프레임 버퍼 (해상도가 바뀔 때만 다시 할당)
+        self.rgb_buffer = None
+        self.verification_snapshot = None
+        self.tier = TIER_FULL
 
         if not FACE_RECOGNITION_ENABLED:
-            print("AI Engine: Face registration status: DISABLED")
+            logger.debug("AI Engine: Face registration status: DISABLED")
         elif self.supabase is None:
-            print("AI Engine: Supabase client not provided. Face auth disabled.")
+            logger.debug("AI Engine: Supabase client not provided. Face auth disabled.")
         else:
-            print("AI Engine: Ready for DB-based face authentication.")
+            logger.debug("AI Engine: Ready for DB-based face authentication.")
+
+    @property
+    def current_status(self):
+        return STATUS_LABELS[self.status]
         
     def _load_models_if_needed(self):
         if self._models_loaded:
@@ -147,27 +273,21 @@ class AIEngine:
             if self._models_loaded:
                 return
             
-            print("AI Engine: First request. Starting lazy-loading AI models...")
+            logger.info("AI Engine: First request. Starting lazy-loading AI models (profile: %s)...", self.profile.name)
             try:
-                self.mp_face_mesh = mp.solutions.face_mesh.FaceMesh(               # type: ignore
-                    max_num_faces=1, 
-                    refine_landmarks=True, 
-                    min_detection_confidence=0.5, 
-                    min_tracking_confidence=0.5
-                )
-                self.mp_pose = mp.solutions.pose.Pose()                     # type: ignore
-                
-                self.yolo_model = YOLO('yolo12n.pt')  # type: ignore
+                self.mp_face_mesh, self.mp_pose, self.yolo_model = load_models(self.profile)
                 
                 self._models_loaded = True
-                print("AI Engine: YOLO, FaceMesh, Pose models loaded successfully.")
+                logger.info("AI Engine: YOLO, FaceMesh, Pose models loaded successfully.")
             except Exception as e:
-                print(f"CRITICAL: Failed to lazy-load AI models: {e}")
+                logger.critical("CRITICAL: Failed to lazy-load AI models: %s", e)
                 self._models_loaded = False
 
-    def __del__(self):
-        print("AIEngine 소멸자 호출됨. 스레드 정리 시도...")
-        self._stop_face_verification_thread()
+    def close(self):
+        """
+        세션 종료 시 호출. 공유 인증 풀에 남은 이 세션의 요청/결과를 무효화합니다.
+        """
+        self._stop_face_verification()
         
     
     def _load_face_encoding(self):
@@ -175,243 +295,91 @@ class AIEngine:
             self.is_face_registered = False
             return
             
-        try:
-            response = self.supabase.table("user_stats").select("face_encoding").eq("user_email", self.user_email).execute()
-            
-            if response.data and response.data[0].get('face_encoding'):
-                
-                encoding_base64_str = response.data[0]['face_encoding']
-                encoding_bytes = base64.b64decode(encoding_base64_str)
-                encoding_array = np.frombuffer(encoding_bytes, dtype=np.float64)
-                
-                self.registered_face_encoding = np.array(encoding_array)
-                self.is_face_registered = True
-                print(f"AI Engine: Face encoding loaded from DB for {self.user_email}.")
-            else:
-                self.is_face_registered = False
-                self.registered_face_encoding = None
-                print(f"AI Engine: No face encoding found in DB for {self.user_email}.")
-        except Exception as e:
-            print(f"Error loading face encoding from DB: {e}")
+        encoding_array = fetch_face_encoding(self.supabase, self.user_email)
+        if encoding_array is not None:
+            self.registered_face_encoding = encoding_array
+            self.is_face_registered = True
+            logger.info("AI Engine: Face encoding loaded from DB for %s.", self.user_email)
+        else:
             self.is_face_registered = False
             self.registered_face_encoding = None
+            logger.info("AI Engine: No face encoding found in DB for %s.", self.user_email)
+
+    def refresh_face_encoding(self):
+        """
+        다른 워커/노드에서 등록·삭제된 얼굴을 반영하기 위해 DB에서 인코딩을 다시 읽습니다.
+        """
+        if not FACE_RECOGNITION_ENABLED or not self.supabase or not self.user_email:
+            return
+        encoding_array = fetch_face_encoding(self.supabase, self.user_email)
+        if encoding_array is not None:
+            if self.registered_face_encoding is None or not np.array_equal(encoding_array, self.registered_face_encoding):
+                self.apply_registered_face(encoding_array)
+        elif self.is_face_registered:
+            self.clear_registered_face()
     
     
     
-    def _start_face_verification_thread(self):
+    def _start_face_verification(self):
         if not FACE_RECOGNITION_ENABLED: return
-        if self.face_verification_thread is not None and self.face_verification_thread.is_alive():
+        if self.verification_slot.active:
             return
-        
-        self.face_verification_running = True
-        self.face_verification_thread = threading.Thread(target=self._face_verification_worker, daemon=True)
-        self.face_verification_thread.start()
-        print("AI Engine: Face verification thread started.")
+        self.verification_slot.activate()
+        self.last_verification_submit_time = None
+        self.verification_interval = self.FACE_VERIFICATION_MIN_INTERVAL_SECONDS
+        logger.debug("AI Engine: Face verification enabled (shared pool).")
     
-    def _stop_face_verification_thread(self):
+    def _stop_face_verification(self):
         if not FACE_RECOGNITION_ENABLED: return
-        self.face_verification_running = False
-        if self.face_verification_thread is not None and self.face_verification_thread.is_alive():
-            
-            with self.face_verification_queue.mutex:        # type: ignore
-                self.face_verification_queue.queue.clear()  # type: ignore
-            self.face_verification_thread.join(timeout=2)
-            print("AI Engine: Face verification thread stopped.")
+        if self.verification_slot.active:
+            self.verification_slot.deactivate()
+            logger.debug("AI Engine: Face verification disabled.")
     
-    def _face_verification_worker(self):
-        if not FACE_RECOGNITION_ENABLED: return
-        while self.face_verification_running:
-            try:
-                if not self.face_verification_queue.empty():
-                    rgb_frame = self.face_verification_queue.get(timeout=0.5)   # type: ignore
-                    
-                    if not self.face_verification_running:
-                        break
-                        
-                    is_verified, is_present = self._verify_registered_user_internal(rgb_frame)
-                    
-                    with self.face_verification_lock:
-                        self.face_verification_result = {
-                            "verified": is_verified,
-                            "present": is_present
-                        }
-                else:
-                    time.sleep(0.1)
-            except Exception as e:
-                if "empty" not in str(e).lower() and self.face_verification_running:
-                    print(f"Face verification worker error: {e}")
-                time.sleep(0.1)
-        
-    def _verify_registered_user_internal(self, rgb_frame):
-        if not FACE_RECOGNITION_ENABLED or not self.is_face_registered or self.registered_face_encoding is None:
-            return True, True 
-        
-        try:
-            face_locations = face_recognition.face_locations(rgb_frame)
-            if not face_locations:
-                return False, False # (Verified=False, Present=False) - 얼굴 없음
+    def apply_registered_face(self, encoding_array):
+        """
+        DB에 저장된 새 인코딩을 현재 세션에 반영하고 인증 스레드를 시작합니다.
+        """
+        self._stop_face_verification()
+        self.registered_face_encoding = encoding_array
+        self.is_face_registered = True
+        self.unknown_person_start_time = None
+        self._start_face_verification()
+        logger.info("AI Engine: Registered face applied to session for %s.", self.user_email)
 
-            current_face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-            if not current_face_encodings:
-                return False, False # (Verified=False, Present=False) - 인코딩 실패
-            
-            if len(current_face_encodings) == 0:
-                return False, False # (Verified=False, Present=False) - 얼굴 없음
-
-            found_unknown_face = False
-            for current_encoding in current_face_encodings:
-                # 등록된 얼굴과 현재 얼굴 비교
-                matches = face_recognition.compare_faces(
-                    [self.registered_face_encoding], 
-                    current_encoding, 
-                    tolerance=self.face_distance_threshold
-                )
-                if not matches[0]:
-                    found_unknown_face = True
-                    break 
-        
-            return not found_unknown_face, True 
-
-        except Exception as e:
-            print(f"Face verification internal error: {e}")
-            return False, False
-    
-    def is_encoding_possible(self, rgb_frame):
-        if not FACE_RECOGNITION_ENABLED:
-            return False
-        try:
-            face_locations = face_recognition.face_locations(rgb_frame)
-            if not face_locations:
-                return False 
-            
-            current_face_encodings = face_recognition.face_encodings(rgb_frame, [face_locations[0]])
-            if not current_face_encodings:
-                return False 
-            
-            return True 
-        except Exception:
-            return False
-    
-    def register_user_face(self, frame):
-        if not FACE_RECOGNITION_ENABLED:
-            return False, "얼굴 인증 모듈(face_recognition)이 설치되지 않았습니다."
-        if not self.supabase:
-            return False, "Supabase 클라이언트가 설정되지 않았습니다."
-        if not self.user_email:
-            return False, "로그인된 사용자 정보가 없습니다 (WebSocket 연결 필요)."
-            
-        try:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            face_locations = face_recognition.face_locations(rgb_frame)
-            if not face_locations:
-                return False, "얼굴이 감지되지 않았습니다. 카메라를 정면으로 봐주세요."
-            if len(face_locations) > 1:
-                return False, "여러 명의 얼굴이 감지되었습니다. 혼자 있을 때 등록해주세요."
-            
-            current_face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-            if not current_face_encodings:
-                return False, "얼굴 특징 추출에 실패했습니다."
-            
-            encoding_array = current_face_encodings[0]
-            
-            encoding_bytes = encoding_array.tobytes()
-            encoding_base64_str = base64.b64encode(encoding_bytes).decode('utf-8')
-            
-            
-            response = self.supabase.table("user_stats") \
-                           .update({"face_encoding": encoding_base64_str}) \
-                           .eq("user_email", self.user_email) \
-                           .execute()
-            
-            if response.data:
-                self.registered_face_encoding = encoding_array
-                self.is_face_registered = True
-                self._start_face_verification_thread() 
-                print(f"AI Engine: User face registered to DB for {self.user_email}.")
-                return True, f"얼굴이 성공적으로 등록되었습니다!"
-            else:
-                print(f"DB update error: {response.error}")
-                return False, "DB에 얼굴 인코딩 저장 실패"
-            
-        except Exception as e:
-            print(f"Face registration error: {e}")
-            return False, f"얼굴 등록 실패: {str(e)}"
-    
-    
-    def delete_registered_face(self):
-        if not FACE_RECOGNITION_ENABLED:
-            return False, "얼굴 인증 모듈(face_recognition)이 설치되지 않았습니다."
-        if not self.supabase:
-            return False, "Supabase 클라이언트가 설정되지 않았습니다."
-        if not self.user_email:
-            return False, "로그인된 사용자 정보가 없습니다 (WebSocket 연결 필요)."
-            
-        try:
-            self._stop_face_verification_thread()
-            
-            
-            response = self.supabase.table("user_stats") \
-                           .update({"face_encoding": None}) \
-                           .eq("user_email", self.user_email) \
-                           .execute()
-
-            if response.data:
-                self.registered_face_encoding = None
-                self.is_face_registered = False
-                self.unknown_person_consecutive_frames = 0
-                with self.face_verification_lock:
-                    self.face_verification_result = {"verified": True, "present": True}
-                
-                print(f"AI Engine: Face encoding deleted from DB for {self.user_email}.")
-                return True, "등록된 얼굴이 삭제되었습니다."
-            else:
-                return False, f"DB 업데이트 실패: {response.error}"
-        except Exception as e:
-            return False, f"삭제 실패: {str(e)}"
+    def clear_registered_face(self):
+        """
+        DB에서 삭제된 인코딩을 현재 세션에서도 해제합니다.
+        """
+        self._stop_face_verification()
+        self.registered_face_encoding = None
+        self.is_face_registered = False
+        self.unknown_person_start_time = None
+        logger.info("AI Engine: Registered face cleared from session for %s.", self.user_email)
 
     
     def load_user_stats(self, daily_stats_data: dict, user_email: str = None):  # type: ignore
         self.user_email = user_email 
         
         if not daily_stats_data:
-            print("AI Engine: No existing stats data. Starting fresh.")
+            logger.info("AI Engine: No existing stats data. Starting fresh.")
             daily_stats_data = {}
             
         
         self.current_daily_study_time = daily_stats_data.get("daily_study_seconds", 0.0) 
-        self.drowsy_count = daily_stats_data.get("daily_drowsy_count", 0)
-        self.away_count = daily_stats_data.get("daily_away_count", 0)
-        self.lying_down_count = daily_stats_data.get("daily_lying_down_count", 0)
-        self.leaning_back_count = daily_stats_data.get("daily_leaning_back_count", 0) 
-        self.looking_away_count = daily_stats_data.get("daily_looking_away_count", 0) 
-        
-        self.drowsy_seconds = daily_stats_data.get("daily_drowsy_seconds", 0.0)
-        self.away_seconds = daily_stats_data.get("daily_away_seconds", 0.0)
-        self.lying_down_seconds = daily_stats_data.get("daily_lying_down_seconds", 0.0)
-        self.leaning_back_seconds = daily_stats_data.get("daily_leaning_back_seconds", 0.0) 
-        self.looking_away_seconds = daily_stats_data.get("daily_looking_away_seconds", 0.0) 
-
-        print(f"AI Engine: Daily stats loaded for {self.user_email}. Today's study time starting from: {self.current_daily_study_time}s")
-        
-        self.session_start_daily_stats = {
-            "study_seconds": self.current_daily_study_time,
-            "drowsy_count": self.drowsy_count,
-            "away_count": self.away_count,
-            "lying_down_count": self.lying_down_count,
-            "leaning_back_count": self.leaning_back_count, 
-            "looking_away_count": self.looking_away_count, 
-            "daily_drowsy_seconds": self.drowsy_seconds,
-            "daily_away_seconds": self.away_seconds,
-            "daily_lying_down_seconds": self.lying_down_seconds,
-            "daily_leaning_back_seconds": self.leaning_back_seconds,
-            "daily_looking_away_seconds": self.looking_away_seconds 
-        }
+        for index, key in enumerate(TRACKED_STATE_KEYS):
+            self.event_counts[index] = daily_stats_data.get(f"daily_{key}_count", 0) or 0
+            self.event_seconds[index] = daily_stats_data.get(f"daily_{key}_seconds", 0.0) or 0.0
 
-        self.drowsy_event_counted, self.away_event_counted, self.lying_down_event_counted = False, False, False
-        self.leaning_back_event_counted = False 
-        self.looking_away_event_counted = False 
-        self.current_status = "Initializing"
+        logger.info("AI Engine: Daily stats loaded for %s. Today's study time starting from: %ss", self.user_email, self.current_daily_study_time)
+        
+        self.session_start_daily_stats = {"study_seconds": self.current_daily_study_time}
+        for index, key in enumerate(TRACKED_STATE_KEYS):
+            self.session_start_daily_stats[f"{key}_count"] = self.event_counts[index]
+            self.session_start_daily_stats[f"daily_{key}_seconds"] = self.event_seconds[index]
+
+        self.event_counted[:] = _NO_EVENTS_COUNTED
+        self.status = Status.INITIALIZING
+        self.timeline.clear()
         self.study_session_start_time = None
         self.is_timer_running = False
         self.is_studying = False
@@ -420,8 +388,11 @@ class AIEngine:
         self.is_lying_down = False
         self.is_leaning_back = False 
         self.is_looking_away = False 
+        self.is_looking_down = False 
         self.is_chin_resting = False 
-        self.drowsy_counter = 0
+        self.drowsy_start_time = None
+        self.head_down_start_time = None
+        self.head_up_start_time = None
         self.person_not_detected_start_time = None
         self.lying_down_start_time = None
         self.leaning_back_start_time = None
@@ -432,23 +403,29 @@ class AIEngine:
         self.initial_face_width = 0.0 
         self.initial_head_turn_ratio = 1.0 
         self.is_calibrating = True
-        self.calibration_frames = []
+        self.calibration_start_time = None
+        self.calibration_sample_count = 0
+        for index in range(len(self.calibration_sums)):
+            self.calibration_sums[index] = 0.0
         self.current_non_study_state = None 
         self.non_study_start_time = None
         self.is_authenticated_user = True 
+        self.last_verification_submit_time = None
+        self.unknown_person_start_time = None
         
         
         self.is_face_registered = False
         self.registered_face_encoding = None
-        self._stop_face_verification_thread() 
+        self._stop_face_verification() 
         
         if self.user_email and self.supabase:
             self._load_face_encoding() 
             if self.is_face_registered:
-                self._start_face_verification_thread() 
+                self._start_face_verification() 
                 
     def commit_all_running_timers(self):
-        current_time = time.time()
+        # 타이머는 프레임 시각으로 시작하므로 마지막으로 처리한 프레임 시각에서 확정합니다 (벽시계와 섞지 않음).
+        current_time = self.frame_time
         
         if self.is_timer_running and self.study_session_start_time:
             elapsed = current_time - self.study_session_start_time
@@ -458,26 +435,60 @@ class AIEngine:
         if self.current_non_study_state is not None and self.non_study_start_time is not None:
             self._stop_non_study_timer(current_time)
 
+    def record_session_end(self, end_time=None):
+        """
+        세션 종료를 타임라인에 기록해, 연결이 끊긴 구간이 마지막 상태의 시간으로 집계되지 않도록 합니다.
+        """
+        end_time = end_time if end_time is not None else self.frame_time
+        if self.status != Status.INITIALIZING:
+            self.timeline.record(end_time, self.status, Status.INITIALIZING)
+
+    def suspend(self):
+        """
+        연결이 끊겨 세션이 재접속 대기로 보관될 때 호출합니다. 마지막 프레임 시각까지 타이머를 확정하고 멈춰,
+        끊긴 구간이 공부/이탈 시간으로 집계되지 않게 합니다. 보정 기준값, 누적 통계, 얼굴 인증 상태는 유지됩니다.
+        """
+        end_time = self.frame_time
+        if self.is_timer_running and self.study_session_start_time:
+            self.current_daily_study_time += max(0.0, end_time - self.study_session_start_time)
+        self.is_timer_running = False
+        self.study_session_start_time = None
+
+        if self.current_non_study_state is not None and self.non_study_start_time is not None:
+            self._stop_non_study_timer(end_time)
+        self.current_non_study_state = None
+        self.non_study_start_time = None
+
+        # 조건 지속 시간은 연속된 프레임 기준이므로, 재접속 후 끊긴 구간이 더해지지 않도록 다시 잽니다.
+        self.drowsy_start_time = None
+        self.person_not_detected_start_time = None
+        self.head_down_start_time = None
+        self.head_up_start_time = None
+        self.lying_down_start_time = None
+        self.leaning_back_start_time = None
+        self.looking_away_start_time = None
+        self.chin_resting_start_time = None
+        self.unknown_person_start_time = None
+
+        self.record_session_end(end_time)
+        self.status = Status.INITIALIZING
+
     def get_final_stats(self) -> (dict, dict):      # type: ignore
         
         final_daily_stats = {
             "daily_study_seconds": self.current_daily_study_time, 
-            "daily_drowsy_count": self.drowsy_count,
-            "daily_away_count": self.away_count,
-            "daily_lying_down_count": self.lying_down_count,
-            "daily_leaning_back_count": self.leaning_back_count, 
-            "daily_looking_away_count": self.looking_away_count, 
             "updated_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
-            "daily_drowsy_seconds": self.drowsy_seconds,
-            "daily_away_seconds": self.away_seconds,
-            "daily_lying_down_seconds": self.lying_down_seconds,
-            "daily_leaning_back_seconds": self.leaning_back_seconds,
-            "daily_looking_away_seconds": self.looking_away_seconds 
         }
+        for index, key in enumerate(TRACKED_STATE_KEYS):
+            final_daily_stats[f"daily_{key}_count"] = self.event_counts[index]
+            final_daily_stats[f"daily_{key}_seconds"] = self.event_seconds[index]
 
         session_delta_stats = {
             "study_seconds": self.current_daily_study_time - self.session_start_daily_stats.get("study_seconds", 0.0),
         }
+        for index, key in enumerate(TRACKED_STATE_KEYS):
+            session_delta_stats[f"{key}_count"] = self.event_counts[index] - self.session_start_daily_stats.get(f"{key}_count", 0)
+            session_delta_stats[f"{key}_seconds"] = self.event_seconds[index] - self.session_start_daily_stats.get(f"daily_{key}_seconds", 0.0)
 
         return final_daily_stats, session_delta_stats
 
@@ -495,22 +506,26 @@ class AIEngine:
         except: return 0.0
 
     
-    def _analyze_yolo_and_face(self, frame, rgb_frame):
-        person_found_yolo = False 
+    def _detect_person(self, frame):
+        """
+        YOLO 추론 단계. 검출된 사람 수를 돌려줍니다.
+        세션 상태를 건드리지 않으므로 다른 단계와 동시에 실행할 수 있습니다.
+        """
+        person_count = 0
         
         if self.yolo_model:
-            results = self.yolo_model(frame, verbose=False)
+            results = self.yolo_model(frame, verbose=False, imgsz=self.profile.yolo_imgsz,
+                                      conf=self.profile.yolo_confidence, classes=[self.PERSON_CLASS_ID])
             for r in results:
                 for box in r.boxes:
                     cls_id = int(box.cls[0])
                     conf = float(box.conf[0])
-                    if cls_id == self.PERSON_CLASS_ID and conf > 0.5:
-                        person_found_yolo = True
-                        break 
-                if person_found_yolo:
-                    break
-        
-        current_time = time.time()
+                    if cls_id == self.PERSON_CLASS_ID and conf > self.profile.yolo_confidence:
+                        person_count += 1
+        return person_count
+
+    def _analyze_yolo_and_face(self, person_found_yolo):
+        current_time = self.frame_time
 
         
         
@@ -524,41 +539,110 @@ class AIEngine:
             self.is_person_present = True
         
         
-        self.frame_count += 1
-
-        if FACE_RECOGNITION_ENABLED and self.is_face_registered:
-            
-            if self.frame_count % self.face_verification_interval == 0:
-                if self.face_verification_queue.empty():
-                    try:
-                        self.face_verification_queue.put_nowait(rgb_frame.copy())
-                    except Exception:
-                        pass 
-            
+        if FACE_RECOGNITION_ENABLED and self.is_face_registered and self.tier < TIER_NO_VERIFICATION:
             
-            with self.face_verification_lock:
-                is_verified = self.face_verification_result["verified"]
-                is_present = self.face_verification_result["present"]
+            is_verified, is_present = self.verification_slot.result
 
             if not is_present:
                 
                 self.is_authenticated_user = False
-                self.unknown_person_consecutive_frames = 0
+                self.unknown_person_start_time = None
             elif not is_verified:
                 
-                self.unknown_person_consecutive_frames += 1
-                if self.unknown_person_consecutive_frames > self.unknown_person_frame_threshold:
+                if self.unknown_person_start_time is None:
+                    self.unknown_person_start_time = current_time
+                elif current_time - self.unknown_person_start_time > self.UNKNOWN_PERSON_SECONDS:
                     self.is_authenticated_user = False 
             else:
                 
                 self.is_authenticated_user = True
-                self.unknown_person_consecutive_frames = 0
+                self.unknown_person_start_time = None
                 
         else:
             
+            self.unknown_person_start_time = None
             self.is_authenticated_user = self.is_person_present
 
-    
+    def _verification_scene_changed(self) -> bool:
+        """
+        마지막 인증 요청 이후 다른 사람으로 바뀌었을 수 있는 장면 변화. 이미 계산된 값만 비교합니다.
+        """
+        reference = self.verification_reference
+        if self.person_count != reference[0]:
+            return True
+        if not self.face_detected:
+            return False
+        if self.verification_face_lost or reference[1] <= 0:
+            return True
+        if abs(self.face_width / reference[1] - 1.0) > self.FACE_JUMP_WIDTH_RATIO:
+            return True
+        return math.hypot(self.face_x - reference[2], self.face_y - reference[3]) > self.FACE_JUMP_DISTANCE
+
+    def _schedule_face_verification(self, rgb_frame):
+        """
+        장면 변화가 있으면 최소 간격 뒤 바로, 없으면 현재 간격마다 인증을 요청합니다.
+        등록 사용자로 확인된 상태에서는 요청할 때마다 간격을 두 배로 늘리고 (최대 간격까지),
+        확인되지 않았거나 장면이 바뀌었으면 최소 간격으로 되돌립니다.
+        """
+        if not (FACE_RECOGNITION_ENABLED and self.is_face_registered and self.tier < TIER_NO_VERIFICATION
+                and self.verification_slot.active):
+            return
+        current_time = self.frame_time
+        if self.last_verification_submit_time is not None and not self.face_detected:
+            self.verification_face_lost = True
+
+        if self.last_verification_submit_time is None:
+            due_time = current_time
+        elif self._verification_scene_changed():
+            self.verification_interval = self.FACE_VERIFICATION_MIN_INTERVAL_SECONDS
+            due_time = self.last_verification_submit_time + self.verification_interval
+        else:
+            due_time = self.last_verification_submit_time + self.verification_interval
+        if current_time < due_time or self.verification_slot.pending:
+            return
+
+        if not FACE_VERIFICATION_POOL.submit(self.verification_slot, self._verification_snapshot(rgb_frame), self.registered_face_encoding,
+                                             self.face_distance_threshold, due_time):
+            return
+        self.last_verification_submit_time = current_time
+
+        is_verified, is_present = self.verification_slot.result
+        if is_verified and is_present and self.is_authenticated_user:
+            self.verification_interval = min(self.verification_interval * 2, self.FACE_VERIFICATION_MAX_INTERVAL_SECONDS)
+        else:
+            self.verification_interval = self.FACE_VERIFICATION_MIN_INTERVAL_SECONDS
+        reference = self.verification_reference
+        reference[0] = self.person_count
+        reference[1] = self.face_width if self.face_detected else 0.0
+        reference[2] = self.face_x
+        reference[3] = self.face_y
+        self.verification_face_lost = False
+
+    def _verification_snapshot(self, rgb_frame):
+        """
+        얼굴 인증에 넘길 읽기 전용 스냅샷. 등록 인코딩이 좌우 반전된 프레임에서 만들어졌으므로
+        여기서만 픽셀을 반전합니다. 인증이 대기/처리 중인 동안에는 호출되지 않으므로 버퍼 하나를 재사용합니다.
+        """
+        snapshot = self.verification_snapshot
+        if snapshot is None or snapshot.shape != rgb_frame.shape:
+            snapshot = self.verification_snapshot = np.empty_like(rgb_frame)
+        snapshot.flags.writeable = True
+        cv2.flip(rgb_frame, 1, dst=snapshot)
+        snapshot.flags.writeable = False
+        return snapshot
+
+    def _convert_to_rgb(self, frame):
+        """
+        BGR -> RGB 변환을 세션 버퍼에 기록합니다. 읽기 전용으로 표시해 mediapipe 가 복사 없이 참조하게 합니다.
+        """
+        rgb_frame = self.rgb_buffer
+        if rgb_frame is None or rgb_frame.shape != frame.shape:
+            rgb_frame = self.rgb_buffer = np.empty_like(frame)
+        rgb_frame.flags.writeable = True
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+        rgb_frame.flags.writeable = False
+        return rgb_frame
+
     def _analyze_face_and_head(self, mesh_results):
         self.face_detected = False
         self.head_tilt_ratio = 0.0
@@ -572,27 +656,34 @@ class AIEngine:
             left_ear = self._get_ear(landmarks, self.LEFT_EYE_INDICES)
             right_ear = self._get_ear(landmarks, self.RIGHT_EYE_INDICES)
             ear = (left_ear + right_ear) / 2.0
+            current_time = self.frame_time
             if ear < self.EAR_THRESHOLD and ear > 0.0:
-                self.drowsy_counter += 1
-                if self.drowsy_counter >= self.DROWSY_CONSEC_FRAMES: self.is_drowsy = True
+                if self.drowsy_start_time is None:
+                    self.drowsy_start_time = current_time
+                elif current_time - self.drowsy_start_time >= self.DROWSY_SECONDS: self.is_drowsy = True
             else:
-                self.drowsy_counter = 0; self.is_drowsy = False
+                self.drowsy_start_time = None; self.is_drowsy = False
 
             nose_tip = landmarks[1]; chin = landmarks[152]
             left_cheek = landmarks[234]; right_cheek = landmarks[454]
             face_width = self._euclidean_distance(left_cheek, right_cheek)
+            self.face_width = face_width
+            self.face_x = nose_tip.x
+            self.face_y = nose_tip.y
             nose_chin_dist = abs(nose_tip.y - chin.y)
             if face_width > 0: self.head_tilt_ratio = nose_chin_dist / face_width
             
             if self.head_tilt_ratio < self.HEAD_TILT_RATIO_THRESHOLD and self.head_tilt_ratio >= 0:
-                self.head_up_counter = 0 
-                self.head_down_counter += 1
-                if self.head_down_counter >= self.HEAD_DOWN_CONSEC_FRAMES: 
+                self.head_up_start_time = None 
+                if self.head_down_start_time is None:
+                    self.head_down_start_time = current_time
+                elif current_time - self.head_down_start_time >= self.HEAD_DOWN_SECONDS: 
                     self.is_looking_down = True
             else:
-                self.head_up_counter += 1 
-                if self.head_up_counter > self.HEAD_UP_GRACE_FRAMES:
-                    self.head_down_counter = 0 
+                if self.head_up_start_time is None:
+                    self.head_up_start_time = current_time 
+                elif current_time - self.head_up_start_time > self.HEAD_UP_GRACE_SECONDS:
+                    self.head_down_start_time = None 
             
             dist_left = self._euclidean_distance(nose_tip, left_cheek)
             dist_right = self._euclidean_distance(nose_tip, right_cheek)
@@ -602,7 +693,6 @@ class AIEngine:
             else:
                 self.head_turn_ratio = 1.0
 
-            current_time = time.time()
             is_turning = False
             if self.initial_head_turn_ratio > 0:
                 ratio_diff = self.head_turn_ratio / self.initial_head_turn_ratio
@@ -620,14 +710,15 @@ class AIEngine:
                 self.is_looking_away = False
             
         else:
-            self.drowsy_counter = 0
+            self.drowsy_start_time = None
             self.is_looking_away = False
             self.looking_away_start_time = None
-            if self.head_down_counter > self.HEAD_DOWN_CONSEC_FRAMES // 2:
+            if (self.head_down_start_time is not None and
+                    self.frame_time - self.head_down_start_time > self.HEAD_DOWN_SECONDS / 2):
                 self.is_looking_down = True
             else:
-                self.head_down_counter = 0
-                self.head_up_counter = 0
+                self.head_down_start_time = None
+                self.head_up_start_time = None
                 
             self.head_tilt_ratio = 0
 
@@ -635,6 +726,9 @@ class AIEngine:
         face_width = 0.0
         head_turn_ratio = 1.0
 
+        if self.calibration_start_time is None:
+            self.calibration_start_time = self.frame_time
+
         if mesh_results and mesh_results.multi_face_landmarks:
             landmarks = mesh_results.multi_face_landmarks[0].landmark
             left_cheek = landmarks[234]; right_cheek = landmarks[454]
@@ -650,27 +744,21 @@ class AIEngine:
             landmarks = pose_results.pose_landmarks.landmark
             shoulder = landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER]             # type: ignore
             nose = landmarks[mp.solutions.pose.PoseLandmark.NOSE]                       # type: ignore
-            self.calibration_frames.append({
-                'shoulder_y': shoulder.y, 
-                'nose_y': nose.y,
-                'face_width': face_width,
-                'head_turn_ratio': head_turn_ratio 
-            })
-
-        if len(self.calibration_frames) >= 100:
-            if not self.calibration_frames: 
-                self.initial_shoulder = None
-                self.initial_face_width = 0.0 
-                self.initial_head_turn_ratio = 1.0 
-            else:
-                avg_shoulder_y = sum(f['shoulder_y'] for f in self.calibration_frames) / len(self.calibration_frames)
-                avg_nose_y = sum(f['nose_y'] for f in self.calibration_frames) / len(self.calibration_frames)
-                avg_face_width = sum(f['face_width'] for f in self.calibration_frames) / len(self.calibration_frames) 
-                avg_head_turn_ratio = sum(f['head_turn_ratio'] for f in self.calibration_frames) / len(self.calibration_frames) 
-                
-                self.initial_shoulder = {'y': avg_shoulder_y, 'nose_y': avg_nose_y}
-                self.initial_face_width = avg_face_width 
-                self.initial_head_turn_ratio = avg_head_turn_ratio 
+            sums = self.calibration_sums
+            sums[0] += shoulder.y
+            sums[1] += nose.y
+            sums[2] += face_width
+            sums[3] += head_turn_ratio
+            self.calibration_sample_count += 1
+
+        calibration_elapsed = self.frame_time - self.calibration_start_time
+        if (calibration_elapsed >= self.CALIBRATION_SECONDS and
+                self.calibration_sample_count >= self.CALIBRATION_MIN_SAMPLES):
+            count = self.calibration_sample_count
+            sums = self.calibration_sums
+            self.initial_shoulder = {'y': sums[0] / count, 'nose_y': sums[1] / count}
+            self.initial_face_width = sums[2] / count 
+            self.initial_head_turn_ratio = sums[3] / count 
             self.is_calibrating = False
 
     
@@ -711,7 +799,7 @@ class AIEngine:
         elif not self.face_detected:
              self.delta_face_ratio = 1.0 
         
-        current_time = time.time()
+        current_time = self.frame_time
         
         is_face_small = (self.face_detected and 
                          self.delta_face_ratio < self.LEANING_BACK_RATIO_THRESHOLD)
@@ -739,7 +827,7 @@ class AIEngine:
     
     def _update_status_and_timers(self):
         
-        current_time = time.time()
+        current_time = self.frame_time
         
         trigger_A_lying = (self.face_detected and 
                            self.is_looking_down and 
@@ -760,151 +848,151 @@ class AIEngine:
             self.lying_down_start_time = None
             self.is_lying_down = False
             
-        with self.face_verification_lock:
-            is_face_verified = self.face_verification_result["verified"]
-            is_face_present = self.face_verification_result["present"]
+        if self.tier < TIER_NO_VERIFICATION:
+            is_face_verified, is_face_present = self.verification_slot.result
+        else:
+            # 인증 일시 중지 중에는 이전 결과에 묶이지 않도록 중립값을 사용합니다.
+            is_face_verified, is_face_present = True, True
 
-        is_unknown_person_detected = is_face_present and (not is_face_verified)
-        
-        is_yolo_away = (not self.is_person_present) 
-    
         is_immediate_away = (not is_face_present) and (not self.face_detected) and (not self.pose_detected)
 
-        is_truly_away = is_yolo_away or is_immediate_away
-        
-        is_drowsy_combined = self.is_drowsy or self.is_chin_resting
-        
-        self.is_studying = (
-            not self.is_calibrating and
-            not is_truly_away and 
-            not is_unknown_person_detected and
-            not is_drowsy_combined and 
-            not self.is_lying_down and 
-            not self.is_leaning_back and
-            not self.is_looking_away
-        )
+        # 비공부 조건을 비트마스크로 모은 뒤, 가장 우선순위가 높은(가장 낮은) 비트로 전이 테이블을 조회합니다.
+        conditions = 0
+        if self.is_calibrating: conditions |= COND_CALIBRATING
+        if is_face_present and not is_face_verified: conditions |= COND_UNKNOWN_PERSON
+        if not self.is_person_present or is_immediate_away: conditions |= COND_AWAY
+        if self.is_lying_down: conditions |= COND_LYING_DOWN
+        if self.is_looking_away: conditions |= COND_LOOKING_AWAY
+        if self.is_chin_resting: conditions |= COND_DROWSY_CHIN
+        if self.is_drowsy: conditions |= COND_DROWSY_EYES
+        if self.is_leaning_back: conditions |= COND_LEANING_BACK
+
+        self.is_studying = conditions == 0
+        previous_status = self.status
         
         if self.is_studying:
-            self.current_status = "Studying"
+            self.status = Status.STUDYING
+            if previous_status != Status.STUDYING:
+                self.timeline.record(current_time, previous_status, Status.STUDYING)
             if not self.is_timer_running: 
                 self.study_session_start_time = current_time
                 self.is_timer_running = True
             
             if self.current_non_study_state is not None:
                 self._stop_non_study_timer(current_time)
-                
-        else:
-            if self.is_timer_running:
-                self.current_daily_study_time += current_time - self.study_session_start_time       # type: ignore
-                self.is_timer_running = False
-                self.study_session_start_time = None
-
-            new_state = None
-            if self.is_calibrating:
-                new_state = "idle"
-                self.current_status = "Calibrating"
-                
-            elif is_unknown_person_detected: 
-                new_state = "away" 
-                self.current_status = "Away (Unknown Person)"
-            elif is_truly_away:
-                new_state = "away"
-                self.current_status = "Away (Not Detected)"
-                
-            elif self.is_lying_down:
-                new_state = "lying_down"
-                self.current_status = "Lying Down"
-            elif self.is_looking_away: 
-                new_state = "looking_away"
-                self.current_status = "Looking Away"
-            elif is_drowsy_combined: 
-                new_state = "drowsy"
-                self.current_status = "Drowsy (Chin)" if self.is_chin_resting else "Drowsy (Eyes)"
-            
-            elif is_unknown_person_detected: 
-                new_state = "away" 
-                self.current_status = "Away (Unknown Person)"
-            
-            elif is_truly_away:
-                new_state = "away"
-                self.current_status = "Away (Not Detected)"
 
-            elif self.is_leaning_back: 
-                new_state = "leaning_back"
-                self.current_status = "Leaning Back"
-            else:
-                new_state = "idle" 
-                self.current_status = "Idle" 
+            self.event_counted[:] = _NO_EVENTS_COUNTED
+            return
+
+        if self.is_timer_running:
+            self.current_daily_study_time += current_time - self.study_session_start_time       # type: ignore
+            self.is_timer_running = False
+            self.study_session_start_time = None
+
+        self.status, new_state = STATUS_TRANSITIONS[(conditions & -conditions).bit_length() - 1]
+        if self.status != previous_status:
+            self.timeline.record(current_time, previous_status, self.status)
 
-            if new_state != self.current_non_study_state:
-                if self.current_non_study_state is not None:
-                    self._stop_non_study_timer(current_time)
+        if new_state != self.current_non_study_state:
+            if self.current_non_study_state is not None:
+                self._stop_non_study_timer(current_time)
+            
+            self.current_non_study_state = new_state
+            if new_state != NonStudyState.IDLE: 
+                self.non_study_start_time = current_time
                 
-                self.current_non_study_state = new_state
-                if new_state != "idle": 
-                    self.non_study_start_time = current_time
-                    
-                    if new_state == "drowsy" and not self.drowsy_event_counted: 
-                        self.drowsy_count += 1; self.drowsy_event_counted = True
-                    if new_state == "away" and not self.away_event_counted: 
-                        self.away_count += 1; self.away_event_counted = True
-                    if new_state == "lying_down" and not self.lying_down_event_counted: 
-                        self.lying_down_count += 1; self.lying_down_event_counted = True
-                    if new_state == "leaning_back" and not self.leaning_back_event_counted: 
-                        self.leaning_back_count += 1; self.leaning_back_event_counted = True
-                    if new_state == "looking_away" and not self.looking_away_event_counted: 
-                        self.looking_away_count += 1; self.looking_away_event_counted = True
-                        
-        if self.is_studying:
-            self.drowsy_event_counted, self.away_event_counted, self.lying_down_event_counted = False, False, False
-            self.leaning_back_event_counted = False
-            self.looking_away_event_counted = False 
+                if not self.event_counted[new_state]:
+                    self.event_counts[new_state] += 1
+                    self.event_counted[new_state] = 1
 
     def _stop_non_study_timer(self, end_time):
         if self.non_study_start_time is None:
             return 
 
-        elapsed = end_time - self.non_study_start_time
-        
-        if self.current_non_study_state == "drowsy":
-            self.drowsy_seconds += elapsed
-        elif self.current_non_study_state == "away":
-            self.away_seconds += elapsed
-        elif self.current_non_study_state == "lying_down":
-            self.lying_down_seconds += elapsed
-        elif self.current_non_study_state == "leaning_back": 
-            self.leaning_back_seconds += elapsed
-        elif self.current_non_study_state == "looking_away": 
-            self.looking_away_seconds += elapsed
+        if self.current_non_study_state != NonStudyState.IDLE:
+            self.event_seconds[self.current_non_study_state] += end_time - self.non_study_start_time
             
         self.non_study_start_time = None
         self.current_non_study_state = None
     
+    def _clear_face_and_posture(self):
+        """
+        FaceMesh/Pose 를 생략한 프레임의 중립값. 자리 비움은 YOLO 결과로만 판정됩니다.
+        """
+        self.face_detected = self.is_person_present
+        self.pose_detected = False
+        self.is_drowsy = False
+        self.is_looking_down = False
+        self.is_looking_away = False
+        self.is_leaning_back = False
+        self.is_chin_resting = False
+        self.drowsy_start_time = None
+        self.head_down_start_time = None
+        self.head_up_start_time = None
+        self.looking_away_start_time = None
+        self.leaning_back_start_time = None
+        self.chin_resting_start_time = None
+
     def _draw_overlay(self, frame):
         pass
 
-    def process(self, frame):
+    def process(self, frame, frame_time=None, tier=TIER_FULL):
+        """
+        frame_time: 프레임 캡처(수신) 시각 (epoch 초). 모든 시간 기반 판정의 기준이 됩니다.
+        tier: 과부하 단계 (admission.py). 생략된 단계는 중립값으로 처리합니다.
+        """
         self._load_models_if_needed()
         
         if not self._models_loaded or self.yolo_model is None or self.mp_face_mesh is None:
-            print("AI Engine: Models not ready, skipping frame.")
+            logger.warning("AI Engine: Models not ready, skipping frame.", extra=HOT_PATH)
             # 상태가 "Initializing" 등으로 유지되도록 해야 할 수 있습니다.
-            self.current_status = "Initializing Models"
+            self.status = Status.INITIALIZING_MODELS
             return
         
-        frame = cv2.flip(frame, 1)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, _ = frame.shape
-        
-        self._analyze_yolo_and_face(frame, rgb_frame) 
+        frame_time = frame_time if frame_time is not None else time.time()
+        # 프레임 시각은 되돌아가지 않으며, 앞 프레임과의 간격이 너무 크면 재접속처럼 타이머를 앞 프레임 시각에서 확정하고
+        # 새로 시작합니다. (끊긴 구간이나 잘못된 시각이 공부/이탈 시간으로 더해지지 않도록)
+        if frame_time - self.frame_time > self.MAX_FRAME_GAP_SECONDS:
+            self.suspend()
+        self.frame_time = max(frame_time, self.frame_time)
+
+        # 좌우 반전은 픽셀이 아니라 랜드마크 좌표(x -> 1 - x) 기준으로 생각합니다.
+        # 판정에 쓰는 값은 모두 거리 또는 y 좌표라 반전과 무관하므로 원본 프레임을 그대로 분석합니다.
+        # (head_turn_ratio 는 좌/우 뺨이 바뀌어 역수가 되지만, 같은 방식으로 보정한 기준값과 비교하고
+        #  임계값도 대칭이라 판정은 같습니다)
+        rgb_frame = self._convert_to_rgb(frame)
         
-        mesh_results = self.mp_face_mesh.process(rgb_frame)
-        pose_results = self.mp_pose.process(rgb_frame)                     # type: ignore
+        # 보정 중에는 기준값을 잡기 위해 Pose/FaceMesh 를 생략하지 않습니다.
+        self.tier = min(tier, TIER_NO_VERIFICATION) if self.is_calibrating else tier
+        if self.tier < TIER_NO_VERIFICATION and not self.verification_slot.active and self.is_face_registered:
+            self._start_face_verification()
+        elif self.tier >= TIER_NO_VERIFICATION and self.verification_slot.active:
+            self._stop_face_verification()
+
+        # 세 추론 단계는 서로의 결과에 의존하지 않으므로 FaceMesh/Pose 는 실행기에, YOLO 는 현재 스레드에서
+        # 동시에 돌리고, 모두 끝난 뒤 세션 상태에 순서대로 반영합니다. (프레임 지연 ~= 가장 느린 단계)
+        mesh_future = pose_future = None
+        if self.tier < TIER_PRESENCE_ONLY:
+            mesh_future = self.stage_executor.submit(self.mp_face_mesh.process, rgb_frame)
+            if self.is_calibrating or self.tier < TIER_NO_POSE:
+                pose_future = self.stage_executor.submit(self.mp_pose.process, rgb_frame)  # type: ignore
+
+        self.person_count = self._detect_person(frame)
+        mesh_results = mesh_future.result() if mesh_future is not None else None
+        pose_results = pose_future.result() if pose_future is not None else _NO_POSE_RESULTS
+
+        self._analyze_yolo_and_face(self.person_count > 0)
         
+        if mesh_future is None:
+            self._clear_face_and_posture()
+            self._update_status_and_timers()
+            return
+
         self._analyze_face_and_head(mesh_results)
-        
+        # 인증 요청은 이번 프레임의 얼굴/인원 변화를 본 뒤에 정합니다.
+        self._schedule_face_verification(rgb_frame)
+
         if self.is_calibrating:
-            self.calibrating_text = "Calibrating... Please Sit Naturally"
             self._calibrate_posture(pose_results, mesh_results)
         else:
             self._analyze_posture(pose_results, mesh_results)
@@ -914,28 +1002,139 @@ class AIEngine:
     def get_state_for_main_py(self):
         display_time_sec = self.current_daily_study_time
         if self.is_timer_running and self.study_session_start_time:
-            display_time_sec += (time.time() - self.study_session_start_time)
+            display_time_sec += max(0.0, self.frame_time - self.study_session_start_time)
             
         return {
             "total_study_seconds": display_time_sec,
             "study_session_start_time": self.study_session_start_time,
             "is_timer_running": self.is_timer_running,
             "current_status": self.current_status,
-            "stats": {
-                "drowsy": self.drowsy_count,
-                "away": self.away_count,
-                "lying_down": self.lying_down_count,
-                "leaning_back": self.leaning_back_count, 
-                "looking_away": self.looking_away_count, 
-                "drowsy_seconds": self.drowsy_seconds,
-                "away_seconds": self.away_seconds,
-                "lying_down_seconds": self.lying_down_seconds, 
-                "leaning_back_seconds": self.leaning_back_seconds,
-                "looking_away_seconds": self.looking_away_seconds 
-            }
+            "stats": self._stats_snapshot(),
         }
+
+    def _stats_snapshot(self):
+        stats = {}
+        for index, key in enumerate(TRACKED_STATE_KEYS):
+            stats[key] = self.event_counts[index]
+        for index, key in enumerate(TRACKED_STATE_KEYS):
+            stats[f"{key}_seconds"] = self.event_seconds[index]
+        return stats
+        
+
+
+
+def fetch_face_encoding(supabase_client, user_email):
+    """
+    user_stats 테이블에 저장된 얼굴 인코딩을 읽어옵니다. 없으면 None.
+    """
+    try:
+        response = supabase_client.table("user_stats").select("face_encoding").eq("user_email", user_email).execute()
         
+        if response.data and response.data[0].get('face_encoding'):
+            encoding_base64_str = response.data[0]['face_encoding']
+            encoding_bytes = base64.b64decode(encoding_base64_str)
+            return np.array(np.frombuffer(encoding_bytes, dtype=np.float64))
+        return None
+    except Exception as e:
+        logger.error("Error loading face encoding from DB: %s", e)
+        return None
+
+
+# 등록 시 평균낼 최고 품질 프레임 수와 한 요청에서 받을 최대 프레임 수
+ENROLLMENT_TOP_K = 3
+ENROLLMENT_MAX_FRAMES = 10
 
+_ENROLLMENT_FAILURE_MESSAGES = {
+    "no_face": "얼굴이 감지되지 않았습니다. 카메라를 정면으로 봐주세요.",
+    "multiple_faces": "여러 명의 얼굴이 감지되었습니다. 혼자 있을 때 등록해주세요.",
+    "encoding_failed": "얼굴 특징 추출에 실패했습니다.",
+}
+
+
+def enroll_user_face(supabase_client, user_email, rgb_frames):
+    """
+    좌우 반전된 RGB 프레임들(짧은 연속 촬영)에서 얼굴 인코딩을 만들어 DB에 한 번 저장합니다.
+    각 프레임은 인증 풀의 워커 프로세스에서 병렬로 한 번씩만 검출/인코딩되고,
+    품질 상위 ENROLLMENT_TOP_K 개의 인코딩 평균을 등록합니다.
+    반환값: (success, message, encoding_array | None)
+    """
+    if not FACE_RECOGNITION_ENABLED:
+        return False, "얼굴 인증 모듈(face_recognition)이 설치되지 않았습니다.", None
+    if not supabase_client:
+        return False, "Supabase 클라이언트가 설정되지 않았습니다.", None
+    if not user_email:
+        return False, "로그인된 사용자 정보가 없습니다.", None
+    if not rgb_frames:
+        return False, "등록할 프레임이 없습니다.", None
+        
+    try:
+        futures = [FACE_VERIFICATION_POOL.run_task(analyze_enrollment_frame, rgb_frame) for rgb_frame in rgb_frames]
+        results = [future.result() for future in futures]
+
+        usable = sorted((r for r in results if r[0] == "ok"), key=lambda r: r[2], reverse=True)
+        if not usable:
+            # 가장 많이 나온 실패 사유로 안내합니다.
+            statuses = [r[0] for r in results]
+            return False, _ENROLLMENT_FAILURE_MESSAGES[max(set(statuses), key=statuses.count)], None
+        if any(r[0] == "multiple_faces" for r in results):
+            return False, _ENROLLMENT_FAILURE_MESSAGES["multiple_faces"], None
+
+        best_encodings = np.asarray([r[1] for r in usable[:ENROLLMENT_TOP_K]])
+        encoding_array = best_encodings.mean(axis=0)
+        # 선택된 프레임끼리 다른 사람이면 평균이 어느 쪽과도 맞지 않으므로 거절합니다.
+        if np.any(np.linalg.norm(best_encodings - encoding_array, axis=1) > AIEngine.face_distance_threshold):
+            return False, "프레임마다 다른 얼굴이 감지되었습니다. 혼자 있을 때 다시 시도해주세요.", None
+        
+        encoding_bytes = encoding_array.tobytes()
+        encoding_base64_str = base64.b64encode(encoding_bytes).decode('utf-8')
+        
+        
+        response = supabase_client.table("user_stats") \
+                       .update({"face_encoding": encoding_base64_str}) \
+                       .eq("user_email", user_email) \
+                       .execute()
+        
+        if response.data:
+            logger.info("AI Engine: User face registered to DB for %s (%s/%s frames).", user_email, len(best_encodings), len(rgb_frames))
+            return True, f"얼굴이 성공적으로 등록되었습니다!", encoding_array
+        else:
+            logger.error("DB update error: %s", response.error)
+            return False, "DB에 얼굴 인코딩 저장 실패", None
+        
+    except Exception as e:
+        logger.error("Face registration error: %s", e)
+        return False, f"얼굴 등록 실패: {str(e)}", None
+
+
+def register_user_face(supabase_client, user_email, rgb_frame):
+    """
+    좌우 반전된 RGB 프레임 한 장으로 얼굴을 등록합니다.
+    반환값: (success, message, encoding_array | None)
+    """
+    return enroll_user_face(supabase_client, user_email, [rgb_frame])
+
+
+def delete_registered_face(supabase_client, user_email):
+    if not FACE_RECOGNITION_ENABLED:
+        return False, "얼굴 인증 모듈(face_recognition)이 설치되지 않았습니다."
+    if not supabase_client:
+        return False, "Supabase 클라이언트가 설정되지 않았습니다."
+    if not user_email:
+        return False, "로그인된 사용자 정보가 없습니다."
+        
+    try:
+        response = supabase_client.table("user_stats") \
+                       .update({"face_encoding": None}) \
+                       .eq("user_email", user_email) \
+                       .execute()
+
+        if response.data:
+            logger.info("AI Engine: Face encoding deleted from DB for %s.", user_email)
+            return True, "등록된 얼굴이 삭제되었습니다."
+        else:
+            return False, f"DB 업데이트 실패: {response.error}"
+    except Exception as e:
+        return False, f"삭제 실패: {str(e)}"
 
 
 def get_current_stats(ai_engine_instance):
@@ -0,0 +1,91 @@
+import os
+import time
+from contextlib import contextmanager
+
+# 서버 주도 캡처 제어
+# 서버가 현재 추론 부하(동시에 처리 중인 프레임 수)와 세션 상태를 보고
+# 클라이언트에게 목표 fps / 해상도 / JPEG 품질을 알려줍니다. (/ws_stats 응답의 "control" 필드)
+# 판정 기준이 시간 기반이므로 fps 를 낮춰도 통계가 왜곡되지 않습니다.
+
+INFERENCE_CAPACITY = int(os.environ.get("INFERENCE_CAPACITY", os.cpu_count() or 4))
+STABLE_STUDYING_SECONDS = float(os.environ.get("CAPTURE_STABLE_SECONDS", "30"))
+TRANSITION_WINDOW_SECONDS = float(os.environ.get("CAPTURE_TRANSITION_SECONDS", "5"))
+CONTROL_UPDATE_INTERVAL_SECONDS = 1.0
+
+# 단계가 높을수록 가볍습니다.
+CAPTURE_LEVELS = (
+    {"fps": 10, "width": 640, "height": 480, "quality": 0.9},
+    {"fps": 5, "width": 640, "height": 480, "quality": 0.8},
+    {"fps": 2, "width": 480, "height": 360, "quality": 0.7},
+    {"fps": 1, "width": 320, "height": 240, "quality": 0.6},
+)
+
+# 측정/변화가 필요한 상태 (높은 fps 유지)
+_TRANSIENT_STATUSES = {"Initializing", "Initializing Models", "Calibrating"}
+
+
+class InferenceLoad:
+    """
+    프로세스 전체의 추론 동시 실행 수. 이벤트 루프에서만 증감하므로 잠금이 필요 없습니다.
+    """
+    def __init__(self, capacity: int = INFERENCE_CAPACITY):
+        self.capacity = max(1, capacity)
+        self.inflight = 0
+
+    @contextmanager
+    def track(self):
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+
+    @property
+    def utilization(self) -> float:
+        return self.inflight / self.capacity
+
+    def load_level(self) -> int:
+        utilization = self.utilization
+        if utilization <= 0.75:
+            return 0
+        if utilization <= 1.0:
+            return 1
+        if utilization <= 2.0:
+            return 2
+        return 3
+
+
+class CaptureController:
+    """
+    세션별 목표 캡처 설정 계산. 변경이 있을 때만 control 메시지를 돌려줍니다.
+    """
+    __slots__ = ("load", "last_status", "status_since", "current_level", "last_update_time")
+
+    def __init__(self, load: InferenceLoad):
+        self.load = load
+        self.last_status = None
+        self.status_since = time.time()
+        self.current_level = None
+        self.last_update_time = 0.0
+
+    def _session_level(self, status: str, now: float) -> int:
+        if status in _TRANSIENT_STATUSES or now - self.status_since < TRANSITION_WINDOW_SECONDS:
+            return 0
+        if status == "Studying" and now - self.status_since >= STABLE_STUDYING_SECONDS:
+            return 2
+        return 1
+
+    def update(self, status: str, now: float | None = None) -> dict | None:
+        now = now if now is not None else time.time()
+        if status != self.last_status:
+            self.last_status = status
+            self.status_since = now
+        elif now - self.last_update_time < CONTROL_UPDATE_INTERVAL_SECONDS:
+            return None
+        self.last_update_time = now
+
+        level = min(len(CAPTURE_LEVELS) - 1, self._session_level(status, now) + self.load.load_level())
+        if level == self.current_level:
+            return None
+        self.current_level = level
+        return {"level": level, **CAPTURE_LEVELS[level]}
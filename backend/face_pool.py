@@ -0,0 +1,236 @@
+import os
+import time
+import queue
+import itertools
+import threading
+import logging
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+from log import HOT_PATH, setup_logging
+
+try:
+    import face_recognition
+    FACE_RECOGNITION_ENABLED = True
+except ImportError:
+    FACE_RECOGNITION_ENABLED = False
+
+logger = logging.getLogger(__name__)
+
+# 프로세스 전체가 공유하는 얼굴 인증 풀
+# - 세션마다 스레드를 띄워 polling 하는 대신, 하나의 우선순위 큐(blocking)와 dispatcher 스레드가
+#   dlib 작업을 워커 프로세스들에 배분합니다. (dlib은 GIL을 잡고 있으므로 코어 수만큼 확장하려면 프로세스가 필요)
+# - 인증 마감 시각(due_time)이 빠른 세션, 즉 인증이 더 밀린 세션이 먼저 처리됩니다.
+# - 워커가 모두 바쁜 동안 쌓인 작업은 한 번에 묶어(batch) 전달합니다.
+
+FACE_VERIFICATION_WORKERS = int(os.environ.get("FACE_VERIFICATION_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+FACE_VERIFICATION_BATCH_SIZE = int(os.environ.get("FACE_VERIFICATION_BATCH_SIZE", "4"))
+# "hog"(CPU) 또는 "cnn"(GPU). cnn 에서는 같은 크기의 프레임을 batch_face_locations 로 한 번에 검출합니다.
+FACE_DETECTION_MODEL = os.environ.get("FACE_DETECTION_MODEL", "hog")
+
+
+class VerificationSlot:
+    """
+    세션별 인증 결과 슬롯. result 는 (verified, present) 튜플로 통째로 교체되므로 읽을 때 잠금이 필요 없습니다.
+    generation 은 등록 얼굴이 바뀌거나 세션이 종료될 때 증가하며, 이전 세대의 결과는 버려집니다.
+    """
+    __slots__ = ("result", "pending", "active", "generation", "last_completed_time")
+
+    def __init__(self):
+        self.result = (True, True)
+        self.pending = False
+        self.active = False
+        self.generation = 0
+        self.last_completed_time = None
+
+    def activate(self):
+        self.generation += 1
+        self.result = (True, True)
+        self.last_completed_time = None
+        self.active = True
+
+    def deactivate(self):
+        self.generation += 1
+        self.result = (True, True)
+        self.active = False
+
+
+def _verify_one(rgb_frame, registered_encoding, tolerance, face_locations):
+    try:
+        if not face_locations:
+            return False, False     # 얼굴 없음
+
+        current_face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        if not current_face_encodings:
+            return False, False     # 인코딩 실패
+
+        # 감지된 모든 얼굴과 등록 얼굴의 거리를 한 번에 계산, 하나라도 다르면 unknown
+        distances = face_recognition.face_distance(np.asarray(current_face_encodings), registered_encoding)
+        return bool(np.all(distances <= tolerance)), True
+    except Exception as e:
+        logger.error("Face verification internal error: %s", e, extra=HOT_PATH)
+        return False, False
+
+
+def verify_faces_batch(jobs):
+    """
+    워커 프로세스에서 실행됩니다.
+    jobs: [(rgb_frame, registered_encoding, tolerance), ...] -> [(verified, present), ...]
+    """
+    frames = [job[0] for job in jobs]
+    try:
+        if FACE_DETECTION_MODEL == "cnn" and len(frames) > 1 and all(f.shape == frames[0].shape for f in frames):
+            locations_per_frame = face_recognition.batch_face_locations(frames, batch_size=len(frames))
+        else:
+            locations_per_frame = [face_recognition.face_locations(f, model=FACE_DETECTION_MODEL) for f in frames]
+    except Exception as e:
+        logger.error("Face detection batch error: %s", e, extra=HOT_PATH)
+        return [(False, False)] * len(jobs)
+
+    return [
+        _verify_one(rgb_frame, registered_encoding, tolerance, face_locations)
+        for (rgb_frame, registered_encoding, tolerance), face_locations in zip(jobs, locations_per_frame)
+    ]
+
+
+# 등록 프레임 품질 점수에서 이 값 이상의 선명도(Laplacian 분산)는 모두 "충분히 선명"으로 봅니다.
+ENROLLMENT_SHARPNESS_REFERENCE = 100.0
+
+
+def analyze_enrollment_frame(rgb_frame):
+    """
+    워커 프로세스에서 실행됩니다. 등록용 프레임 한 장을 한 번만 검출/인코딩합니다.
+    반환값: (status, encoding | None, quality)
+      status: "ok" | "no_face" | "multiple_faces" | "encoding_failed"
+      quality: 얼굴 높이(px) x 선명도 비율(0~1). 클수록 좋은 프레임입니다.
+    """
+    try:
+        face_locations = face_recognition.face_locations(rgb_frame, model=FACE_DETECTION_MODEL)
+        if not face_locations:
+            return "no_face", None, 0.0
+        if len(face_locations) > 1:
+            return "multiple_faces", None, 0.0
+
+        encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        if not encodings:
+            return "encoding_failed", None, 0.0
+
+        top, right, bottom, left = face_locations[0]
+        face_gray = cv2.cvtColor(rgb_frame[top:bottom, left:right], cv2.COLOR_RGB2GRAY)
+        sharpness = cv2.Laplacian(face_gray, cv2.CV_64F).var() if face_gray.size else 0.0
+        quality = (bottom - top) * min(1.0, sharpness / ENROLLMENT_SHARPNESS_REFERENCE)
+        return "ok", encodings[0], float(quality)
+    except Exception as e:
+        logger.error("Face enrollment analysis error: %s", e, extra=HOT_PATH)
+        return "encoding_failed", None, 0.0
+
+
+class FaceVerificationPool:
+    def __init__(self, workers: int = FACE_VERIFICATION_WORKERS, batch_size: int = FACE_VERIFICATION_BATCH_SIZE):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._jobs = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._free_workers = threading.Semaphore(workers)
+        self._start_lock = threading.Lock()
+        self._executor = None
+        self._dispatcher = None
+        self.completed = 0
+
+    def _ensure_started(self):
+        if self._dispatcher is not None:
+            return
+        with self._start_lock:
+            if self._dispatcher is not None:
+                return
+            # torch/mediapipe 스레드가 떠 있는 부모를 fork 하지 않도록 spawn 사용
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=setup_logging,
+            )
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="face-verification-dispatcher", daemon=True)
+            self._dispatcher.start()
+            logger.info("Face verification pool started (%s worker processes, batch=%s).", self.workers, self.batch_size)
+
+    def submit(self, slot: VerificationSlot, rgb_frame, registered_encoding, tolerance: float, due_time: float) -> bool:
+        """
+        세션의 인증 요청을 큐에 넣습니다. 이미 대기/처리 중인 요청이 있으면 무시합니다.
+        """
+        if not FACE_RECOGNITION_ENABLED or slot.pending or not slot.active:
+            return False
+        self._ensure_started()
+        slot.pending = True
+        self._jobs.put((due_time, next(self._seq), slot, slot.generation, rgb_frame, registered_encoding, tolerance))
+        return True
+
+    def run_task(self, fn, *args):
+        """
+        인증 큐를 거치지 않고 워커 프로세스에서 바로 실행합니다 (얼굴 등록처럼 드물고 사용자가 기다리는 작업용).
+        concurrent.futures.Future 를 반환합니다.
+        """
+        self._ensure_started()
+        return self._executor.submit(fn, *args)     # type: ignore
+
+    def queue_depth(self) -> int:
+        return self._jobs.qsize()
+
+    def _dispatch_loop(self):
+        while True:
+            # 빈 워커가 생길 때까지 기다린 뒤, 그 사이 쌓인 작업을 마감 순서대로 묶어서 보냅니다.
+            self._free_workers.acquire()
+            batch = [self._jobs.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            live_batch = []
+            for job in batch:
+                slot, generation = job[2], job[3]
+                if slot.active and slot.generation == generation:
+                    live_batch.append(job)
+                else:
+                    slot.pending = False
+
+            if not live_batch:
+                self._free_workers.release()
+                continue
+
+            try:
+                future = self._executor.submit(verify_faces_batch, [(job[4], job[5], job[6]) for job in live_batch])  # type: ignore
+            except Exception as e:
+                logger.error("Face verification pool submit error: %s", e, extra=HOT_PATH)
+                for job in live_batch:
+                    job[2].pending = False
+                self._free_workers.release()
+                continue
+            future.add_done_callback(partial(self._on_batch_done, live_batch))
+
+    def _on_batch_done(self, batch, future):
+        self._free_workers.release()
+        try:
+            results = future.result()
+        except Exception as e:
+            # 워커 오류 시 이전 결과를 유지합니다.
+            logger.error("Face verification worker error: %s", e, extra=HOT_PATH)
+            results = None
+
+        now = time.time()
+        for index, job in enumerate(batch):
+            slot, generation = job[2], job[3]
+            if results is not None and slot.generation == generation:
+                slot.result = results[index]
+                slot.last_completed_time = now
+            slot.pending = False
+        self.completed += len(batch)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+FACE_VERIFICATION_POOL = FaceVerificationPool()
@@ -0,0 +1,106 @@
+import os
+import struct
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# 여러 프레임을 묶은 /ws_stats 바이너리 메시지 (RTT 가 큰 모바일 회선용)
+# 일반 메시지는 JPEG 한 장이고, 아래 형식이면 묶음으로 처리합니다. 정수는 모두 little-endian 입니다.
+#
+#   b"VPFB" | uint16 프레임 수 | (float64 촬영 시각(ms) | uint32 JPEG 길이 | JPEG) x 프레임 수
+#
+# 촬영 시각은 클라이언트 시계 기준이므로 프레임 간 간격만 사용합니다. 묶음의 마지막 프레임을 서버 수신 시각에
+# 맞추고 나머지는 간격만큼 앞으로 배치합니다. 이전 메시지의 마지막 프레임(재접속한 세션은 엔진의 마지막 프레임)
+# 보다 앞서지 않고, 수신 시각보다 MAX_BATCH_SPAN_SECONDS 넘게 앞서지 않도록 보정합니다.
+# JPEG 디코드는 GIL 을 놓으므로 묶음 안의 프레임을 병렬로 디코드하고, 추론은 촬영 순서대로 한 장씩 합니다.
+
+FRAME_BATCH_MAGIC = b"VPFB"
+MAX_BATCH_FRAMES = int(os.environ.get("MAX_BATCH_FRAMES", "16"))
+# 묶음 하나가 차지할 수 있는 최대 시간 (최저 캡처 fps 1 에서 MAX_BATCH_FRAMES 장)
+MAX_BATCH_SPAN_SECONDS = float(os.environ.get("MAX_BATCH_SPAN_SECONDS", "16"))
+# INFERENCE_CAPACITY 는 resources.py 가 코어 예산으로 채웁니다. 형식/시각 처리 함수는 런타임(OpenCV 등) 없이
+# import 할 수 있도록 이 모듈은 resources 와 cv2 를 직접 import 하지 않습니다 (tests/test_frame_batch.py).
+FRAME_DECODE_WORKERS = int(os.environ.get("FRAME_DECODE_WORKERS", min(4, int(os.environ.get("INFERENCE_CAPACITY", "4")))))
+
+_HEADER = struct.Struct("<4sH")
+_FRAME_HEADER = struct.Struct("<dI")
+
+FRAME_DECODE_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, FRAME_DECODE_WORKERS), thread_name_prefix="frame-decode")
+
+
+def is_frame_batch(data: bytes) -> bool:
+    return data[:len(FRAME_BATCH_MAGIC)] == FRAME_BATCH_MAGIC
+
+
+def pack_frame_batch(frames: list[tuple[float, bytes]]) -> bytes:
+    """
+    (촬영 시각 ms, JPEG) 목록을 묶음 메시지로 만듭니다. (부하 테스트 등 클라이언트 구현 참고용)
+    """
+    parts = [_HEADER.pack(FRAME_BATCH_MAGIC, len(frames))]
+    for timestamp_ms, jpeg in frames:
+        parts.append(_FRAME_HEADER.pack(timestamp_ms, len(jpeg)))
+        parts.append(jpeg)
+    return b"".join(parts)
+
+
+def parse_frame_batch(data: bytes) -> list[tuple[float, memoryview]]:
+    """
+    묶음 메시지를 (촬영 시각 ms, JPEG) 목록으로 나눕니다. JPEG 은 복사하지 않습니다.
+    형식이 잘못되었거나 프레임이 MAX_BATCH_FRAMES 보다 많으면 ValueError.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("truncated batch header")
+    _, count = _HEADER.unpack_from(data, 0)
+    if count == 0 or count > MAX_BATCH_FRAMES:
+        raise ValueError(f"batch frame count {count} out of range (1..{MAX_BATCH_FRAMES})")
+
+    view = memoryview(data)
+    offset = _HEADER.size
+    entries = []
+    for _ in range(count):
+        if offset + _FRAME_HEADER.size > len(data):
+            raise ValueError("truncated frame header")
+        timestamp_ms, length = _FRAME_HEADER.unpack_from(data, offset)
+        offset += _FRAME_HEADER.size
+        if offset + length > len(data):
+            raise ValueError("truncated frame payload")
+        entries.append((timestamp_ms, view[offset:offset + length]))
+        offset += length
+    if offset != len(data):
+        raise ValueError("trailing bytes after last frame")
+    return entries
+
+
+def _decode_jpeg(jpeg) -> np.ndarray | None:
+    import cv2
+    return cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+
+
+def batch_frame_times(timestamps_ms: list[float], received_time: float, previous_frame_time: float) -> list[float]:
+    """
+    클라이언트 촬영 시각을 서버 시각으로 옮깁니다. 순서가 뒤집힌 시각은 앞 프레임과 같은 시각으로 둡니다.
+    모든 시각은 [max(previous_frame_time, received_time - MAX_BATCH_SPAN_SECONDS), received_time] 안에 둡니다.
+    """
+    last_ms = timestamps_ms[-1]
+    frame_times = []
+    floor = min(received_time, max(previous_frame_time, received_time - MAX_BATCH_SPAN_SECONDS))
+    for timestamp_ms in timestamps_ms:
+        frame_time = received_time - max(0.0, last_ms - timestamp_ms) / 1000.0
+        frame_time = min(received_time, max(frame_time, floor))
+        frame_times.append(frame_time)
+        floor = frame_time
+    return frame_times
+
+
+async def decode_frame_batch(data: bytes, received_time: float, previous_frame_time: float) -> list[tuple[np.ndarray, float]]:
+    """
+    묶음 메시지를 병렬 디코드해 촬영 순서대로 (BGR 프레임, 서버 기준 촬영 시각) 목록을 돌려줍니다.
+    디코드에 실패한 프레임은 빠집니다. 형식 오류는 ValueError.
+    """
+    entries = sorted(parse_frame_batch(data), key=lambda entry: entry[0])
+    loop = asyncio.get_running_loop()
+    frames = await asyncio.gather(*(
+        loop.run_in_executor(FRAME_DECODE_EXECUTOR, _decode_jpeg, jpeg) for _, jpeg in entries
+    ))
+    frame_times = batch_frame_times([timestamp_ms for timestamp_ms, _ in entries], received_time, previous_frame_time)
+    return [(frame, frame_time) for frame, frame_time in zip(frames, frame_times) if frame is not None]
@@ -0,0 +1,159 @@
+import os
+import time
+import argparse
+import statistics
+import cv2
+import numpy as np
+from profiles import PROFILES, load_models
+from ai_monitor import AIEngine
+from loadtest.run_load import load_frames
+
+# 추론 품질 프로필 벤치마크
+# 같은 녹화 프레임을 프로필마다 처리해 단계별 지연(p50/p95)과, 기준 프로필(기본: baseline) 대비
+# 판정 입력값의 일치도를 측정하고 마크다운 표로 저장합니다.
+#   - person / face / pose: 프레임별 검출 여부 일치율
+#   - EAR / tilt: 둘 다 얼굴을 검출한 프레임에서 EAR, head_tilt_ratio 의 평균 절대 오차
+#   - eyes-closed: EAR < EAR_THRESHOLD 판정 일치율
+#
+# 예시 (backend 디렉터리에서):
+#   python -m loadtest.bench_profiles --frames ./frames --output loadtest/PROFILE_BENCHMARK.md
+
+
+def percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else float("nan")
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def measure_profile(name: str, frames: list[np.ndarray], warmup: int) -> dict:
+    profile = PROFILES[name]
+    face_mesh, pose, yolo_model = load_models(profile)
+    engine = AIEngine(profile=name)     # 랜드마크 계산 함수만 사용
+
+    timings = {"yolo": [], "face_mesh": [], "pose": [], "total": []}
+    observations = []
+    for index, frame in enumerate(frames):
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        rgb_frame.flags.writeable = False
+
+        t0 = time.perf_counter()
+        results = yolo_model(frame, verbose=False, imgsz=profile.yolo_imgsz,
+                             conf=profile.yolo_confidence, classes=[AIEngine.PERSON_CLASS_ID])
+        t1 = time.perf_counter()
+        mesh_results = face_mesh.process(rgb_frame)
+        t2 = time.perf_counter()
+        pose_results = pose.process(rgb_frame)
+        t3 = time.perf_counter()
+
+        if index >= warmup:
+            timings["yolo"].append(t1 - t0)
+            timings["face_mesh"].append(t2 - t1)
+            timings["pose"].append(t3 - t2)
+            timings["total"].append(t3 - t0)
+
+        ear = tilt = None
+        if mesh_results.multi_face_landmarks:
+            landmarks = mesh_results.multi_face_landmarks[0].landmark
+            ear = (engine._get_ear(landmarks, AIEngine.LEFT_EYE_INDICES) +
+                   engine._get_ear(landmarks, AIEngine.RIGHT_EYE_INDICES)) / 2.0
+            face_width = engine._euclidean_distance(landmarks[234], landmarks[454])
+            tilt = abs(landmarks[1].y - landmarks[152].y) / face_width if face_width > 0 else 0.0
+        observations.append({
+            "person": any(len(r.boxes) > 0 for r in results),
+            "face": ear is not None,
+            "pose": pose_results.pose_landmarks is not None,
+            "ear": ear,
+            "tilt": tilt,
+        })
+
+    face_mesh.close()
+    pose.close()
+    return {"timings": timings, "observations": observations}
+
+
+def agreement(reference: list[dict], candidate: list[dict]) -> dict:
+    count = len(reference)
+    both_faces = [(r, c) for r, c in zip(reference, candidate) if r["face"] and c["face"]]
+
+    def rate(key):
+        return sum(r[key] == c[key] for r, c in zip(reference, candidate)) / count
+
+    def mae(key):
+        return statistics.fmean(abs(r[key] - c[key]) for r, c in both_faces) if both_faces else float("nan")
+
+    eyes_closed = [(r["ear"] < AIEngine.EAR_THRESHOLD) == (c["ear"] < AIEngine.EAR_THRESHOLD) for r, c in both_faces]
+    return {
+        "person": rate("person"),
+        "face": rate("face"),
+        "pose": rate("pose"),
+        "ear_mae": mae("ear"),
+        "tilt_mae": mae("tilt"),
+        "eyes_closed": sum(eyes_closed) / len(eyes_closed) if eyes_closed else float("nan"),
+    }
+
+
+def render_table(rows: list[dict], reference: str, frame_count: int, frame_shape) -> str:
+    lines = [
+        "# Inference profile benchmark",
+        "",
+        f"{frame_count} frames ({frame_shape[1]}x{frame_shape[0]}), single session, reference profile: `{reference}`.",
+        f"Host: {os.cpu_count()} logical CPUs. Latency in ms (p50 / p95). Agreement vs reference.",
+        "",
+        "| profile | YOLO | FaceMesh | Pose | total | person | face | pose | EAR MAE | tilt MAE | eyes-closed |",
+        "|---|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        t = row["timings"]
+        a = row["agreement"]
+        cells = [f"`{row['name']}`"]
+        for stage in ("yolo", "face_mesh", "pose", "total"):
+            cells.append(f"{percentile(t[stage], 50) * 1000:.1f} / {percentile(t[stage], 95) * 1000:.1f}")
+        cells += [f"{a['person']:.1%}", f"{a['face']:.1%}", f"{a['pose']:.1%}",
+                  f"{a['ear_mae']:.4f}", f"{a['tilt_mae']:.4f}", f"{a['eyes_closed']:.1%}"]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inference profiles")
+    parser.add_argument("--frames", help="녹화된 JPEG 프레임 디렉터리")
+    parser.add_argument("--video", help="프레임을 추출할 녹화 영상 (--frames 대신)")
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=10, help="지연 통계에서 제외할 앞부분 프레임 수")
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--reference", default="baseline")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "PROFILE_BENCHMARK.md"))
+    args = parser.parse_args()
+
+    if not args.frames and not args.video:
+        parser.error("--frames 또는 --video 가 필요합니다.")
+    encoded = load_frames(args.frames, args.video, args.max_frames)
+    frames = [cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) for data in encoded]
+    frames = [frame for frame in frames if frame is not None]
+    if len(frames) <= args.warmup:
+        parser.error("워밍업보다 많은 프레임이 필요합니다.")
+
+    names = [name.strip() for name in args.profiles.split(",") if name.strip()]
+    if args.reference not in names:
+        names.append(args.reference)
+
+    measured = {}
+    for name in names:
+        print(f"Benchmarking profile '{name}'...")
+        measured[name] = measure_profile(name, frames, args.warmup)
+
+    reference = measured[args.reference]["observations"]
+    rows = [
+        {"name": name, "timings": measured[name]["timings"],
+         "agreement": agreement(reference, measured[name]["observations"])}
+        for name in names
+    ]
+    table = render_table(rows, args.reference, len(frames), frames[0].shape)
+    print(table)
+    with open(args.output, "w") as f:
+        f.write(table)
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import os
+import glob
+import json
+import time
+import argparse
+import itertools
+import statistics
+import cv2
+from profiles import PROFILES
+from ai_monitor import AIEngine, Status, TRACKED_STATE_KEYS
+from admission import TIER_FULL
+from loadtest.bench_profiles import percentile
+
+# 정확도 대 속도 평가
+# 정답 구간이 붙은 녹화 세션을 파이프라인 설정(프로필 x 프레임 간격 x 해상도 x 과부하 단계)마다 AIEngine 으로
+# 처리해, 상태별 precision/recall 과 시간 집계 오차를 지연/CPU 비용과 함께 표로 저장합니다.
+# 비용(실시간 처리에 필요한 코어 수)과 품질(macro F1) 양쪽에서 다른 설정에 밀리지 않는 설정을 Pareto 로 표시합니다.
+#
+# 세션 파일 (JSON, 세션마다 하나):
+#   {
+#     "video": "session1.mp4",            # 또는 "frames": "session1_frames/" (파일 이름 순서 = 촬영 순서)
+#     "fps": 10,                           # 캡처 fps. 영상이 더 촘촘하면 이 간격으로 솎아냅니다 (frames 는 필수)
+#     "intervals": [                       # 세션 시작부터의 초. state: studying 또는 TRACKED_STATE_KEYS
+#       {"start": 0, "end": 95.0, "state": "studying"},
+#       {"start": 95.0, "end": 130.0, "state": "drowsy"}
+#     ]
+#   }
+#
+# - 프레임별 지표는 엔진의 표시 상태와 그 시각의 정답을 비교합니다. 보정/초기화 중 프레임과 정답이 없는 프레임은 제외합니다.
+#   판정에 지속 시간 조건이 있으므로 recall 은 상태 시작 직후의 검출 지연만큼 낮게 나오며, 설정 간 비교에 씁니다.
+# - 시간 집계 오차는 세션 끝에서 엔진이 누적한 상태별 초와 같은 구간(보정 종료 ~ 마지막 프레임)의 정답 초의 차이입니다.
+# - 얼굴 인증은 사용하지 않습니다 (DB 없이 실행).
+#
+# 예시 (backend 디렉터리에서):
+#   python -m loadtest.eval_pipeline --sessions eval/*.json --profiles lite,balanced --strides 1,2,3 \
+#       --scales 1.0,0.5 --output loadtest/EVAL_PARETO.md
+
+STATES = ("studying",) + TRACKED_STATE_KEYS
+STATUS_TO_STATE = {
+    Status.STUDYING: "studying",
+    Status.AWAY_UNKNOWN_PERSON: "away",
+    Status.AWAY_NOT_DETECTED: "away",
+    Status.LYING_DOWN: "lying_down",
+    Status.LOOKING_AWAY: "looking_away",
+    Status.DROWSY_CHIN: "drowsy",
+    Status.DROWSY_EYES: "drowsy",
+    Status.LEANING_BACK: "leaning_back",
+}
+
+
+class PipelineConfig:
+    __slots__ = ("profile", "stride", "scale", "tier")
+
+    def __init__(self, profile: str, stride: int, scale: float, tier: int):
+        self.profile = profile
+        self.stride = stride
+        self.scale = scale
+        self.tier = tier
+
+    @property
+    def name(self) -> str:
+        return f"{self.profile} /{self.stride} x{self.scale:g} t{self.tier}"
+
+
+def load_session(path: str) -> dict:
+    with open(path) as f:
+        session = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for key in ("video", "frames"):
+        if session.get(key):
+            session[key] = os.path.join(base_dir, session[key])
+    if not session.get("video") and not session.get("frames"):
+        raise ValueError(f"{path}: 'video' 또는 'frames' 가 필요합니다.")
+    if session.get("frames") and not session.get("fps"):
+        raise ValueError(f"{path}: 'frames' 세션은 'fps' 가 필요합니다.")
+    for interval in session["intervals"]:
+        if interval["state"] not in STATES:
+            raise ValueError(f"{path}: 알 수 없는 상태 '{interval['state']}' (가능: {', '.join(STATES)})")
+    session["name"] = os.path.splitext(os.path.basename(path))[0]
+    return session
+
+
+def iter_session_frames(session: dict):
+    """
+    (세션 시작부터의 초, BGR 프레임) 을 캡처 fps 간격으로 차례로 돌려줍니다. 세션 전체를 메모리에 올리지 않습니다.
+    """
+    if session.get("frames"):
+        paths = sorted(glob.glob(os.path.join(session["frames"], "*.jpg")) + glob.glob(os.path.join(session["frames"], "*.jpeg")))
+        for index, path in enumerate(paths):
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                yield index / session["fps"], frame
+        return
+
+    capture = cv2.VideoCapture(session["video"])
+    video_fps = capture.get(cv2.CAP_PROP_FPS) or session.get("fps") or 10.0
+    step = max(1, round(video_fps / session["fps"])) if session.get("fps") else 1
+    index = 0
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        if index % step == 0:
+            yield index / video_fps, frame
+        index += 1
+    capture.release()
+
+
+def truth_at(intervals: list[dict], offset: float) -> str | None:
+    for interval in intervals:
+        if interval["start"] <= offset < interval["end"]:
+            return interval["state"]
+    return None
+
+
+def truth_seconds(intervals: list[dict], start: float, end: float) -> dict:
+    seconds = dict.fromkeys(STATES, 0.0)
+    for interval in intervals:
+        overlap = min(end, interval["end"]) - max(start, interval["start"])
+        if overlap > 0:
+            seconds[interval["state"]] += overlap
+    return seconds
+
+
+def run_session(config: PipelineConfig, session: dict) -> dict:
+    engine = AIEngine(profile=config.profile)
+    engine.load_user_stats({}, None)
+    engine._load_models_if_needed()     # 모델 로드는 지연 통계에서 제외
+    # 엔진은 프레임 시각이 되돌아가는 것을 받지 않으므로 영상 시각을 엔진 생성 시각에 이어 붙입니다.
+    base_time = engine.frame_time
+
+    latencies = []
+    pairs = []                          # (정답, 예측) - 채점 대상 프레임
+    scored_start = None
+    last_offset = 0.0
+    cpu_start = time.process_time()
+    for index, (offset, frame) in enumerate(iter_session_frames(session)):
+        if index % config.stride:
+            continue
+        if config.scale != 1.0:
+            frame = cv2.resize(frame, None, fx=config.scale, fy=config.scale, interpolation=cv2.INTER_AREA)
+
+        t0 = time.perf_counter()
+        engine.process(frame, base_time + offset, config.tier)
+        latencies.append(time.perf_counter() - t0)
+        last_offset = offset
+
+        predicted = STATUS_TO_STATE.get(engine.status)
+        if predicted is None:
+            continue
+        if scored_start is None:
+            scored_start = offset
+        truth = truth_at(session["intervals"], offset)
+        if truth is not None:
+            pairs.append((truth, predicted))
+    cpu_seconds = time.process_time() - cpu_start
+
+    # 마지막 프레임 시각으로 타이머를 확정합니다.
+    engine.suspend()
+    engine.close()
+    predicted_seconds = {"studying": engine.current_daily_study_time}
+    for index, key in enumerate(TRACKED_STATE_KEYS):
+        predicted_seconds[key] = engine.event_seconds[index]
+    expected_seconds = truth_seconds(session["intervals"], scored_start, last_offset) if scored_start is not None \
+        else dict.fromkeys(STATES, 0.0)
+
+    return {
+        "latencies": latencies,
+        "pairs": pairs,
+        "cpu_seconds": cpu_seconds,
+        "video_seconds": last_offset,
+        "predicted_seconds": predicted_seconds,
+        "expected_seconds": expected_seconds,
+    }
+
+
+def summarize(config: PipelineConfig, runs: list[dict]) -> dict:
+    latencies = [latency for run in runs for latency in run["latencies"]]
+    pairs = [pair for run in runs for pair in run["pairs"]]
+    video_seconds = sum(run["video_seconds"] for run in runs)
+
+    per_state = {}
+    f1_scores = []
+    for state in STATES:
+        true_positive = sum(truth == state and predicted == state for truth, predicted in pairs)
+        predicted_count = sum(predicted == state for _, predicted in pairs)
+        truth_count = sum(truth == state for truth, _ in pairs)
+        if truth_count == 0 and predicted_count == 0:
+            continue
+        precision = true_positive / predicted_count if predicted_count else 0.0
+        recall = true_positive / truth_count if truth_count else 0.0
+        per_state[state] = {"precision": precision, "recall": recall, "support": truth_count}
+        if truth_count:
+            f1_scores.append(2 * precision * recall / (precision + recall) if precision + recall else 0.0)
+
+    time_error = {}
+    for state in STATES:
+        predicted = sum(run["predicted_seconds"][state] for run in runs)
+        expected = sum(run["expected_seconds"][state] for run in runs)
+        time_error[state] = predicted - expected
+    expected_study = sum(run["expected_seconds"]["studying"] for run in runs)
+
+    return {
+        "name": config.name,
+        "config": {"profile": config.profile, "stride": config.stride, "scale": config.scale, "tier": config.tier},
+        "frames": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        # 실시간으로 처리할 때 세션 하나가 쓰는 코어 수
+        "cores_per_session": sum(run["cpu_seconds"] for run in runs) / video_seconds if video_seconds else float("nan"),
+        "macro_f1": statistics.fmean(f1_scores) if f1_scores else float("nan"),
+        "accuracy": sum(truth == predicted for truth, predicted in pairs) / len(pairs) if pairs else float("nan"),
+        "study_time_error_pct": time_error["studying"] / expected_study * 100 if expected_study else float("nan"),
+        "non_study_time_abs_error_s": sum(abs(time_error[state]) for state in TRACKED_STATE_KEYS),
+        "time_error_s": time_error,
+        "per_state": per_state,
+    }
+
+
+def mark_pareto(rows: list[dict]):
+    """
+    비용(cores_per_session)이 더 낮거나 같고 품질(macro_f1)이 더 높거나 같은 (그리고 하나는 엄격히 나은) 설정이
+    없으면 Pareto 최적입니다.
+    """
+    for row in rows:
+        row["pareto"] = not any(
+            other is not row
+            and other["cores_per_session"] <= row["cores_per_session"]
+            and other["macro_f1"] >= row["macro_f1"]
+            and (other["cores_per_session"] < row["cores_per_session"] or other["macro_f1"] > row["macro_f1"])
+            for other in rows
+        )
+
+
+def render_report(rows: list[dict], sessions: list[dict]) -> str:
+    lines = [
+        "# Pipeline accuracy vs speed",
+        "",
+        f"{len(sessions)} labeled session(s): {', '.join(session['name'] for session in sessions)}. "
+        f"Host: {os.cpu_count()} logical CPUs. Config: `profile /frame-stride xscale t<tier>`.",
+        "Cores = CPU seconds per second of video for one session. Pareto = not dominated on (cores, macro F1).",
+        "",
+        "| config | frames | p50 ms | p95 ms | cores | macro F1 | accuracy | study time err | non-study abs err | pareto |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for row in sorted(rows, key=lambda row: row["cores_per_session"]):
+        lines.append(
+            f"| `{row['name']}` | {row['frames']} | {row['p50_ms']:.1f} | {row['p95_ms']:.1f} | "
+            f"{row['cores_per_session']:.2f} | {row['macro_f1']:.3f} | {row['accuracy']:.1%} | "
+            f"{row['study_time_error_pct']:+.1f}% | {row['non_study_time_abs_error_s']:.0f}s | {'★' if row['pareto'] else ''} |"
+        )
+
+    lines += [
+        "",
+        "## Per-state precision / recall",
+        "",
+        "| config | " + " | ".join(STATES) + " |",
+        "|---|" + "---|" * len(STATES),
+    ]
+    for row in sorted(rows, key=lambda row: row["cores_per_session"]):
+        cells = []
+        for state in STATES:
+            metrics = row["per_state"].get(state)
+            cells.append(f"{metrics['precision']:.2f} / {metrics['recall']:.2f}" if metrics else "-")
+        lines.append(f"| `{row['name']}` | " + " | ".join(cells) + " |")
+
+    lines += [
+        "",
+        "## Time accounting error (predicted - truth, seconds)",
+        "",
+        "| config | " + " | ".join(STATES) + " |",
+        "|---|" + "---|" * len(STATES),
+    ]
+    for row in sorted(rows, key=lambda row: row["cores_per_session"]):
+        lines.append(f"| `{row['name']}` | " + " | ".join(f"{row['time_error_s'][state]:+.0f}" for state in STATES) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate pipeline configurations against labeled sessions")
+    parser.add_argument("--sessions", nargs="+", required=True, help="세션 JSON 파일들")
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--strides", default="1", help="처리할 프레임 간격 목록 (2 = 한 프레임씩 건너뜀)")
+    parser.add_argument("--scales", default="1.0", help="프레임 축소 비율 목록")
+    parser.add_argument("--tiers", default=str(TIER_FULL), help="고정 과부하 단계 목록 (admission.py)")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "EVAL_PARETO.md"))
+    parser.add_argument("--json", help="전체 결과를 저장할 JSON 파일 경로")
+    args = parser.parse_args()
+
+    sessions = [load_session(path) for path in args.sessions]
+    profiles = [name.strip() for name in args.profiles.split(",") if name.strip()]
+    unknown = [name for name in profiles if name not in PROFILES]
+    if unknown:
+        parser.error(f"알 수 없는 프로필: {', '.join(unknown)}")
+    configs = [
+        PipelineConfig(profile, int(stride), float(scale), int(tier))
+        for profile, stride, scale, tier in itertools.product(
+            profiles, args.strides.split(","), args.scales.split(","), args.tiers.split(","))
+    ]
+
+    rows = []
+    for config in configs:
+        print(f"Evaluating {config.name}...")
+        runs = [run_session(config, session) for session in sessions]
+        rows.append(summarize(config, runs))
+    mark_pareto(rows)
+
+    report = render_report(rows, sessions)
+    print(report)
+    with open(args.output, "w") as f:
+        f.write(report)
+    print(f"Saved to {args.output}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
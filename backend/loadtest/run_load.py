@@ -0,0 +1,277 @@
+import os
+import glob
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import psutil
+import websockets
+from jose import jwt
+from frame_batch import pack_frame_batch
+
+# /ws_stats 합성 부하 테스트
+# 서명된 테스트 JWT로 N개의 동시 세션을 열고, 녹화된 JPEG 프레임을 목표 fps로 보냅니다.
+# 클라이언트와 같이 "응답을 받은 뒤 다음 프레임" 방식이며, 응답이 늦어 지나간 프레임 슬롯은 drop 으로 셉니다.
+# N 단계마다 처리량, 왕복 지연 p50/p99, drop 수, 서버 프로세스(+자식: 얼굴 인증 워커) CPU/RSS 를 출력합니다.
+# --batch K 이면 K 프레임을 묶음 메시지(frame_batch.py) 하나로 보냅니다. 지연은 메시지 단위, drop 은 프레임 단위입니다.
+#
+# 예시 (backend 디렉터리에서):
+#   uvicorn loadtest.supabase_stub:app --port 54321 &
+#   SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_SERVICE_KEY=stub.stub.stub SUPABASE_JWT_SECRET=loadtest \
+#       uvicorn main:app --port 8000 &
+#   python -m loadtest.run_load --frames ./frames --sessions 1,4,8,16 --fps 5 --duration 30 \
+#       --secret loadtest --server-pid <uvicorn pid>
+
+RESPONSE_TIMEOUT_SECONDS = 10.0
+SAMPLE_INTERVAL_SECONDS = 1.0
+
+
+def load_frames(frames_dir: str | None, video_path: str | None, max_frames: int) -> list[bytes]:
+    if frames_dir:
+        paths = sorted(glob.glob(os.path.join(frames_dir, "*.jpg")) + glob.glob(os.path.join(frames_dir, "*.jpeg")))
+        frames = []
+        for path in paths[:max_frames]:
+            with open(path, "rb") as f:
+                frames.append(f.read())
+        return frames
+
+    # 녹화 영상에서 JPEG 프레임 추출 (프론트엔드와 같은 품질 0.9)
+    import cv2
+    capture = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < max_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if ok:
+            frames.append(encoded.tobytes())
+    capture.release()
+    return frames
+
+
+def make_token(secret: str, index: int) -> str:
+    now = int(time.time())
+    return jwt.encode({
+        "email": f"loadtest-{index}@example.com",
+        "user_metadata": {"name": f"loadtest-{index}"},
+        "aud": "authenticated",
+        "iat": now,
+        "exp": now + 24 * 3600,
+    }, secret, algorithm="HS256")
+
+
+class SessionResult:
+    __slots__ = ("latencies", "sent", "processed", "dropped", "connected", "error")
+
+    def __init__(self):
+        self.latencies = []
+        self.sent = 0
+        self.processed = 0
+        self.dropped = 0
+        self.connected = False
+        self.error = None
+
+
+async def run_session(url: str, token: str, frames: list[bytes], fps: float, deadline: float,
+                      offset: int, honor_control: bool, batch: int = 1) -> SessionResult:
+    result = SessionResult()
+    interval = 1.0 / fps
+    batch = max(1, batch)
+    frame_index = offset
+    try:
+        async with websockets.connect(f"{url}?token={token}", max_size=None, open_timeout=RESPONSE_TIMEOUT_SECONDS) as ws:
+            result.connected = True
+            next_due = time.perf_counter()
+            while time.perf_counter() < deadline:
+                now = time.perf_counter()
+                if now < next_due:
+                    await asyncio.sleep(next_due - now)
+
+                sent_at = time.perf_counter()
+                if batch == 1:
+                    await ws.send(frames[frame_index % len(frames)])
+                else:
+                    # 지난 batch 개 프레임 슬롯에 찍힌 것처럼 촬영 시각을 interval 간격으로 붙입니다.
+                    captured_ms = time.time() * 1000
+                    await ws.send(pack_frame_batch([
+                        (captured_ms - (batch - 1 - k) * interval * 1000, frames[(frame_index + k) % len(frames)])
+                        for k in range(batch)
+                    ]))
+                frame_index += batch
+                result.sent += batch
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=RESPONSE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    result.dropped += batch
+                    next_due = time.perf_counter()
+                    continue
+                received_at = time.perf_counter()
+                result.latencies.append(received_at - sent_at)
+                result.processed += batch
+
+                if honor_control:
+                    control = json.loads(message).get("control")
+                    if control:
+                        interval = 1.0 / control["fps"]
+
+                # 응답을 기다리는 동안 지나간 프레임 슬롯은 보내지 못한 프레임(drop)
+                next_due += interval * batch
+                if received_at > next_due:
+                    missed = int((received_at - next_due) / interval)
+                    result.dropped += missed
+                    next_due += missed * interval
+    except websockets.ConnectionClosed as e:
+        result.error = f"closed {e.code} {e.reason}".strip()
+    except Exception as e:
+        result.error = str(e) or type(e).__name__
+    return result
+
+
+class ResourceSampler:
+    """
+    서버 프로세스와 자식 프로세스의 CPU(%)와 RSS 를 주기적으로 합산해 기록합니다.
+    """
+    def __init__(self, pid: int | None):
+        self.process = psutil.Process(pid) if pid else None
+        self.cpu_samples = []
+        self.rss_samples = []
+        self._known = {}
+
+    def _processes(self):
+        processes = [self.process]
+        try:
+            processes += self.process.children(recursive=True)
+        except psutil.Error:
+            pass
+        return processes
+
+    def _sample(self):
+        cpu = 0.0
+        rss = 0
+        for process in self._processes():
+            try:
+                # cpu_percent 는 같은 Process 객체의 이전 호출 이후 값을 돌려주므로 객체를 재사용합니다.
+                known = self._known.setdefault(process.pid, process)
+                cpu += known.cpu_percent(None)
+                rss += known.memory_info().rss
+            except psutil.Error:
+                self._known.pop(process.pid, None)
+        return cpu, rss
+
+    async def run(self, stop: asyncio.Event):
+        if self.process is None:
+            return
+        self._sample()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=SAMPLE_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            cpu, rss = self._sample()
+            self.cpu_samples.append(cpu)
+            self.rss_samples.append(rss)
+
+
+def percentile(values: list[float], q: int) -> float:
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def run_step(args, frames: list[bytes], sessions: int, start_index: int) -> dict:
+    deadline = time.perf_counter() + args.ramp + args.duration
+    sampler = ResourceSampler(args.server_pid)
+    stop = asyncio.Event()
+    sampler_task = asyncio.create_task(sampler.run(stop))
+
+    async def delayed_session(index: int):
+        # ramp 동안 연결을 고르게 분산시켜 연결 폭주(thundering herd)를 피합니다.
+        if args.ramp > 0:
+            await asyncio.sleep(args.ramp * index / sessions)
+        return await run_session(args.url, make_token(args.secret, start_index + index), frames,
+                                 args.fps, deadline, offset=index * 7, honor_control=args.honor_control,
+                                 batch=args.batch)
+
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*(delayed_session(index) for index in range(sessions)))
+    elapsed = time.perf_counter() - started_at
+    stop.set()
+    await sampler_task
+
+    latencies = [latency for result in results for latency in result.latencies]
+    processed = sum(result.processed for result in results)
+    errors = [result.error for result in results if result.error]
+    return {
+        "sessions": sessions,
+        "connected": sum(result.connected for result in results),
+        "frames": processed,
+        "throughput_fps": processed / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "dropped": sum(result.dropped for result in results),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "cpu_percent_avg": statistics.fmean(sampler.cpu_samples) if sampler.cpu_samples else None,
+        "rss_mb_peak": max(sampler.rss_samples) / (1024 * 1024) if sampler.rss_samples else None,
+    }
+
+
+def print_row(row: dict):
+    cpu = f"{row['cpu_percent_avg']:.0f}" if row["cpu_percent_avg"] is not None else "-"
+    rss = f"{row['rss_mb_peak']:.0f}" if row["rss_mb_peak"] is not None else "-"
+    print(f"{row['sessions']:>5} {row['connected']:>5} {row['frames']:>8} {row['throughput_fps']:>8.1f} "
+          f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['dropped']:>8} {row['errors']:>6} {cpu:>6} {rss:>8}")
+    if row["first_error"]:
+        print(f"      first error: {row['first_error']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Synthetic /ws_stats load test")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws_stats")
+    parser.add_argument("--secret", default=os.environ.get("SUPABASE_JWT_SECRET"), help="백엔드와 같은 SUPABASE_JWT_SECRET")
+    parser.add_argument("--frames", help="녹화된 JPEG 프레임 디렉터리")
+    parser.add_argument("--video", help="JPEG 프레임을 추출할 녹화 영상 (--frames 대신)")
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--sessions", default="1,2,4,8,16", help="단계별 동시 세션 수 (쉼표 구분)")
+    parser.add_argument("--fps", type=float, default=10.0, help="세션별 목표 fps")
+    parser.add_argument("--duration", type=float, default=30.0, help="단계별 측정 시간(초)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="단계 시작 시 연결을 분산시킬 시간(초)")
+    parser.add_argument("--server-pid", type=int, help="CPU/RSS 를 측정할 uvicorn 프로세스 PID")
+    parser.add_argument("--honor-control", action="store_true", help="서버가 보내는 capture control 의 fps 를 따름")
+    parser.add_argument("--batch", type=int, default=1, help="메시지 하나에 묶어 보낼 프레임 수")
+    parser.add_argument("--json", help="결과를 저장할 JSON 파일 경로")
+    args = parser.parse_args()
+
+    if not args.secret:
+        parser.error("--secret 또는 SUPABASE_JWT_SECRET 이 필요합니다.")
+    if not args.frames and not args.video:
+        parser.error("--frames 또는 --video 가 필요합니다.")
+    frames = load_frames(args.frames, args.video, args.max_frames)
+    if not frames:
+        parser.error("프레임을 찾지 못했습니다.")
+
+    steps = [int(value) for value in args.sessions.split(",") if value.strip()]
+    avg_kb = sum(len(frame) for frame in frames) / len(frames) / 1024
+    print(f"Loaded {len(frames)} frames (avg {avg_kb:.1f} KB), target {args.fps} fps/session, {args.duration}s per step")
+    print(f"{'N':>5} {'conn':>5} {'frames':>8} {'fps':>8} {'p50ms':>8} {'p99ms':>8} {'dropped':>8} {'errors':>6} {'cpu%':>6} {'rssMB':>8}")
+
+    rows = []
+    start_index = 0
+    for sessions in steps:
+        row = await run_step(args, frames, sessions, start_index)
+        # 단계마다 새 사용자를 써서 이전 단계의 세션/통계와 섞이지 않게 합니다.
+        start_index += sessions
+        rows.append(row)
+        print_row(row)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
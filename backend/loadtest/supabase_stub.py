@@ -0,0 +1,151 @@
+import time
+import threading
+from fastapi import FastAPI, Request, Response, HTTPException
+
+# 부하 테스트용 로컬 Supabase(PostgREST) 대역
+# 백엔드가 실제로 사용하는 범위만 메모리에 구현합니다.
+#   - 테이블: user_stats, daily_user_stats, user_period_stats
+#   - 조회 필터: eq, select, order, limit / upsert(on_conflict), update(PATCH)
+#   - RPC: increment_user_stats, increment_period_stats
+#
+# 실행: uvicorn loadtest.supabase_stub:app --port 54321  (backend 디렉터리에서)
+# 백엔드: SUPABASE_URL=http://127.0.0.1:54321, SUPABASE_SERVICE_KEY=<아무 JWT 형식 문자열>
+
+PRIMARY_KEYS = {
+    "user_stats": ("user_email",),
+    "daily_user_stats": ("user_email", "date"),
+    "user_period_stats": ("user_email", "period_type", "period_key"),
+}
+
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+app = FastAPI()
+
+tables: dict[str, dict[tuple, dict]] = {name: {} for name in PRIMARY_KEYS}
+request_counts: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def _count(name: str):
+    request_counts[name] = request_counts.get(name, 0) + 1
+
+
+def _get_table(table: str) -> dict:
+    rows = tables.get(table)
+    if rows is None:
+        raise HTTPException(status_code=404, detail=f"relation \"public.{table}\" does not exist")
+    return rows
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _parse_filters(request: Request) -> list:
+    filters = []
+    for column, expression in request.query_params.multi_items():
+        if column in _RESERVED_PARAMS:
+            continue
+        operator, _, value = expression.partition(".")
+        if operator != "eq":
+            raise HTTPException(status_code=400, detail=f"Unsupported filter operator: {operator}")
+        filters.append((column, _unquote(value)))
+    return filters
+
+
+def _matches(row: dict, filters: list) -> bool:
+    return all(str(row.get(column)) == value for column, value in filters)
+
+
+def _project(row: dict, select: str | None) -> dict:
+    if not select or select.strip() == "*":
+        return dict(row)
+    columns = [column.strip() for column in select.split(",") if column.strip()]
+    return {column: row.get(column) for column in columns}
+
+
+def _upsert_row(table: str, values: dict) -> dict:
+    rows = _get_table(table)
+    key = tuple(values.get(column) for column in PRIMARY_KEYS[table])
+    row = rows.get(key)
+    if row is None:
+        row = {}
+        rows[key] = row
+    row.update(values)
+    return row
+
+
+@app.get("/rest/v1/{table}")
+async def select_rows(table: str, request: Request):
+    params = request.query_params
+    filters = _parse_filters(request)
+    with _lock:
+        _count(f"select:{table}")
+        rows = [row for row in _get_table(table).values() if _matches(row, filters)]
+        order = params.get("order")
+        if order:
+            column, _, direction = order.partition(".")
+            rows.sort(key=lambda row: row.get(column) or 0, reverse=direction.startswith("desc"))
+        if params.get("limit"):
+            rows = rows[:int(params["limit"])]
+        return [_project(row, params.get("select")) for row in rows]
+
+
+@app.post("/rest/v1/{table}")
+async def insert_rows(table: str, request: Request):
+    body = await request.json()
+    payload = body if isinstance(body, list) else [body]
+    with _lock:
+        _count(f"upsert:{table}")
+        return [dict(_upsert_row(table, values)) for values in payload]
+
+
+@app.patch("/rest/v1/{table}")
+async def update_rows(table: str, request: Request):
+    values = await request.json()
+    filters = _parse_filters(request)
+    with _lock:
+        _count(f"update:{table}")
+        updated = []
+        for row in _get_table(table).values():
+            if _matches(row, filters):
+                row.update(values)
+                updated.append(dict(row))
+        return updated
+
+
+@app.post("/rest/v1/rpc/{function}")
+async def call_rpc(function: str, request: Request):
+    params = await request.json()
+    with _lock:
+        _count(f"rpc:{function}")
+        if function == "increment_user_stats":
+            row = _upsert_row("user_stats", {"user_email": params["p_user_email"], "user_name": params["p_user_name"]})
+            row["total_study_seconds"] = (row.get("total_study_seconds") or 0) + params["p_study_seconds_delta"]
+        elif function == "increment_period_stats":
+            for period_type, key in params["p_period_keys"].items():
+                row = _upsert_row("user_period_stats", {
+                    "user_email": params["p_user_email"], "period_type": period_type,
+                    "period_key": key, "user_name": params["p_user_name"],
+                })
+                for column, delta in params["p_deltas"].items():
+                    row[column] = (row.get(column) or 0) + delta
+                row["updated_at"] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        else:
+            raise HTTPException(status_code=404, detail=f"function public.{function} does not exist")
+    # void 함수: PostgREST 와 같이 본문 없이 응답
+    return Response(status_code=204)
+
+
+@app.get("/stub/stats")
+async def stub_stats():
+    """
+    부하 테스트 결과 확인용: 테이블별 행 수와 요청 수
+    """
+    with _lock:
+        return {
+            "rows": {name: len(rows) for name, rows in tables.items()},
+            "requests": dict(request_counts),
+        }
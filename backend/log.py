@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# 비동기 구조화 로깅
+# - 로그 호출은 레코드를 큐에 넣기만 하고, 실제 stdout 쓰기는 백그라운드 리스너 스레드가 합니다.
+#   (추론 스레드/이벤트 루프가 stdout 쓰기를 기다리지 않음)
+# - 프레임마다 발생할 수 있는 메시지는 extra=HOT_PATH 로 표시하면 메시지 템플릿별로 초당 LOG_HOT_PATH_RATE 개까지만
+#   통과하고, 억제된 건수는 다음 통과 레코드에 suppressed 필드로 붙습니다. sampled(rate) 는 추가로 표본 추출합니다.
+# - 메시지는 %-형식 템플릿과 인자로 남깁니다 (log.info("connected: %s", email)). 템플릿이 같으면 같은 메시지로 봅니다.
+#
+# LOG_LEVEL (INFO), LOG_FORMAT ("text" | "json"), LOG_HOT_PATH_RATE (1.0), LOG_HOT_PATH_BURST (5)
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_HOT_PATH_RATE = float(os.environ.get("LOG_HOT_PATH_RATE", "1.0"))
+LOG_HOT_PATH_BURST = float(os.environ.get("LOG_HOT_PATH_BURST", "5"))
+
+HOT_PATH = {"hot_path": True}
+
+# LogRecord 기본 속성. 그 밖의 extra 키는 JSON 출력의 구조화 필드가 됩니다.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+_CONTROL_ATTRS = {"hot_path", "sample_rate"}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def sampled(rate: float) -> dict:
+    """
+    hot path 메시지 중 rate 비율만 남깁니다. 예: log.debug("frame %s", n, extra=sampled(0.01))
+    """
+    return {"hot_path": True, "sample_rate": rate}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    hot path 레코드에 메시지 템플릿별 토큰 버킷을 적용합니다. 큐에 넣기 전에 걸러 큐가 불어나지 않게 합니다.
+    """
+    def __init__(self, rate: float = LOG_HOT_PATH_RATE, burst: float = LOG_HOT_PATH_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}      # (logger, template) -> [tokens, last_time, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "hot_path", False):
+            return True
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return False
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1.0
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" (+{suppressed} similar suppressed)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in _CONTROL_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging():
+    """
+    루트 로거를 큐 기반으로 설정합니다. 여러 번 호출해도 한 번만 적용됩니다.
+    (얼굴 인증 워커처럼 spawn 된 프로세스에서도 호출해 같은 형식/제한을 씁니다)
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        log_queue = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+        # QueueHandler 는 호출 스레드에서 메시지/예외를 문자열로 만든 뒤 큐에 넣습니다 (필터는 그 전에 적용).
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter())
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def _restart_after_fork():
+    """
+    fork 된 자식(pre-fork 워커)에는 리스너 스레드가 없으므로 새 큐와 리스너로 다시 설정합니다.
+    """
+    global _listener, _setup_lock
+    _setup_lock = threading.Lock()
+    if _listener is not None:
+        _listener = None
+        setup_logging()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def stop_logging():
+    """
+    큐에 남은 로그를 모두 쓰고 리스너 스레드를 멈춥니다.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -1,4 +1,7 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Body, Query, UploadFile, File
+import resources     # 런타임 스레드 환경변수 설정: 다른 모든 import 보다 먼저
+from log import setup_logging, HOT_PATH
+setup_logging()     # 모듈 import 중 남기는 로그도 큐를 거치도록 먼저 설정
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Body, Query, UploadFile, File, Header, Depends
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -8,31 +11,183 @@ from datetime import datetime, timezone, timedelta
 from jose import jwt, JWTError 
 from supabase import create_client, Client 
 import os
+import re
+import uuid
+import logging
 from dotenv import load_dotenv
-from ai_monitor import get_current_stats, AIEngine
+from ai_monitor import get_current_stats, AIEngine, INFERENCE_STAGE_EXECUTOR, STATUS_LABELS, fetch_face_encoding, register_user_face, enroll_user_face, delete_registered_face, ENROLLMENT_MAX_FRAMES
+from timeline import flush_timeline, summarize_timeline
+from face_pool import FACE_VERIFICATION_POOL
+from rooms import room_registry
+from ranking_feed import RankingFeed
+from capture_control import InferenceLoad, CaptureController
+from admission import AdmissionController, DegradationGovernor
+from profiles import PROFILES
+from session_park import SessionPark, ParkedSession
+from resources import SESSION_INFERENCE_EXECUTOR, UtilizationMonitor, configure_runtimes
+from scheduler import InferenceScheduler, PRIORITY_AUTHENTICATED, PRIORITY_ANONYMOUS
+from video_stream import VIDEO_INGEST_AVAILABLE, VIDEO_CONTAINER_FORMATS, VideoFrameSource
+from frame_batch import FRAME_DECODE_EXECUTOR, is_frame_batch, decode_frame_batch
+from shadow import ShadowRunner, write_shadow_rows, summarize_shadow
+from rollups import increment_period_rollups, fetch_period_rollup, fetch_period_ranking, period_key
 import cv2 
 import numpy as np 
 from contextlib import asynccontextmanager
 
 load_dotenv() 
 
+logger = logging.getLogger(__name__)
+
 url: str = os.environ.get("SUPABASE_URL")                       # type: ignore
 key: str = os.environ.get("SUPABASE_SERVICE_KEY")                # type: ignore
 try:
     if url is None or key is None:
         raise ValueError("SUPABASE_URL or SUPABASE_SERVICE_KEY not set in .env")
     supabase: Client = create_client(url, key)
-    print("Supabase client initialized.")
+    logger.info("Supabase client initialized.")
 except Exception as e:
-    print(f"Error initializing Supabase: {e}")  
+    logger.error("Error initializing Supabase: %s", e)  
     supabase = None                             # type: ignore                      
 
 SUPABASE_JWT_SECRET: str = os.environ.get("SUPABASE_JWT_SECRET")    # type: ignore
 ALGORITHM = "HS256"
 
-app = FastAPI()
+# 다른 워커/노드에서 얼굴이 등록·삭제된 경우를 반영하기 위한 DB 재조회 주기 (0이면 비활성화)
+FACE_ENCODING_REFRESH_SECONDS = float(os.environ.get("FACE_ENCODING_REFRESH_SECONDS", "60"))
+
+configure_runtimes()
+utilization_monitor = UtilizationMonitor()
+# 운영 상태 조회(/api/admin/*)용 토큰. 설정하지 않으면 관리 엔드포인트는 비활성화됩니다.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# 프로세스 전체 추론 부하 (캡처 제어에 사용)
+inference_load = InferenceLoad()
+# 워커별 세션 상한과 과부하 단계
+admission = AdmissionController()
+degradation = DegradationGovernor()
+# 세션 간 공정한 추론 순서 (가중 공정 큐)
+inference_scheduler = InferenceScheduler()
+# 표본 세션에서 다른 추론 프로필을 나란히 돌려 비교 (SHADOW_PROFILE 이 없으면 비활성화)
+shadow_runner = ShadowRunner()
+
+ROOM_ID_PATTERN = "^[A-Za-z0-9_-]{1,64}$"
+
+# 로컬 세션 레지스트리: 이 프로세스에서 WebSocket을 보유한 사용자별 AIEngine
+# (다른 워커의 세션은 여기에 없으며, 공유 상태인 DB를 통해서만 반영됩니다)
+active_sessions: dict[str, AIEngine] = {}
+
+
+def decode_user_from_token(token: str) -> tuple[str, str]:
+    """
+    Supabase JWT를 검증하고 (user_email, user_name)을 반환합니다.
+    """
+    payload = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=[ALGORITHM], options={"verify_aud": False})
+    user_email = payload.get("email")
+    if user_email is None:
+        raise JWTError("User email not in token payload")
+    user_metadata = payload.get("user_metadata", {})
+    user_name = user_metadata.get("name", user_email.split('@')[0])
+    return user_email, user_name
+
+
+async def get_current_user_email(authorization: str = Header(None)) -> str:
+    """
+    REST 요청의 Authorization: Bearer <Supabase JWT> 헤더로 사용자를 식별합니다.
+    """
+    if SUPABASE_JWT_SECRET is None:
+        raise HTTPException(status_code=503, detail="JWT secret key not configured")
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="로그인되지 않은 사용자입니다.")
+    try:
+        user_email, _ = decode_user_from_token(authorization.split(" ", 1)[1].strip())
+    except JWTError as e:
+        logger.warning("Invalid Supabase token: %s", e, extra=HOT_PATH)
+        raise HTTPException(status_code=401, detail="유효하지 않은 토큰입니다.")
+    return user_email
+
+
+def get_study_date():
+    """
+    KST 기준 논리적 공부 날짜 (오전 6시 이전은 전날로 취급)
+    """
+    kst_timezone = timezone(timedelta(hours=9))
+    now_kst = datetime.now(kst_timezone)
+    
+    if now_kst.hour < 6:
+        return now_kst.date() - timedelta(days=1)
+    return now_kst.date()
+
+
+def save_session_stats(engine: AIEngine, user_email: str, user_name: str, study_date, study_date_key: str):
+    """
+    세션 종료 시 일일 통계(총합)와 누적/주간/월간 통계(델타)를 저장합니다. (동기 함수)
+    """
+    engine.commit_all_running_timers()
+    final_daily_stats, session_delta_stats = engine.get_final_stats()
+    
+    final_daily_stats["user_email"] = user_email
+    final_daily_stats["user_name"] = user_name
+    final_daily_stats["date"] = study_date_key
+
+    supabase.table("daily_user_stats").upsert(
+        final_daily_stats, 
+        on_conflict="user_email,date" 
+    ).execute()
+    logger.info("Daily stats (total) saved to Supabase for user: %s", user_email)
+
+    if session_delta_stats["study_seconds"] > 0:
+        
+        rpc_payload = {
+            "p_user_email": user_email,
+            "p_user_name": user_name,
+            "p_study_seconds_delta": session_delta_stats["study_seconds"]
+        }
+
+        supabase.rpc("increment_user_stats", rpc_payload).execute()
+        logger.info("Total stats (delta) incremented for user: %s", user_email)
+    else:
+        logger.info("No study time in this session. Total stats not updated.")
+
+    if increment_period_rollups(supabase, user_email, user_name, study_date, session_delta_stats):
+        logger.info("Weekly/monthly rollups incremented for user: %s", user_email)
+
+
+async def persist_session(parked: ParkedSession):
+    """
+    로그인 사용자 세션을 DB/타임라인에 저장하고 엔진을 닫습니다. 재접속 대기 시간이 끝났을 때 호출됩니다.
+    """
+    engine = parked.engine
+    try:
+        if supabase:
+            try:
+                await asyncio.to_thread(save_session_stats, engine, parked.user_email, parked.user_name,
+                                        parked.study_date, parked.study_date_key)
+            except Exception as e:
+                logger.error("Error saving stats to Supabase: %s", e)
+
+        try:
+            engine.record_session_end()
+            rows = await asyncio.to_thread(flush_timeline, engine.timeline, parked.user_email, parked.study_date_key)
+            logger.info("Timeline flushed for user: %s (%s transitions)", parked.user_email, rows)
+        except Exception as e:
+            logger.error("Error flushing timeline: %s", e)
+    finally:
+        engine.close()
+
+
+session_park = SessionPark(on_expire=persist_session)
+
+
+def find_session(user_email: str) -> AIEngine | None:
+    """
+    이 프로세스에서 연결 중이거나 재접속 대기 중인 사용자 세션.
+    """
+    session = active_sessions.get(user_email)
+    if session is None:
+        parked = session_park.peek(user_email)
+        session = parked.engine if parked is not None else None
+    return session
 
-ai_engine_instance: AIEngine | None = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -40,23 +195,31 @@ async def lifespan(app: FastAPI):
     FastAPI 앱의 라이프사이클 관리자 (최신 방식)
     """
     # --- 앱 시작 시 실행 ---
-    global ai_engine_instance
-    print("FastAPI lifespan event: Initializing AIEngine (lazily)...")
-    try:
-        ai_engine_instance = AIEngine(supabase_client=supabase)
-        
-        print("FastAPI lifespan event: AIEngine initialized successfully (models will load on first request).")
-    except Exception as e:
-        print(f"CRITICAL: Failed to initialize AIEngine during startup: {e}")
-        ai_engine_instance = None
+    logger.info("FastAPI lifespan event: AIEngine instances are created per WebSocket session.")
+    ranking_feed.start()
     
     # --- yield: 이 시점에서 FastAPI 앱이 요청을 받기 시작 ---
     yield
     
-    if ai_engine_instance:
-        print("FastAPI lifespan event: Shutting down AIEngine...")
-        del ai_engine_instance
-    print("FastAPI lifespan event: Shutdown complete.")
+    ranking_feed.stop()
+    if session_park.sessions or session_park.tasks:
+        logger.info("FastAPI lifespan event: Saving %s parked session(s)...", len(session_park.sessions))
+        await session_park.expire_all()
+    if active_sessions:
+        logger.info("FastAPI lifespan event: Shutting down %s active session(s)...", len(active_sessions))
+        for engine in list(active_sessions.values()):
+            engine.close()
+        active_sessions.clear()
+    FACE_VERIFICATION_POOL.shutdown()
+    INFERENCE_STAGE_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    SESSION_INFERENCE_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    FRAME_DECODE_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    shadow_runner.shutdown()
+    try:
+        await asyncio.to_thread(write_shadow_rows, shadow_runner.drain())
+    except Exception as e:
+        logger.error("Error flushing shadow comparisons: %s", e)
+    logger.info("FastAPI lifespan event: Shutdown complete.")
 
 app = FastAPI(lifespan=lifespan)
 
@@ -78,17 +241,64 @@ app.add_middleware(
 def read_root():
     return {"Hello": "NODOZE AI Backend"}
 
+async def receive_jpeg_frames(websocket: WebSocket, last_frame_time: float) -> list:
+    """
+    /ws_stats 의 프레임 공급자. 메시지 하나(JPEG 한 장 또는 묶음)를 (BGR 프레임, 시각) 목록으로 돌려줍니다.
+    """
+    image_bytes = await websocket.receive_bytes()
+    received_time = time.time()
+
+    if is_frame_batch(image_bytes):
+        try:
+            frames = await decode_frame_batch(image_bytes, received_time, last_frame_time)
+        except ValueError as e:
+            logger.warning("WS: Malformed frame batch, skipping: %s", e, extra=HOT_PATH)
+            return []
+    else:
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        frames = [(frame, received_time)] if frame is not None else []
+
+    if not frames:
+        logger.warning("WS: Received empty frame, skipping...", extra=HOT_PATH)
+    return frames
+
+
 @app.websocket("/ws_stats")
-async def websocket_stats_endpoint(websocket: WebSocket, token: str = Query(None)):
+async def websocket_stats_endpoint(websocket: WebSocket, token: str = Query(None), room: str = Query(None, pattern=ROOM_ID_PATTERN),
+                                   profile: str = Query(None)):
+    async def receive_frames(last_frame_time: float) -> list:
+        return await receive_jpeg_frames(websocket, last_frame_time)
 
-    user_email = None                              # type: ignore                 
-    user_name = "Ananymous"                                         
-    
-    if ai_engine_instance is None:
+    await run_stats_session(websocket, token, room, profile, receive_frames)
+
+
+@app.websocket("/ws_video")
+async def websocket_video_endpoint(websocket: WebSocket, token: str = Query(None), room: str = Query(None, pattern=ROOM_ID_PATTERN),
+                                   profile: str = Query(None), container: str = Query(None)):
+    """
+    /ws_stats 와 같은 세션이지만 JPEG 대신 연속 영상 스트림(WebM/VP8 청크 등)을 받습니다.
+    응답은 분석한 프레임마다 /ws_stats 와 같은 형식으로 보냅니다.
+    """
+    if not VIDEO_INGEST_AVAILABLE or (container is not None and container not in VIDEO_CONTAINER_FORMATS):
         await websocket.accept()
-        print("WS: AI Engine not initialized. Closing connection.")
-        await websocket.close(code=1011, reason="AI Engine not initialized")
+        await websocket.close(code=1003, reason="Video ingestion not available")
         return
+
+    frame_source = VideoFrameSource(websocket, VIDEO_CONTAINER_FORMATS.get(container))
+    try:
+        await run_stats_session(websocket, token, room, profile, frame_source)
+    finally:
+        frame_source.close()
+
+
+async def run_stats_session(websocket: WebSocket, token: str | None, room: str | None, profile: str | None, receive_frames):
+    """
+    통계 세션 본체. receive_frames(last_frame_time) 는 다음에 분석할 (BGR 프레임, 시각) 목록을 돌려주는 코루틴이며,
+    연결이 끊기면 WebSocketDisconnect 를 올립니다.
+    """
+    user_email = None                              # type: ignore                 
+    user_name = "Ananymous"                                         
         
     if token:
         if supabase is None:
@@ -96,38 +306,71 @@ async def websocket_stats_endpoint(websocket: WebSocket, token: str = Query(None
             await websocket.close(code=1011, reason="Supabase client not initialized")
             return
         if SUPABASE_JWT_SECRET is None:
-            print("ERROR: SUPABASE_JWT_SECRET not set in .env")
+            logger.error("ERROR: SUPABASE_JWT_SECRET not set in .env")
             await websocket.accept()
             await websocket.close(code=1011, reason="JWT secret key not configured")
             return
             
         try:
-            payload = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=[ALGORITHM], options={"verify_aud": False})
-            user_email: str = payload.get("email")                # type: ignore   
-            user_metadata = payload.get("user_metadata", {})
-            user_name: str = user_metadata.get("name", user_email.split('@')[0])    
-            if user_email is None:
-                raise JWTError("User email not in token payload")
+            user_email, user_name = decode_user_from_token(token)
         except JWTError as e:
-            print(f"Invalid Supabase token: {e}")
+            logger.warning("Invalid Supabase token: %s", e, extra=HOT_PATH)
             await websocket.accept()
             await websocket.close(code=1008, reason="Invalid token")
             return
-    
-    kst_timezone = timezone(timedelta(hours=9))
-    now_kst = datetime.now(kst_timezone)
-    
-    if now_kst.hour < 6:
-        logical_date_obj = now_kst.date() - timedelta(days=1)
-    else:
-        logical_date_obj = now_kst.date()
 
-    study_date_key = logical_date_obj.isoformat()
+    if profile is not None and profile not in PROFILES:
+        await websocket.accept()
+        await websocket.close(code=1008, reason="Unknown inference profile")
+        return
+
+    if not admission.try_admit():
+        logger.warning("WS: Session cap reached (%s), rejecting connection.", admission.max_sessions, extra=HOT_PATH)
+        await websocket.accept()
+        await websocket.send_json({"error": "server_busy", "retry_after": admission.retry_after})
+        await websocket.close(code=1013, reason=f"Server busy, retry after {admission.retry_after}s")
+        return
+
+    # 입장 이후 어느 단계에서 예외가 나도 세션 슬롯은 반드시 반납합니다.
+    try:
+        await run_admitted_session(websocket, user_email, user_name, room, profile, receive_frames)
+    finally:
+        admission.release()
+
+
+async def run_admitted_session(websocket: WebSocket, user_email: str | None, user_name: str, room: str | None,
+                               profile: str | None, receive_frames):
+    """
+    입장이 허용된 세션의 엔진 준비와 프레임 루프. 세션 슬롯 반납은 호출한 쪽(run_stats_session)이 합니다.
+    """
+    study_date = get_study_date()
+    study_date_key = study_date.isoformat()
+
+    # 재접속 대기 중인 세션이 있으면 그대로 이어받습니다 (DB 조회/보정 생략).
+    parked = session_park.resume(user_email) if user_email else None
+    if parked is not None and (parked.study_date_key != study_date_key or (profile is not None and profile != parked.engine.profile.name)):
+        # 공부 날짜나 추론 프로필이 바뀌었으면 이어받지 않고 저장 후 새로 시작합니다.
+        await persist_session(parked)
+        parked = None
+
+    if parked is not None:
+        ai_engine_instance = parked.engine
+    else:
+        try:
+            ai_engine_instance = AIEngine(supabase_client=supabase, profile=profile)
+        except Exception as e:
+            logger.critical("CRITICAL: Failed to initialize AIEngine for session: %s", e)
+            await websocket.accept()
+            await websocket.close(code=1011, reason="AI Engine not initialized")
+            return
+    
     await websocket.accept()
 
     try:
-        if user_email:
-            print(f"WebSocket client connected: {user_email}")
+        if parked is not None:
+            logger.info("WebSocket client resumed parked session: %s", user_email)
+        elif user_email:
+            logger.info("WebSocket client connected: %s", user_email)
             try:
                 supabase.table("user_stats").upsert(
                     {
@@ -137,9 +380,10 @@ async def websocket_stats_endpoint(websocket: WebSocket, token: str = Query(None
                     },
                     on_conflict="user_email"
                 ).execute()
-                print(f"Ensured user exists in user_stats: {user_email}")
+                logger.info("Ensured user exists in user_stats: %s", user_email)
             except Exception as e:
-                print(f"CRITICAL Error ensuring user in user_stats: {e}")
+                logger.critical("CRITICAL Error ensuring user in user_stats: %s", e)
+                ai_engine_instance.close()
                 await websocket.close(code=1011, reason="Failed to initialize user stats entry")
                 return
             
@@ -151,36 +395,64 @@ async def websocket_stats_endpoint(websocket: WebSocket, token: str = Query(None
                              .execute()
                              
             if not response.data:
-                print(f"No daily stats found for {user_email} on {study_date_key}. Starting fresh.")
+                logger.info("No daily stats found for %s on %s. Starting fresh.", user_email, study_date_key)
                 
                 ai_engine_instance.load_user_stats({}, user_email)  # type: ignore
             else:
                 
                 ai_engine_instance.load_user_stats(response.data[0], user_email)    # type: ignore
-                print(f"Daily stats loaded for user: {user_email} on {study_date_key}")
+                logger.info("Daily stats loaded for user: %s on %s", user_email, study_date_key)
         else:
-            print("WebSocket client connected: ANONYMOUS")
+            logger.info("WebSocket client connected: ANONYMOUS")
             ai_engine_instance.load_user_stats({}, None)    # type: ignore
     except Exception as e:
-        print(f"CRITICAL Error loading stats: {e}")
+        logger.critical("CRITICAL Error loading stats: %s", e)
         ai_engine_instance.load_user_stats({}, None)  # type: ignore
 
+    if user_email:
+        active_sessions[user_email] = ai_engine_instance
+    last_face_refresh_time = time.time()
+    room_member_id = uuid.uuid4().hex[:12]
+    if room:
+        room_registry.join(room, room_member_id, user_email)
+    scheduler_session = inference_scheduler.register(user_email or f"anonymous-{room_member_id}",
+                                                     PRIORITY_AUTHENTICATED if user_email else PRIORITY_ANONYMOUS)
+    shadow_session = shadow_runner.attach(scheduler_session.label)
+    loop = asyncio.get_running_loop()
+    capture_controller = CaptureController(inference_load)
+    parked_on_exit = None
+    # 재접속한 세션은 보관 전 마지막 프레임보다 앞선 시각을 받지 않습니다.
+    last_frame_time = ai_engine_instance.frame_time
+
     try:
         while True:
-            image_bytes = await websocket.receive_bytes()
-            
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-            if frame is None:
-                print("WS: Received empty frame, skipping...")
+            # 여러 프레임 묶음은 촬영 순서대로 모두 처리하고 응답은 한 번만 보냅니다.
+            frames = await receive_frames(last_frame_time)
+            if not frames:
                 continue
-                
-            if ai_engine_instance is None:
-                 print("WS: AI Engine is None, skipping...")
-                 continue
-            
-            await asyncio.to_thread(ai_engine_instance.process, frame)
+
+            # 지연은 수신 시각(묶음은 마지막 프레임 시각, 두 번째 프레임부터는 앞 프레임 완료)부터 추론 완료까지 (스레드 대기 포함)
+            lag_start_time = frames[-1][1]
+            for frame, frame_time in frames:
+                with inference_load.track():
+                    await inference_scheduler.run(scheduler_session, ai_engine_instance.process, frame, frame_time, degradation.tier)
+                now = time.time()
+                if shadow_session is not None:
+                    # 실서비스 추론 시간 = 지연 - 스케줄러 대기
+                    shadow_runner.offer(loop, shadow_session, ai_engine_instance, frame, frame_time,
+                                        now - lag_start_time - scheduler_session.wait_last)
+                degradation.observe(now - lag_start_time)
+                lag_start_time = now
+            last_frame_time = frames[-1][1]
+
+            if user_email and ai_engine_instance.timeline.needs_flush:
+                await asyncio.to_thread(flush_timeline, ai_engine_instance.timeline, user_email, study_date_key)
+            if shadow_runner.needs_flush:
+                await asyncio.to_thread(write_shadow_rows, shadow_runner.drain())
+
+            if user_email and FACE_ENCODING_REFRESH_SECONDS > 0 and time.time() - last_face_refresh_time > FACE_ENCODING_REFRESH_SECONDS:
+                last_face_refresh_time = time.time()
+                await asyncio.to_thread(ai_engine_instance.refresh_face_encoding)
                  
             stats_data = get_current_stats(ai_engine_instance) # type: ignore
             display_time_sec = stats_data["total_study_seconds"]
@@ -191,127 +463,315 @@ async def websocket_stats_endpoint(websocket: WebSocket, token: str = Query(None
             timer_text = f"{hours:02}:{minutes:02}:{seconds:02}"
             status_text = stats_data["current_status"]
 
-            await websocket.send_json({
+            if room:
+                room_registry.publish(room, room_member_id, user_name, stats_data)
+            if user_email:
+                ranking_feed.update(study_date_key, user_email, user_name, display_time_sec)
+
+            response = {
                 "time": timer_text,
                 "status": status_text,
                 "stats": stats_data["stats"],
-                "total_study_seconds": display_time_sec
-            })
+                "total_study_seconds": display_time_sec,
+                "tier": ai_engine_instance.tier
+            }
+            if len(frames) > 1:
+                response["frames"] = len(frames)
+            capture_control = capture_controller.update(status_text)
+            if capture_control is not None:
+                response["control"] = capture_control
+
+            await websocket.send_json(response)
             
     except WebSocketDisconnect:
         if user_email:
-            print(f"WebSocket client disconnected: {user_email}")
-            if ai_engine_instance and supabase:
-                try:
-                    ai_engine_instance.commit_all_running_timers()
-                    final_daily_stats, session_delta_stats = ai_engine_instance.get_final_stats()
-                    
-                    final_daily_stats["user_email"] = user_email
-                    final_daily_stats["user_name"] = user_name
-                    final_daily_stats["date"] = study_date_key
-
-                    supabase.table("daily_user_stats").upsert(
-                        final_daily_stats, 
-                        on_conflict="user_email,date" 
-                    ).execute()
-                    print(f"Daily stats (total) saved to Supabase for user: {user_email}")
-
-                    if session_delta_stats["study_seconds"] > 0:
-                        
-                        rpc_payload = {
-                            "p_user_email": user_email,
-                            "p_user_name": user_name,
-                            "p_study_seconds_delta": session_delta_stats["study_seconds"]
-                        }
-
-                        supabase.rpc("increment_user_stats", rpc_payload).execute()
-                        print(f"Total stats (delta) incremented for user: {user_email}")
-                    else:
-                        print(f"No study time in this session. Total stats not updated.")
-
-                except Exception as e:
-                    print(f"Error saving stats to Supabase: {e}")
+            logger.info("WebSocket client disconnected: %s", user_email)
+            # 통계 저장은 재접속 대기 시간이 끝날 때 한 번만 합니다.
+            ai_engine_instance.suspend()
+            parked_on_exit = ParkedSession(ai_engine_instance, user_email, user_name, study_date, study_date_key)
         else:
-            print("Anonymous client disconnected. Stats not saved.")
+            logger.info("Anonymous client disconnected. Stats not saved.")
+    finally:
+        inference_scheduler.unregister(scheduler_session)
+        shadow_runner.detach(shadow_session)
+        if room:
+            room_registry.leave(room, room_member_id)
+        if user_email and active_sessions.get(user_email) is ai_engine_instance:
+            del active_sessions[user_email]
+        if parked_on_exit is None:
+            ai_engine_instance.close()
+        elif session_park.enabled:
+            session_park.park(parked_on_exit)
+        else:
+            await persist_session(parked_on_exit)
 
-@app.post("/api/register-face")
-async def register_face(file: UploadFile = File(...)): 
-    if ai_engine_instance is None:
-        raise HTTPException(status_code=503, detail="AI Engine not initialized")
-    
-    if ai_engine_instance.user_email is None:   # type: ignore
-        raise HTTPException(status_code=401, detail="WebSocket이 연결되지 않았거나 로그인되지 않은 사용자입니다.")
-        
-    contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+@app.websocket("/ws_room/{room_id}")
+async def websocket_room_endpoint(websocket: WebSocket, room_id: str, token: str = Query(None)):
+    """
+    그룹 스터디 방 구독. 방 멤버들의 상태 스냅샷을 틱마다 (변경이 있을 때만) 받습니다.
+    그 방에서 /ws_stats 세션을 진행 중인 로그인 사용자만 구독할 수 있습니다.
+    """
+    await websocket.accept()
+    if not re.fullmatch(ROOM_ID_PATTERN, room_id):
+        await websocket.close(code=1008, reason="Invalid room id")
+        return
+    if SUPABASE_JWT_SECRET is None:
+        logger.error("ERROR: SUPABASE_JWT_SECRET not set in .env")
+        await websocket.close(code=1011, reason="JWT secret key not configured")
+        return
+    if not token:
+        await websocket.close(code=1008, reason="Token required")
+        return
+    try:
+        user_email, _ = decode_user_from_token(token)
+    except JWTError as e:
+        logger.warning("Invalid Supabase token: %s", e, extra=HOT_PATH)
+        await websocket.close(code=1008, reason="Invalid token")
+        return
+    if not room_registry.is_member(room_id, user_email):
+        await websocket.close(code=1008, reason="Not a room member")
+        return
 
+    await room_registry.subscribe(room_id, websocket, user_email)
+    try:
+        while True:
+            # 구독 전용 채널: 클라이언트 메시지는 무시하고 연결 종료만 감지합니다.
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        room_registry.unsubscribe(room_id, websocket)
+
+def decode_mirrored_rgb(contents: bytes):
+    """
+    업로드된 이미지를 좌우 반전된 RGB 프레임으로 디코드합니다 (세션의 인증 스냅샷과 같은 방향).
+    반전 결과는 디코드 버퍼에 다시 씁니다. 디코드 실패 시 None.
+    """
+    frame = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
     if frame is None:
-        raise HTTPException(status_code=400, detail="업로드된 이미지를 읽을 수 없습니다.")
+        return None
+    cv2.flip(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), 1, dst=frame)
+    return frame
 
-    flipped_frame = cv2.flip(frame, 1)
-    
-    rgb_frame = cv2.cvtColor(flipped_frame, cv2.COLOR_BGR2RGB)
-    if not ai_engine_instance.is_encoding_possible(rgb_frame):    # type: ignore
-        raise HTTPException(status_code=400, detail="얼굴을 감지할 수 없거나 특징 추출에 실패했습니다. 정면을 바라보는 사진을 사용해주세요.")
 
-    success, message = ai_engine_instance.register_user_face(flipped_frame)
-    
+def apply_enrollment_result(user_email: str, success: bool, message: str, encoding_array):
+    session = find_session(user_email)
+    if success and session is not None:
+        session.apply_registered_face(encoding_array)
+    if not success:
+        raise HTTPException(status_code=400, detail=message)
     return {"success": success, "message": message}
+
+
+@app.post("/api/register-face")
+async def register_face(file: UploadFile = File(...), user_email: str = Depends(get_current_user_email)): 
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Supabase client not initialized")
+        
+    rgb_frame = decode_mirrored_rgb(await file.read())
+    if rgb_frame is None:
+        raise HTTPException(status_code=400, detail="업로드된 이미지를 읽을 수 없습니다.")
+
+    # 검출/인코딩은 register_user_face 에서 한 번만 수행합니다.
+    success, message, encoding_array = await asyncio.to_thread(register_user_face, supabase, user_email, rgb_frame)
+    return apply_enrollment_result(user_email, success, message, encoding_array)
+
+
+@app.post("/api/enroll-face")
+async def enroll_face(files: list[UploadFile] = File(...), user_email: str = Depends(get_current_user_email)):
+    """
+    짧은 연속 촬영 프레임들로 얼굴을 등록합니다. 프레임별 검출/인코딩은 병렬로 한 번씩만 수행되고,
+    품질이 좋은 프레임들의 인코딩 평균이 한 번의 DB 쓰기로 저장됩니다.
+    """
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Supabase client not initialized")
+    if len(files) > ENROLLMENT_MAX_FRAMES:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {ENROLLMENT_MAX_FRAMES}장까지 등록할 수 있습니다.")
+
+    rgb_frames = []
+    for file in files:
+        rgb_frame = decode_mirrored_rgb(await file.read())
+        if rgb_frame is not None:
+            rgb_frames.append(rgb_frame)
+    if not rgb_frames:
+        raise HTTPException(status_code=400, detail="업로드된 이미지를 읽을 수 없습니다.")
+
+    success, message, encoding_array = await asyncio.to_thread(enroll_user_face, supabase, user_email, rgb_frames)
+    return apply_enrollment_result(user_email, success, message, encoding_array)
     
 
 @app.get("/api/check-face-registered")
-async def check_face_registered():
-    if ai_engine_instance is None:
+async def check_face_registered(authorization: str = Header(None)):
+    try:
+        user_email = await get_current_user_email(authorization)
+    except HTTPException:
         return {"registered": False}
-    
-    if ai_engine_instance.user_email is None:   # type: ignore
-        return {"registered": False} 
-        
-    return {"registered": ai_engine_instance.is_face_registered}
 
-@app.delete("/api/delete-face")
-async def delete_registered_face():
-    if ai_engine_instance is None:
-        raise HTTPException(status_code=503, detail="AI Engine not initialized")
+    session = find_session(user_email)
+    if session is not None:
+        return {"registered": session.is_face_registered}
 
-    if ai_engine_instance.user_email is None:   # type: ignore
-        raise HTTPException(status_code=401, detail="WebSocket이 연결되지 않았거나 로그인되지 않은 사용자입니다.")
-    
+    if supabase is None:
+        return {"registered": False}
+    encoding_array = await asyncio.to_thread(fetch_face_encoding, supabase, user_email)
+    return {"registered": encoding_array is not None}
+
+@app.delete("/api/delete-face")
+async def delete_registered_face_endpoint(user_email: str = Depends(get_current_user_email)):
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Supabase client not initialized")
     
-    success, message = ai_engine_instance.delete_registered_face()
+    success, message = await asyncio.to_thread(delete_registered_face, supabase, user_email)
+
+    session = find_session(user_email)
+    if success and session is not None:
+        session.clear_registered_face()
     return {"success": success, "message": message}
         
+def require_admin(x_admin_token: str = Header(None)):
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/api/admin/resources", dependencies=[Depends(require_admin)])
+async def admin_resources():
+    """
+    이 워커의 코어 예산 대비 실제 사용률과 추론 부하. (이전 조회 이후 구간 평균)
+    """
+    snapshot = await asyncio.to_thread(utilization_monitor.snapshot)
+    snapshot.update({
+        "sessions": admission.active,
+        "rejected_sessions": admission.rejected,
+        "inference_inflight": inference_load.inflight,
+        "inference_utilization": inference_load.utilization,
+        "degradation_tier": degradation.tier,
+        "inference_lag_seconds": degradation.lag,
+        "verification_queue_depth": FACE_VERIFICATION_POOL.queue_depth(),
+        "inference_queued": inference_scheduler.queued,
+    })
+    return snapshot
+
+
+@app.get("/api/admin/scheduler", dependencies=[Depends(require_admin)])
+async def admin_scheduler():
+    """
+    세션별 추론 대기 시간과 사용한 추론 시간 (평균 대기 시간이 긴 순).
+    """
+    return inference_scheduler.snapshot()
+
+
+@app.get("/api/admin/shadow", dependencies=[Depends(require_admin)])
+async def admin_shadow(days: int = Query(7, ge=1, le=90)):
+    """
+    섀도 프로필과 실서비스 프로필의 상태 일치율/추론 지연 비교와 이 워커의 섀도 실행 카운터.
+    """
+    start_date = (get_study_date() - timedelta(days=days - 1)).isoformat()
+    try:
+        summary = await asyncio.to_thread(summarize_shadow, start_date, STATUS_LABELS)
+    except Exception as e:
+        logger.error("Error summarizing shadow comparisons: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to summarize shadow comparisons: {e}")
+    summary["runner"] = shadow_runner.counters()
+    return summary
+
+
+@app.get("/api/timeline/summary")
+async def get_timeline_summary(days: int = Query(7, ge=1, le=90), user_email: str = Depends(get_current_user_email)):
+    """
+    최근 N일 동안의 상태 전이 기록을 상태별/시간대별로 집계합니다.
+    """
+    start_date = (get_study_date() - timedelta(days=days - 1)).isoformat()
+    try:
+        return await asyncio.to_thread(summarize_timeline, user_email, start_date, STATUS_LABELS)
+    except Exception as e:
+        logger.error("Error summarizing timeline: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to summarize timeline: {e}")
+
+@app.get("/api/stats/rollup")
+async def get_period_rollup(
+    period: str = Query("week", pattern="^(week|month)$"),
+    key: str | None = Query(None, description="예: 2025-W07, 2025-02 (생략 시 현재 기간)"),
+    user_email: str = Depends(get_current_user_email),
+):
+    """
+    사전 집계된 주간/월간 통계 (기본키 조회 1회)
+    """
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Supabase client not initialized")
+    key = key or period_key(period, get_study_date())
+    try:
+        row = await asyncio.to_thread(fetch_period_rollup, supabase, user_email, period, key)
+    except Exception as e:
+        logger.error("Error fetching period rollup: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch rollup: {e}")
+    return row or {"user_email": user_email, "period_type": period, "period_key": key, "study_seconds": 0}
+
+@app.get("/ranking/period")
+async def get_period_ranking(
+    period: str = Query("week", pattern="^(week|month)$"),
+    key: str | None = Query(None),
+):
+    if supabase is None:
+        raise HTTPException(status_code=503, detail="Supabase client not initialized")
+    key = key or period_key(period, get_study_date())
+    try:
+        return await asyncio.to_thread(fetch_period_ranking, supabase, period, key)
+    except Exception as e:
+        logger.error("Error fetching period ranking: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch ranking: {e}")
+
+def fetch_daily_ranking(study_date_key: str, limit: int = 10) -> list:
+    response = supabase.table("daily_user_stats") \
+                     .select("user_name, user_email, daily_study_seconds") \
+                     .eq("date", study_date_key) \
+                     .order("daily_study_seconds", desc=True) \
+                     .limit(limit) \
+                     .execute()
+    return response.data or []
+
+
+# 순위 경계 근처 사용자도 delta 계산에 포함되도록 Top 10보다 넉넉하게 시드합니다.
+ranking_feed = RankingFeed(
+    fetch_snapshot=lambda study_date_key: fetch_daily_ranking(study_date_key, limit=50),
+    current_date_key=lambda: get_study_date().isoformat(),
+)
+
+
 @app.get("/ranking/top10")
 async def get_top10_ranking():
 
     if supabase is None:
         raise HTTPException(status_code=503, detail="Supabase client not initialized")
-    kst_timezone = timezone(timedelta(hours=9))
-    now_kst = datetime.now(kst_timezone)
-    
-    if now_kst.hour < 6:
-        logical_date_obj = now_kst.date() - timedelta(days=1)
-    else:
-        logical_date_obj = now_kst.date()
 
-    study_date_key = logical_date_obj.isoformat()
-    print(f"Fetching ranking for date: {study_date_key}")
+    study_date_key = get_study_date().isoformat()
+    logger.debug("Fetching ranking for date: %s", study_date_key)
     try:
-        response = supabase.table("daily_user_stats") \
-                         .select("user_name, user_email, daily_study_seconds") \
-                         .eq("date", study_date_key) \
-                         .order("daily_study_seconds", desc=True) \
-                         .limit(10) \
-                         .execute()
-        
-        if not response.data:
-            return []
-        return response.data
+        return await asyncio.to_thread(fetch_daily_ranking, study_date_key)
     
     except Exception as e:
-        print(f"Error fetching ranking: {e}")
+        logger.error("Error fetching ranking: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch ranking: {e}")
 
+@app.websocket("/ws_ranking")
+async def websocket_ranking_endpoint(websocket: WebSocket):
+    """
+    실시간 랭킹 피드: 접속 시 snapshot 1회, 이후 변경된 순위(delta)만 전송합니다.
+    """
+    await websocket.accept()
+    if supabase is None:
+        await websocket.close(code=1011, reason="Supabase client not initialized")
+        return
+
+    await ranking_feed.subscribe(websocket, get_study_date().isoformat())
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        ranking_feed.unsubscribe(websocket)
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
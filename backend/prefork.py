@@ -0,0 +1,187 @@
+import os
+import gc
+import time
+import signal
+import socket
+import logging
+import argparse
+
+# pre-fork 실행 모드
+# 마스터가 앱과 런타임(torch, mediapipe, OpenCV)을 import 하고 YOLO 가중치를 읽어 워밍업한 뒤 워커를 fork 합니다.
+# 워커들은 마스터가 읽은 가중치/라이브러리 페이지를 copy-on-write 로 공유하므로 워커를 늘려도 모델 메모리가
+# 워커 수만큼 늘지 않습니다. gc.freeze() 로 fork 전 객체를 GC 대상에서 빼 GC 가 공유 페이지를 건드리지 않게 합니다.
+# mediapipe 그래프는 세션마다 추적 상태를 가지므로 공유 대상이 아닙니다.
+#
+# 마스터는 워커를 감시해 죽으면 다시 띄우고, PREFORK_MEMORY_REPORT_SECONDS 마다 워커별 uss/pss/rss 를 로그로 남깁니다.
+# (uss = 그 워커만 쓰는 메모리 = 워커 하나를 더 띄울 때 드는 비용)
+#
+# 주의: OpenMP(libgomp) 스레드 풀이 이미 만들어진 프로세스를 fork 하면 자식의 첫 병렬 연산이 멈출 수 있습니다.
+# 그래서 마스터는 torch 스레드 수를 1 로 낮춘 상태(풀 없음)에서 워밍업하고, 각 워커가 fork 직후
+# configure_runtimes() 로 자기 코어 예산만큼 스레드 수를 다시 지정합니다. 마스터에서 fork 전에 다른 경로로
+# 병렬 연산을 돌리면 같은 문제가 생길 수 있습니다.
+# 이 모드는 아직 실험 단계입니다: Dockerfile 의 기본 CMD 는 uvicorn 단일 프로세스이며, 컨테이너에서의 검증은
+# 되어 있지 않습니다. 운영에 쓰기 전에 실제 이미지에서 워커 기동/재시작과 메모리 보고를 확인하세요.
+#
+# 주의: 세션, 재접속 대기, 그룹 스터디 방은 워커 프로세스 안에만 있습니다. 같은 사용자의 요청이 다른 워커로 가면
+# 진행 중인 세션에 반영되지 않으므로, 워커가 2개 이상이면 로드밸런서의 sticky 연결이 필요합니다.
+#
+# 예시 (backend 디렉터리에서):
+#   python prefork.py --workers 4 --port 8080
+
+PREFORK_MEMORY_REPORT_SECONDS = float(os.environ.get("PREFORK_MEMORY_REPORT_SECONDS", "60"))
+WORKER_STOP_TIMEOUT_SECONDS = 30.0
+# 워커가 이보다 빨리 죽으면 시작 실패로 보고 다시 띄우기 전에 기다립니다.
+WORKER_MIN_UPTIME_SECONDS = 5.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-fork server: shared warmed models, N uvicorn workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("PREFORK_WORKERS", "2")))
+    parser.add_argument("--pin-cpus", action="store_true", help="워커마다 겹치지 않는 코어 묶음에 고정")
+    return parser.parse_args()
+
+
+args = parse_args()
+_cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 4))
+# 코어 예산을 워커 수로 나눠, 워커마다 resources.py 가 자기 몫만큼만 스레드를 만들게 합니다. (import 전에 설정)
+os.environ.setdefault("CPU_CORE_BUDGET", str(max(1, len(_cpus) // max(1, args.workers))))
+
+import psutil
+import torch
+import uvicorn
+import main                                     # 앱과 런타임을 마스터에서 import
+from log import stop_logging
+from profiles import warm_models
+from resources import CPU_CORE_BUDGET, process_memory_mb, configure_runtimes
+
+logger = logging.getLogger("prefork")
+
+
+def worker_cpus(index: int) -> set[int]:
+    return set(_cpus[index * CPU_CORE_BUDGET:(index + 1) * CPU_CORE_BUDGET]) or set(_cpus)
+
+
+def run_worker(index: int, sock: socket.socket):
+    if args.pin_cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, worker_cpus(index))
+    # 마스터는 스레드 1개로 워밍업했으므로 fork 이후 이 워커의 스레드 수를 다시 지정합니다.
+    configure_runtimes()
+    config = uvicorn.Config(main.app, host=args.host, port=args.port)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn_worker(index: int, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(index, sock)
+        except BaseException:
+            logger.exception("Prefork: worker %s crashed", index)
+            code = 1
+        finally:
+            stop_logging()
+            os._exit(code)
+    logger.info("Prefork: started worker %s (pid %s)", index, pid)
+    return pid
+
+
+def report_memory(workers: dict[int, int]):
+    master = process_memory_mb(psutil.Process())
+    logger.info("Prefork: master pid %s rss %.0fMB", os.getpid(), master["rss_mb"])
+    for pid, index in sorted(workers.items(), key=lambda item: item[1]):
+        try:
+            memory = process_memory_mb(psutil.Process(pid))
+        except psutil.Error:
+            continue
+        logger.info("Prefork: worker %s pid %s uss %.0fMB pss %.0fMB rss %.0fMB", index, pid,
+                    memory.get("uss_mb", float("nan")), memory.get("pss_mb", float("nan")), memory["rss_mb"])
+
+
+def reap_child() -> tuple[int, int]:
+    try:
+        return os.waitpid(-1, os.WNOHANG)
+    except ChildProcessError:
+        return 0, 0
+
+
+def stop_workers(workers: dict[int, int]):
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.time() + WORKER_STOP_TIMEOUT_SECONDS
+    while workers and time.time() < deadline:
+        pid, _ = reap_child()
+        if pid:
+            workers.pop(pid, None)
+        else:
+            time.sleep(0.1)
+    for pid in workers:
+        logger.warning("Prefork: worker pid %s did not stop, killing.", pid)
+        os.kill(pid, signal.SIGKILL)
+
+
+def serve():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    started = time.perf_counter()
+    # OpenMP 스레드 풀이 생기지 않도록 스레드 1개로 워밍업합니다 (fork 후 자식에서 풀이 멈추는 문제 방지).
+    torch.set_num_threads(1)
+    warm_models()
+    logger.info("Prefork: models warmed in %.1fs, forking %s worker(s) (%s cores each)",
+                time.perf_counter() - started, args.workers, CPU_CORE_BUDGET)
+    # fork 이후 GC 가 마스터에서 만든 객체들(공유 페이지)에 쓰지 않도록 영구 세대로 옮깁니다.
+    gc.collect()
+    gc.freeze()
+
+    workers = {}                    # pid -> index
+    started_at = {}                 # index -> 시작 시각
+    for index in range(args.workers):
+        pid = spawn_worker(index, sock)
+        workers[pid] = index
+        started_at[index] = time.time()
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    next_report = time.time() + PREFORK_MEMORY_REPORT_SECONDS
+    while not stopping:
+        pid, status = reap_child()
+        if pid and pid in workers:
+            index = workers.pop(pid)
+            logger.warning("Prefork: worker %s (pid %s) exited with status %s, restarting.", index, pid, status)
+            if time.time() - started_at[index] < WORKER_MIN_UPTIME_SECONDS:
+                time.sleep(WORKER_MIN_UPTIME_SECONDS)
+            if stopping:
+                break
+            workers[spawn_worker(index, sock)] = index
+            started_at[index] = time.time()
+            continue
+        if PREFORK_MEMORY_REPORT_SECONDS > 0 and time.time() >= next_report:
+            report_memory(workers)
+            next_report = time.time() + PREFORK_MEMORY_REPORT_SECONDS
+        time.sleep(0.5)
+
+    logger.info("Prefork: stopping %s worker(s)...", len(workers))
+    stop_workers(workers)
+    sock.close()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,174 @@
+import os
+import copy
+import threading
+from dataclasses import dataclass
+import mediapipe as mp
+from ultralytics import YOLO                    # type: ignore
+
+# 추론 품질 프로필
+# mediapipe/YOLO 설정을 한 묶음으로 고릅니다. 배포 단위 기본값은 INFERENCE_PROFILE,
+# 세션 단위로는 /ws_stats?profile=<name> 으로 선택합니다.
+# 프로필별 지연/정확도 표는 loadtest/bench_profiles.py 로 측정합니다.
+#
+# 기본 프로필은 baseline 으로, 프로필 도입 전 엔진과 같은 설정입니다 (refine_landmarks 켬, Pose complexity 1,
+# YOLO imgsz 640). EAR_THRESHOLD 등 판정 임계값은 이 설정에서 맞춘 값입니다.
+# lite/balanced/accurate 의 설정값은 아직 측정으로 정한 것이 아니라 mediapipe/YOLO 권장 범위에서 고른 후보입니다.
+# 런타임이 있는 배포 대상 머신에서
+#   python -m loadtest.bench_profiles --frames ./frames --output loadtest/PROFILE_BENCHMARK.md
+#   python -m loadtest.eval_pipeline --sessions <라벨링된 세션 JSON> ...
+# 결과를 커밋하기 전에는 기본값을 바꾸지 않습니다.
+#
+# FaceMesh 의 refine_landmarks 는 홍채 랜드마크를 추가할 뿐 아니라 눈/입술 윤곽 좌표도 다시 계산합니다.
+# EAR 에 쓰는 눈 윤곽 인덱스가 여기에 포함되므로, 이를 끄는 프로필(lite, balanced)은 EAR 값과 졸음 판정이
+# baseline 과 달라질 수 있습니다 (bench_profiles 의 EAR / eyes-closed 열로 확인).
+#
+# YOLO 가중치는 프로세스마다 한 번만 읽고 세션은 같은 가중치를 공유하는 복제본을 씁니다.
+# (pre-fork 모드에서는 마스터가 미리 읽어 두므로 워커들이 같은 메모리 페이지를 copy-on-write 로 공유합니다)
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    name: str
+    refine_landmarks: bool
+    face_detection_confidence: float
+    face_tracking_confidence: float
+    pose_model_complexity: int          # 0: lite, 1: full, 2: heavy
+    pose_detection_confidence: float
+    pose_tracking_confidence: float
+    yolo_weights: str
+    yolo_imgsz: int
+    yolo_confidence: float
+
+
+PROFILES = {
+    "baseline": InferenceProfile(
+        name="baseline",
+        refine_landmarks=True,
+        face_detection_confidence=0.5,
+        face_tracking_confidence=0.5,
+        pose_model_complexity=1,
+        pose_detection_confidence=0.5,
+        pose_tracking_confidence=0.5,
+        yolo_weights="yolo12n.pt",
+        yolo_imgsz=640,
+        yolo_confidence=0.5,
+    ),
+    "lite": InferenceProfile(
+        name="lite",
+        refine_landmarks=False,
+        face_detection_confidence=0.5,
+        face_tracking_confidence=0.5,
+        pose_model_complexity=0,
+        pose_detection_confidence=0.5,
+        pose_tracking_confidence=0.5,
+        yolo_weights="yolo12n.pt",
+        yolo_imgsz=320,
+        yolo_confidence=0.5,
+    ),
+    "balanced": InferenceProfile(
+        name="balanced",
+        refine_landmarks=False,
+        face_detection_confidence=0.5,
+        face_tracking_confidence=0.5,
+        pose_model_complexity=1,
+        pose_detection_confidence=0.5,
+        pose_tracking_confidence=0.5,
+        yolo_weights="yolo12n.pt",
+        yolo_imgsz=480,
+        yolo_confidence=0.5,
+    ),
+    "accurate": InferenceProfile(
+        name="accurate",
+        refine_landmarks=True,
+        face_detection_confidence=0.5,
+        face_tracking_confidence=0.5,
+        pose_model_complexity=2,
+        pose_detection_confidence=0.5,
+        pose_tracking_confidence=0.5,
+        yolo_weights="yolo12n.pt",
+        yolo_imgsz=640,
+        yolo_confidence=0.5,
+    ),
+}
+
+DEFAULT_PROFILE = os.environ.get("INFERENCE_PROFILE", "baseline")
+if DEFAULT_PROFILE not in PROFILES:
+    raise ValueError(f"Unknown INFERENCE_PROFILE: {DEFAULT_PROFILE} (choose from {', '.join(PROFILES)})")
+
+
+def get_profile(name: str | None = None) -> InferenceProfile:
+    """
+    이름으로 프로필을 찾습니다. None 이면 배포 기본값, 모르는 이름이면 ValueError.
+    """
+    if name is None:
+        return PROFILES[DEFAULT_PROFILE]
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown inference profile: {name}")
+    return profile
+
+
+_yolo_templates = {}
+_yolo_templates_lock = threading.Lock()
+# 템플릿 준비용 추론 입력 크기 (stride 32 의 배수 중 작은 값). 크기와 무관하게 fuse 등 모듈 변경은 한 번에 끝납니다.
+_YOLO_PREPARE_IMGSZ = 64
+
+
+def _yolo_template(weights: str):
+    """
+    가중치별 공유 YOLO 템플릿. 공개 전에 잠금 안에서 한 번 추론해 둡니다.
+    ultralytics 는 모델의 첫 predict 에서 Conv+BN 을 제자리에서 합칩니다 (AutoBackend(fuse=True) ->
+    DetectionModel.fuse(): conv 교체, bn 삭제). 공유 모듈에서 이것이 세션 스레드마다 동시에 일어나면 BN 이 두 번
+    합쳐져 가중치가 망가지거나 bn 속성 오류가 나고, 다른 세션의 forward 가 반쯤 바뀐 모듈을 읽게 됩니다.
+    """
+    template = _yolo_templates.get(weights)
+    if template is None:
+        with _yolo_templates_lock:
+            template = _yolo_templates.get(weights)
+            if template is None:
+                import numpy as np
+                template = YOLO(weights)
+                template(np.zeros((_YOLO_PREPARE_IMGSZ, _YOLO_PREPARE_IMGSZ, 3), np.uint8), verbose=False, imgsz=_YOLO_PREPARE_IMGSZ)
+                # 준비용 predictor 는 세션 복제본이 물려받지 않도록 버립니다.
+                template.predictor = None
+                _yolo_templates[weights] = template
+    return template
+
+
+def shared_yolo(weights: str):
+    """
+    가중치(nn.Module)는 공유하고 predictor 만 세션별로 갖는 YOLO 복제본.
+    모듈은 템플릿 준비 때 이미 fuse 되어 있으므로 세션의 첫 predict 는 모듈을 바꾸지 않고, 이후 forward 는 가중치를 읽기만 합니다.
+    """
+    clone = copy.copy(_yolo_template(weights))
+    clone.predictor = None
+    clone.overrides = dict(clone.overrides)
+    return clone
+
+
+def warm_models(profile_names=None):
+    """
+    프로필들의 YOLO 템플릿을 미리 준비(가중치 읽기, fuse)합니다.
+    pre-fork 마스터가 워커를 만들기 전에 호출합니다. 단일 프로세스 모드에서는 첫 세션이 준비합니다.
+    """
+    for name in profile_names or PROFILES:
+        _yolo_template(get_profile(name).yolo_weights)
+
+
+def load_models(profile: InferenceProfile):
+    """
+    프로필 설정으로 (FaceMesh, Pose, YOLO) 를 생성합니다. mediapipe 그래프는 추적 상태를 가지므로 세션마다 따로 만듭니다.
+    """
+    face_mesh = mp.solutions.face_mesh.FaceMesh(                     # type: ignore
+        max_num_faces=1,
+        refine_landmarks=profile.refine_landmarks,
+        min_detection_confidence=profile.face_detection_confidence,
+        min_tracking_confidence=profile.face_tracking_confidence,
+    )
+    pose = mp.solutions.pose.Pose(                                   # type: ignore
+        model_complexity=profile.pose_model_complexity,
+        min_detection_confidence=profile.pose_detection_confidence,
+        min_tracking_confidence=profile.pose_tracking_confidence,
+    )
+    yolo_model = shared_yolo(profile.yolo_weights)
+    return face_mesh, pose, yolo_model
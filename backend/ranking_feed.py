@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import asyncio
+import logging
+
+# 실시간 랭킹 피드 (/ws_ranking)
+# - /ws_stats 가 이미 계산하는 사용자별 공부 시간을 update() 로 받아 dict 에만 기록합니다.
+# - 하나의 틱 루프가 RANKING_TICK_SECONDS 마다 (변경이 있을 때만) Top N 을 한 번 계산하고,
+#   이전 순위와의 차이(delta)만 한 번 직렬화해 모든 구독자에게 보냅니다.
+# - 다른 워커에서 공부 중인 사용자도 반영되도록 RANKING_RESEED_SECONDS 마다 DB 스냅샷과 병합합니다.
+
+logger = logging.getLogger(__name__)
+
+RANKING_TICK_SECONDS = float(os.environ.get("RANKING_TICK_SECONDS", "2.0"))
+RANKING_RESEED_SECONDS = float(os.environ.get("RANKING_RESEED_SECONDS", "30.0"))
+RANKING_SIZE = 10
+RANKING_SEND_TIMEOUT_SECONDS = 2.0
+
+
+class RankingFeed:
+    def __init__(self, fetch_snapshot, current_date_key, tick_seconds: float = RANKING_TICK_SECONDS, size: int = RANKING_SIZE):
+        """
+        fetch_snapshot(study_date_key) -> [{"user_email", "user_name", "daily_study_seconds"}, ...] (동기 함수)
+        current_date_key() -> 현재 논리적 공부 날짜 문자열
+        """
+        self.fetch_snapshot = fetch_snapshot
+        self.current_date_key = current_date_key
+        self.tick_seconds = tick_seconds
+        self.size = size
+        self.study_date_key = None
+        self.scores = {}            # user_email -> {"user_email", "user_name", "daily_study_seconds"}
+        self.top = []               # 마지막으로 보낸 Top N
+        self.version = 0
+        self.dirty = False
+        self.subscribers = set()
+        self.last_reseed_time = 0.0
+        self._task = None
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def start(self):
+        """
+        앱 시작 시 호출. 첫 구독자가 오기 전의 update() 도 버려지지 않도록 현재 날짜로 시작합니다.
+        """
+        self.study_date_key = self.current_date_key()
+        self._ensure_running()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def update(self, study_date_key: str, user_email: str, user_name: str, study_seconds: float):
+        """
+        /ws_stats 프레임 루프에서 호출. O(1), 전송/정렬은 하지 않습니다.
+        """
+        if study_date_key != self.study_date_key:
+            if self.study_date_key is not None and study_date_key < self.study_date_key:
+                return
+            # 새 공부 날짜: 이전 날짜 점수는 버리고, 다음 틱(또는 구독)에서 DB 스냅샷과 다시 병합합니다.
+            self.study_date_key = study_date_key
+            self.scores = {}
+            self.last_reseed_time = 0.0
+        entry = self.scores.get(user_email)
+        if entry is None:
+            self.scores[user_email] = {"user_email": user_email, "user_name": user_name, "daily_study_seconds": study_seconds}
+        elif study_seconds > entry["daily_study_seconds"]:
+            entry["daily_study_seconds"] = study_seconds
+        else:
+            return
+        self.dirty = True
+
+    async def _reseed(self, study_date_key: str):
+        try:
+            rows = await asyncio.to_thread(self.fetch_snapshot, study_date_key)
+        except Exception as e:
+            logger.warning("Ranking feed: failed to fetch snapshot: %s", e)
+            return
+        if study_date_key != self.study_date_key:
+            # 날짜가 바뀌면 이전 날짜 점수는 버립니다.
+            self.study_date_key = study_date_key
+            self.scores = {}
+        for row in rows:
+            self.update(study_date_key, row["user_email"], row.get("user_name"), row.get("daily_study_seconds") or 0.0)
+        self.last_reseed_time = time.time()
+        self.dirty = True
+
+    def _compute_top(self):
+        ranked = sorted(self.scores.values(), key=lambda e: e["daily_study_seconds"], reverse=True)[:self.size]
+        return [
+            {"rank": index + 1, "user_email": e["user_email"], "user_name": e["user_name"],
+             "daily_study_seconds": int(e["daily_study_seconds"])}
+            for index, e in enumerate(ranked)
+        ]
+
+    def snapshot_text(self) -> str:
+        return json.dumps({"type": "snapshot", "version": self.version, "date": self.study_date_key, "ranking": self.top}, ensure_ascii=False)
+
+    async def subscribe(self, websocket, study_date_key: str):
+        self._ensure_running()
+        if self.study_date_key != study_date_key or not self.last_reseed_time:
+            await self._reseed(study_date_key)
+            self.top = self._compute_top()
+            self.version += 1
+            self.dirty = False
+        self.subscribers.add(websocket)
+        await websocket.send_text(self.snapshot_text())
+
+    def unsubscribe(self, websocket):
+        self.subscribers.discard(websocket)
+
+    async def _send(self, websocket, text: str) -> bool:
+        try:
+            await asyncio.wait_for(websocket.send_text(text), timeout=RANKING_SEND_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            if not self.subscribers:
+                continue
+
+            study_date_key = self.current_date_key()
+            if study_date_key != self.study_date_key or time.time() - self.last_reseed_time > RANKING_RESEED_SECONDS:
+                await self._reseed(study_date_key)
+
+            if not self.dirty:
+                continue
+            self.dirty = False
+
+            new_top = self._compute_top()
+            old_by_email = {e["user_email"]: e for e in self.top}
+            changed = [e for e in new_top if old_by_email.get(e["user_email"]) != e]
+            new_emails = {e["user_email"] for e in new_top}
+            removed = [email for email in old_by_email if email not in new_emails]
+            if not changed and not removed:
+                continue
+
+            self.top = new_top
+            self.version += 1
+            text = json.dumps({"type": "delta", "version": self.version, "date": self.study_date_key,
+                               "changed": changed, "removed": removed}, ensure_ascii=False)
+            subscribers = list(self.subscribers)
+            results = await asyncio.gather(*(self._send(ws, text) for ws in subscribers))
+            for websocket, ok in zip(subscribers, results):
+                if not ok:
+                    self.subscribers.discard(websocket)
@@ -0,0 +1,189 @@
+import os
+import time
+import logging
+import psutil
+from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
+
+# CPU 스레드 예산
+# torch(ultralytics), OpenCV, BLAS 는 각자 모든 코어 크기의 스레드 풀을 만들기 때문에 세션이 늘면
+# 세션 스레드 x 런타임 스레드만큼 과다 구독(oversubscription)되어 처리량이 무너집니다.
+# 하나의 코어 예산(CPU_CORE_BUDGET)에서 런타임별 스레드 수를 정하고, 병렬성은 세션 단위로만 얻습니다.
+#
+# 예산 배분 (plan_thread_budget):
+#   inference_workers x intra_op_threads (세션 스레드에서 도는 YOLO/torch)
+#   + stage_workers (FaceMesh/Pose 공용 실행기) + verification_workers (얼굴 인증 프로세스) <= core_budget
+# 코어가 4개 미만이면 각 항목 최소 1개만으로도 예산을 넘습니다 (최소 구성 3 스레드).
+# 예산에 들어가지 않는 스레드: mediapipe 그래프 내부 스레드(설정 API 없음), JPEG 묶음/영상 디코드 스레드
+# (FRAME_DECODE_WORKERS, VIDEO_DECODE_THREADS, 짧은 작업), 섀도 실행 스레드(SHADOW_CPU_CORES 로 따로 제한),
+# asyncio 기본 실행기(DB 등 I/O 대기).
+#
+# 스레드 수 환경변수는 런타임이 import 될 때 읽히므로 main.py 에서 이 모듈을 가장 먼저 import 해야 합니다.
+# 개별 환경변수(FACE_VERIFICATION_WORKERS 등)를 직접 지정하면 그 값이 우선합니다.
+
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_cpu_list(text: str) -> set[int]:
+    """
+    "0-3,6" -> {0, 1, 2, 3, 6}
+    """
+    cpus = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+# 선택: 이 워커 프로세스를 특정 코어에 고정 (예: 워커마다 CPU_AFFINITY=0-3, 4-7 ...)
+# 얼굴 인증 워커 프로세스는 부모의 affinity 를 물려받습니다.
+CPU_AFFINITY = os.environ.get("CPU_AFFINITY")
+if CPU_AFFINITY and hasattr(os, "sched_setaffinity"):
+    os.sched_setaffinity(0, _parse_cpu_list(CPU_AFFINITY))
+
+_AVAILABLE_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 4)
+CPU_CORE_BUDGET = int(os.environ.get("CPU_CORE_BUDGET", _AVAILABLE_CPUS))
+
+
+@dataclass(frozen=True)
+class ThreadBudget:
+    core_budget: int
+    inference_workers: int       # 동시에 process() 를 실행하는 세션 수
+    stage_workers: int           # 프레임 내 FaceMesh/Pose 병렬 실행 스레드
+    verification_workers: int    # 얼굴 인증 워커 프로세스
+    intra_op_threads: int        # torch/BLAS 연산 하나가 쓰는 스레드
+    opencv_threads: int
+
+
+def plan_thread_budget(core_budget: int) -> ThreadBudget:
+    core_budget = max(1, core_budget)
+    verification_workers = max(1, core_budget // 4)
+    # 얼굴 인증을 뺀 나머지를 YOLO(세션 스레드 x intra_op) 와 FaceMesh/Pose 단계 스레드가 나눠 씁니다.
+    inference_share = max(1, core_budget - verification_workers)
+    # 세션 수만큼 이미 병렬이므로 연산 내부 병렬성은 작게 둡니다.
+    intra_op_threads = 1 if inference_share < 8 else 2
+    # 추론 중인 프레임 하나 = YOLO intra_op 스레드 + 단계 스레드 1개 (FaceMesh/Pose 는 그 안에서 번갈아 실행)
+    inference_workers = max(1, inference_share // (intra_op_threads + 1))
+    stage_workers = max(1, inference_share - inference_workers * intra_op_threads)
+    return ThreadBudget(
+        core_budget=core_budget,
+        inference_workers=inference_workers,
+        stage_workers=stage_workers,
+        verification_workers=verification_workers,
+        intra_op_threads=intra_op_threads,
+        opencv_threads=1,
+    )
+
+
+THREAD_BUDGET = plan_thread_budget(CPU_CORE_BUDGET)
+
+_INTRA_OP_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def _apply_thread_environment(budget: ThreadBudget):
+    for name in _INTRA_OP_ENV_VARS:
+        os.environ.setdefault(name, str(budget.intra_op_threads))
+    os.environ.setdefault("FACE_VERIFICATION_WORKERS", str(budget.verification_workers))
+    os.environ.setdefault("INFERENCE_STAGE_WORKERS", str(budget.stage_workers))
+    os.environ.setdefault("INFERENCE_CAPACITY", str(budget.inference_workers))
+    os.environ.setdefault("MAX_SESSIONS_PER_WORKER", str(4 * budget.core_budget))
+
+
+_apply_thread_environment(THREAD_BUDGET)
+
+# 세션 프레임 추론(process) 전용 실행기. asyncio 기본 실행기(DB 호출 등 I/O 용)와 분리해
+# 추론 동시 실행 수를 예산에 맞춥니다. 세션 간 실행 순서는 scheduler.py 가 정합니다.
+SESSION_INFERENCE_EXECUTOR = ThreadPoolExecutor(max_workers=THREAD_BUDGET.inference_workers, thread_name_prefix="session-inference")
+
+
+def configure_runtimes():
+    """
+    런타임 import 후 호출합니다. 환경변수로 잡히지 않는 스레드 수를 API 로 지정합니다.
+    """
+    import cv2
+    import torch
+    torch.set_num_threads(THREAD_BUDGET.intra_op_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # 이미 병렬 작업이 시작된 뒤에는 바꿀 수 없습니다.
+        pass
+    cv2.setNumThreads(THREAD_BUDGET.opencv_threads)
+    logger.info("Resources: %s core budget -> %s", CPU_CORE_BUDGET, asdict(THREAD_BUDGET))
+
+
+class UtilizationMonitor:
+    """
+    이 워커(와 얼굴 인증 자식 프로세스)의 CPU 사용량을 코어 예산 대비로 보고합니다.
+    값은 이전 호출 이후 구간의 평균입니다.
+    """
+    def __init__(self):
+        self.process = psutil.Process()
+        self._children = {}
+        self.process.cpu_percent(None)
+        self.last_ctx_switches = self._ctx_switches()
+        self.last_time = time.time()
+
+    def _ctx_switches(self) -> int:
+        switches = self.process.num_ctx_switches()
+        return switches.voluntary + switches.involuntary
+
+    def _children_cpu_percent(self) -> float:
+        total = 0.0
+        alive = {}
+        for child in self.process.children(recursive=True):
+            known = self._children.get(child.pid, child)
+            try:
+                total += known.cpu_percent(None)
+                alive[child.pid] = known
+            except psutil.Error:
+                pass
+        self._children = alive
+        return total
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        elapsed = max(now - self.last_time, 1e-6)
+        cpu_percent = self.process.cpu_percent(None)
+        children_cpu_percent = self._children_cpu_percent()
+        ctx_switches = self._ctx_switches()
+        ctx_rate = (ctx_switches - self.last_ctx_switches) / elapsed
+        self.last_ctx_switches = ctx_switches
+        self.last_time = now
+
+        return {
+            "core_budget": CPU_CORE_BUDGET,
+            "cpu_affinity": sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None,
+            "budget": asdict(THREAD_BUDGET),
+            "cpu_percent": cpu_percent,
+            "verification_cpu_percent": children_cpu_percent,
+            # 1.0 = 예산 코어를 모두 사용 중
+            "effective_utilization": (cpu_percent + children_cpu_percent) / (100.0 * CPU_CORE_BUDGET),
+            "threads": self.process.num_threads(),
+            "context_switches_per_second": ctx_rate,
+            **process_memory_mb(self.process),
+            "window_seconds": elapsed,
+        }
+
+
+def process_memory_mb(process: psutil.Process) -> dict:
+    """
+    rss 와, 가능하면 uss(이 프로세스만 쓰는 메모리)/pss(공유 페이지를 나눠 계산).
+    pre-fork 워커는 마스터와 공유하는 모델 페이지가 rss 에만 잡히므로 uss 로 워커당 비용을 봅니다.
+    """
+    megabyte = 1024 * 1024
+    try:
+        info = process.memory_full_info()
+    except (psutil.AccessDenied, NotImplementedError):
+        return {"rss_mb": process.memory_info().rss / megabyte}
+    memory = {"rss_mb": info.rss / megabyte, "uss_mb": info.uss / megabyte}
+    if hasattr(info, "pss"):
+        memory["pss_mb"] = info.pss / megabyte
+    return memory
@@ -0,0 +1,65 @@
+from datetime import date
+
+# 주간/월간 사전 집계 (user_period_stats 테이블, sql/period_rollups.sql 참고)
+# 일일 통계를 저장할 때 세션 델타를 해당 주/월 행에 더해두므로,
+# 조회는 기간 길이와 무관하게 기본키 한 번 조회로 끝납니다.
+
+PERIOD_TYPES = ("week", "month")
+
+ROLLUP_DELTA_KEYS = (
+    "study_seconds",
+    "drowsy_count", "away_count", "lying_down_count", "leaning_back_count", "looking_away_count",
+    "drowsy_seconds", "away_seconds", "lying_down_seconds", "leaning_back_seconds", "looking_away_seconds",
+)
+
+
+def period_key(period_type: str, study_date: date) -> str:
+    if period_type == "week":
+        iso_year, iso_week, _ = study_date.isocalendar()
+        return f"{iso_year}-W{iso_week:02}"
+    if period_type == "month":
+        return f"{study_date.year}-{study_date.month:02}"
+    raise ValueError(f"Unknown period type: {period_type}")
+
+
+def period_keys(study_date: date) -> dict:
+    return {period_type: period_key(period_type, study_date) for period_type in PERIOD_TYPES}
+
+
+def increment_period_rollups(supabase_client, user_email: str, user_name: str, study_date: date, session_delta_stats: dict) -> bool:
+    """
+    세션 델타를 주간/월간 집계에 더합니다. 더할 값이 없으면 DB를 호출하지 않습니다.
+    """
+    deltas = {key: session_delta_stats.get(key, 0) for key in ROLLUP_DELTA_KEYS}
+    if not any(deltas.values()):
+        return False
+
+    supabase_client.rpc("increment_period_stats", {
+        "p_user_email": user_email,
+        "p_user_name": user_name,
+        "p_period_keys": period_keys(study_date),
+        "p_deltas": deltas,
+    }).execute()
+    return True
+
+
+def fetch_period_rollup(supabase_client, user_email: str, period_type: str, key: str) -> dict | None:
+    response = supabase_client.table("user_period_stats") \
+                     .select("*") \
+                     .eq("user_email", user_email) \
+                     .eq("period_type", period_type) \
+                     .eq("period_key", key) \
+                     .limit(1) \
+                     .execute()
+    return response.data[0] if response.data else None
+
+
+def fetch_period_ranking(supabase_client, period_type: str, key: str, limit: int = 10) -> list:
+    response = supabase_client.table("user_period_stats") \
+                     .select("user_name, user_email, study_seconds") \
+                     .eq("period_type", period_type) \
+                     .eq("period_key", key) \
+                     .order("study_seconds", desc=True) \
+                     .limit(limit) \
+                     .execute()
+    return response.data or []
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import asyncio
+
+# 그룹 스터디 방
+# /ws_stats?room=<id> 로 공부 중인 멤버는 프레임 처리 후 자신의 상태를 방 허브에 publish 하고(dict 갱신만),
+# /ws_room/<id> 구독자들은 방마다 하나의 틱 루프가 보내는 스냅샷을 받습니다.
+# 틱 동안의 갱신은 합쳐져(coalesce) 방당 한 번만 직렬화되므로, 멤버 수가 늘어도 브로드캐스트 비용은
+# (직렬화 1회 + 이미 인코딩된 문자열 전송 N회)로 유지됩니다.
+# 구독은 그 방에서 /ws_stats 세션을 진행 중인 로그인 사용자만 할 수 있고, 세션이 모두 끝나면 구독도 닫힙니다.
+
+ROOM_TICK_SECONDS = float(os.environ.get("ROOM_TICK_SECONDS", "1.0"))
+ROOM_SEND_TIMEOUT_SECONDS = float(os.environ.get("ROOM_SEND_TIMEOUT_SECONDS", "2.0"))
+
+
+class RoomHub:
+    __slots__ = ("room_id", "members", "member_emails", "subscribers", "dirty", "task")
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.members = {}          # member_id -> 최신 상태 dict
+        self.member_emails = {}    # member_id -> 사용자 이메일 (익명 세션은 None)
+        self.subscribers = {}      # WebSocket -> 구독한 사용자 이메일
+        self.dirty = False
+        self.task = None
+
+    @property
+    def is_empty(self):
+        return not self.member_emails and not self.members and not self.subscribers
+
+    def is_member(self, user_email: str) -> bool:
+        return user_email in self.member_emails.values()
+
+    def snapshot_text(self) -> str:
+        return json.dumps({
+            "type": "room",
+            "room": self.room_id,
+            "members": list(self.members.values()),
+            "server_time": time.time(),
+        }, ensure_ascii=False)
+
+
+class RoomRegistry:
+    def __init__(self, tick_seconds: float = ROOM_TICK_SECONDS):
+        self.tick_seconds = tick_seconds
+        self.rooms: dict[str, RoomHub] = {}
+
+    def _get_or_create(self, room_id: str) -> RoomHub:
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = RoomHub(room_id)
+            self.rooms[room_id] = room
+        if room.task is None or room.task.done():
+            room.task = asyncio.create_task(self._broadcast_loop(room))
+        return room
+
+    def join(self, room_id: str, member_id: str, user_email: str | None):
+        """
+        /ws_stats 세션이 방에 들어올 때 호출합니다. 상태는 첫 publish 부터 보입니다.
+        """
+        room = self._get_or_create(room_id)
+        room.member_emails[member_id] = user_email
+
+    def is_member(self, room_id: str, user_email: str) -> bool:
+        room = self.rooms.get(room_id)
+        return room is not None and room.is_member(user_email)
+
+    def publish(self, room_id: str, member_id: str, name: str, state: dict):
+        """
+        멤버 상태 갱신. 전송은 하지 않고 표시만 해둡니다 (다음 틱에 합쳐서 전송).
+        """
+        room = self._get_or_create(room_id)
+        room.members[member_id] = {
+            "id": member_id,
+            "name": name,
+            "status": state["current_status"],
+            "total_study_seconds": state["total_study_seconds"],
+            "is_timer_running": state["is_timer_running"],
+            "updated_at": time.time(),
+        }
+        room.dirty = True
+
+    def leave(self, room_id: str, member_id: str):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        room.member_emails.pop(member_id, None)
+        room.members.pop(member_id, None)
+        # 남은 구독자에게 멤버 변경을 알리고, 구독 자격도 다음 틱에 다시 확인합니다.
+        room.dirty = True
+        self._discard_if_empty(room)
+
+    async def subscribe(self, room_id: str, websocket, user_email: str):
+        room = self._get_or_create(room_id)
+        room.subscribers[websocket] = user_email
+        await websocket.send_text(room.snapshot_text())
+
+    def unsubscribe(self, room_id: str, websocket):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        room.subscribers.pop(websocket, None)
+        self._discard_if_empty(room)
+
+    def _discard_if_empty(self, room: RoomHub):
+        if room.is_empty and self.rooms.get(room.room_id) is room:
+            del self.rooms[room.room_id]
+            if room.task is not None:
+                room.task.cancel()
+
+    async def _close_non_members(self, room: RoomHub):
+        # 방의 세션을 모두 끝낸 사용자의 구독을 닫습니다.
+        evicted = [websocket for websocket, user_email in room.subscribers.items() if not room.is_member(user_email)]
+        for websocket in evicted:
+            del room.subscribers[websocket]
+        for websocket in evicted:
+            try:
+                await asyncio.wait_for(websocket.close(code=1008, reason="Not a room member"), timeout=ROOM_SEND_TIMEOUT_SECONDS)
+            except Exception:
+                pass
+
+    async def _send(self, websocket, text: str) -> bool:
+        try:
+            await asyncio.wait_for(websocket.send_text(text), timeout=ROOM_SEND_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+    async def _broadcast_loop(self, room: RoomHub):
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            if not room.dirty or not room.subscribers:
+                continue
+            room.dirty = False
+            await self._close_non_members(room)
+            text = room.snapshot_text()     # 방당 1회 직렬화
+            subscribers = list(room.subscribers)
+            results = await asyncio.gather(*(self._send(ws, text) for ws in subscribers))
+            for websocket, ok in zip(subscribers, results):
+                if not ok:
+                    room.subscribers.pop(websocket, None)
+            if room.is_empty:
+                self._discard_if_empty(room)
+                return
+
+
+room_registry = RoomRegistry()
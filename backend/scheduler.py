@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+from collections import deque
+from functools import partial
+from resources import SESSION_INFERENCE_EXECUTOR, THREAD_BUDGET
+
+# 세션 간 공정한 추론 스케줄링
+# 추론 실행기에 먼저 도착한 프레임부터 처리하면 프레임을 빨리(또는 무겁게) 보내는 세션이 추론 시간을 더 가져갑니다.
+# 실행기 앞에 세션별 대기열을 두고 가중 공정 큐(virtual time)로 다음 작업을 고릅니다.
+# - 세션마다 지금까지 쓴 추론 시간 / 가중치(virtual time)를 세고, 대기 중인 세션 중 가장 적게 쓴 세션을 먼저 보냅니다.
+#   실제 추론 시간은 끝난 뒤 더하므로 무거운 프레임을 보내는 세션은 그만큼 차례가 늦어집니다.
+#   (세션마다 작업이 하나씩만 대기하는 구조라, 돌아가며 몫을 주는 deficit round-robin 은 프레임 수만 공평해집니다)
+# - 쉬다가 돌아온 세션은 현재 가장 적게 쓴 세션보다 SCHEDULER_QUANTUM_SECONDS 이상 앞서지 못합니다 (몫을 쌓아두지 못함).
+# - 우선순위 클래스는 가중치로 반영합니다 (로그인 사용자: 통계가 저장되므로 익명보다 큰 몫).
+# - 최소 서비스율: 대기 중인 작업이 1 / SCHEDULER_MIN_SERVICE_FPS 초 넘게 기다렸으면 virtual time 과 관계없이 먼저 보냅니다.
+# 이벤트 루프에서만 호출되므로 잠금이 필요 없습니다.
+
+SCHEDULER_QUANTUM_SECONDS = float(os.environ.get("SCHEDULER_QUANTUM_SECONDS", "0.05"))
+SCHEDULER_WEIGHT_AUTHENTICATED = float(os.environ.get("SCHEDULER_WEIGHT_AUTHENTICATED", "2"))
+SCHEDULER_WEIGHT_ANONYMOUS = float(os.environ.get("SCHEDULER_WEIGHT_ANONYMOUS", "1"))
+SCHEDULER_MIN_SERVICE_FPS = float(os.environ.get("SCHEDULER_MIN_SERVICE_FPS", "1"))
+WAIT_SMOOTHING = 0.2
+
+PRIORITY_AUTHENTICATED = "authenticated"
+PRIORITY_ANONYMOUS = "anonymous"
+PRIORITY_WEIGHTS = {
+    PRIORITY_AUTHENTICATED: SCHEDULER_WEIGHT_AUTHENTICATED,
+    PRIORITY_ANONYMOUS: SCHEDULER_WEIGHT_ANONYMOUS,
+}
+
+
+class _Job:
+    __slots__ = ("fn", "args", "future", "enqueued_time")
+
+    def __init__(self, fn, args, future, enqueued_time: float):
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.enqueued_time = enqueued_time
+
+
+class SchedulerSession:
+    __slots__ = ("label", "priority", "weight", "virtual_time", "jobs", "waiting", "served",
+                 "wait_total", "wait_max", "wait_last", "wait_average", "inference_seconds")
+
+    def __init__(self, label: str, priority: str):
+        self.label = label
+        self.priority = priority
+        self.weight = PRIORITY_WEIGHTS[priority]
+        self.virtual_time = 0.0         # 사용한 추론 시간 / 가중치
+        self.jobs = deque()
+        self.waiting = False
+        self.served = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_last = 0.0
+        self.wait_average = 0.0         # 지수 이동 평균
+        self.inference_seconds = 0.0
+
+    def record_wait(self, wait: float):
+        self.served += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.wait_last = wait
+        self.wait_average = wait if self.served == 1 else self.wait_average + WAIT_SMOOTHING * (wait - self.wait_average)
+
+    def stats(self) -> dict:
+        return {
+            "session": self.label,
+            "priority": self.priority,
+            "weight": self.weight,
+            "served": self.served,
+            "pending": len(self.jobs),
+            "wait_ms_last": self.wait_last * 1000,
+            "wait_ms_avg": self.wait_average * 1000,
+            "wait_ms_mean": self.wait_total / self.served * 1000 if self.served else 0.0,
+            "wait_ms_max": self.wait_max * 1000,
+            "inference_seconds": self.inference_seconds,
+            "virtual_time": self.virtual_time,
+        }
+
+
+class InferenceScheduler:
+    def __init__(self, executor=SESSION_INFERENCE_EXECUTOR, capacity: int = THREAD_BUDGET.inference_workers,
+                 quantum_seconds: float = SCHEDULER_QUANTUM_SECONDS, min_service_fps: float = SCHEDULER_MIN_SERVICE_FPS):
+        """
+        capacity 는 실행기 스레드 수와 같게 둡니다. 실행기 안에서는 대기가 생기지 않고 순서는 여기서만 정해집니다.
+        """
+        self.executor = executor
+        self.capacity = max(1, capacity)
+        self.quantum_seconds = quantum_seconds
+        self.max_wait_seconds = 1.0 / min_service_fps if min_service_fps > 0 else 0.0
+        self.sessions = set()
+        self.waiting = []               # 대기 작업이 있는 세션
+        self.virtual_clock = 0.0        # 대기 중인 세션들의 최소 virtual time (감소하지 않음)
+        self.running = 0
+
+    def register(self, label: str, priority: str = PRIORITY_ANONYMOUS) -> SchedulerSession:
+        session = SchedulerSession(label, priority)
+        session.virtual_time = self.virtual_clock
+        self.sessions.add(session)
+        return session
+
+    def unregister(self, session: SchedulerSession):
+        self.sessions.discard(session)
+        if session.waiting:
+            self.waiting.remove(session)
+            session.waiting = False
+        while session.jobs:
+            session.jobs.popleft().future.cancel()
+
+    async def run(self, session: SchedulerSession, fn, *args):
+        """
+        세션의 차례가 오면 fn(*args) 를 추론 실행기에서 실행하고 결과를 돌려줍니다.
+        """
+        future = asyncio.get_running_loop().create_future()
+        session.jobs.append(_Job(fn, args, future, time.monotonic()))
+        if not session.waiting:
+            session.waiting = True
+            session.virtual_time = max(session.virtual_time, self.virtual_clock - self.quantum_seconds)
+            self.waiting.append(session)
+        self._dispatch()
+        return await future
+
+    def _next_session(self) -> SchedulerSession | None:
+        if not self.waiting:
+            return None
+
+        if self.max_wait_seconds > 0:
+            oldest = min(self.waiting, key=lambda session: session.jobs[0].enqueued_time)
+            if time.monotonic() - oldest.jobs[0].enqueued_time > self.max_wait_seconds:
+                return oldest
+
+        session = min(self.waiting, key=lambda session: session.virtual_time)
+        self.virtual_clock = max(self.virtual_clock, session.virtual_time)
+        return session
+
+    def _dispatch(self):
+        while self.running < self.capacity:
+            session = self._next_session()
+            if session is None:
+                return
+            job = session.jobs.popleft()
+            if not session.jobs:
+                self.waiting.remove(session)
+                session.waiting = False
+            if job.future.done():
+                # 기다리던 쪽이 취소됨 (연결 종료 등)
+                continue
+
+            now = time.monotonic()
+            session.record_wait(now - job.enqueued_time)
+            self.running += 1
+            executor_future = asyncio.get_running_loop().run_in_executor(self.executor, job.fn, *job.args)
+            executor_future.add_done_callback(partial(self._on_done, session, job, now))
+
+    def _on_done(self, session: SchedulerSession, job: _Job, started_time: float, executor_future):
+        self.running -= 1
+        cost = time.monotonic() - started_time
+        session.virtual_time += cost / session.weight
+        session.inference_seconds += cost
+        if not job.future.done():
+            if executor_future.cancelled():
+                job.future.cancel()
+            elif executor_future.exception() is not None:
+                job.future.set_exception(executor_future.exception())
+            else:
+                job.future.set_result(executor_future.result())
+        self._dispatch()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(session.jobs) for session in self.waiting)
+
+    def snapshot(self) -> dict:
+        sessions = sorted((session.stats() for session in self.sessions), key=lambda stats: stats["wait_ms_avg"], reverse=True)
+        return {
+            "capacity": self.capacity,
+            "running": self.running,
+            "queued": self.queued,
+            "quantum_ms": self.quantum_seconds * 1000,
+            "max_wait_ms": self.max_wait_seconds * 1000,
+            "sessions": sessions,
+        }
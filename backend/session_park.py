@@ -0,0 +1,82 @@
+import os
+import asyncio
+
+# 재접속 대기(hot resume)
+# 로그인 사용자의 /ws_stats 연결이 끊기면 세션 엔진을 바로 저장/종료하지 않고 SESSION_RESUME_GRACE_SECONDS 동안
+# 사용자별로 보관합니다. 그 안에 같은 사용자가 다시 연결하면 타이머, 보정 기준값, 얼굴 인증 상태를 그대로 이어받고
+# (DB 왕복 없음), 시간이 지나면 그때 한 번 저장(on_expire)합니다.
+# 0 이면 보관하지 않고 즉시 저장합니다.
+
+SESSION_RESUME_GRACE_SECONDS = float(os.environ.get("SESSION_RESUME_GRACE_SECONDS", "30"))
+
+
+class ParkedSession:
+    __slots__ = ("engine", "user_email", "user_name", "study_date", "study_date_key", "expiry_task")
+
+    def __init__(self, engine, user_email: str, user_name: str, study_date, study_date_key: str):
+        self.engine = engine
+        self.user_email = user_email
+        self.user_name = user_name
+        self.study_date = study_date
+        self.study_date_key = study_date_key
+        self.expiry_task = None
+
+
+class SessionPark:
+    def __init__(self, on_expire, grace_seconds: float = SESSION_RESUME_GRACE_SECONDS):
+        """
+        on_expire(parked: ParkedSession) -> 코루틴. 보관 시간이 끝난 세션을 저장하고 닫습니다.
+        """
+        self.on_expire = on_expire
+        self.grace_seconds = grace_seconds
+        self.sessions: dict[str, ParkedSession] = {}
+        # 이벤트 루프는 태스크를 약한 참조로만 들고 있으므로, 만료 대기/저장 태스크는 끝날 때까지 여기서 붙잡아 둡니다.
+        self.tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.grace_seconds > 0
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def park(self, parked: ParkedSession):
+        previous = self.sessions.pop(parked.user_email, None)
+        if previous is not None:
+            # 같은 사용자의 이전 보관 세션(다른 탭 등)은 바로 저장합니다.
+            previous.expiry_task.cancel()
+            self._spawn(self.on_expire(previous))
+        self.sessions[parked.user_email] = parked
+        parked.expiry_task = self._spawn(self._expire_later(parked))
+
+    def peek(self, user_email: str) -> ParkedSession | None:
+        return self.sessions.get(user_email)
+
+    def resume(self, user_email: str) -> ParkedSession | None:
+        parked = self.sessions.pop(user_email, None)
+        if parked is not None:
+            parked.expiry_task.cancel()
+        return parked
+
+    async def _expire_later(self, parked: ParkedSession):
+        await asyncio.sleep(self.grace_seconds)
+        if self.sessions.get(parked.user_email) is parked:
+            del self.sessions[parked.user_email]
+            await self.on_expire(parked)
+
+    async def expire_all(self):
+        """
+        서버 종료 시 보관 중인 세션을 모두 저장합니다.
+        """
+        parked_sessions = list(self.sessions.values())
+        self.sessions.clear()
+        for parked in parked_sessions:
+            parked.expiry_task.cancel()
+            await self.on_expire(parked)
+        # 이미 시작된 저장(이전 탭 세션, 막 만료된 세션)도 끝날 때까지 기다립니다.
+        pending = [task for task in self.tasks if not task.done()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
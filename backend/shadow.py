@@ -0,0 +1,306 @@
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+import polars as pl
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from ai_monitor import AIEngine, Status
+from profiles import PROFILES, get_profile
+from resources import THREAD_BUDGET
+
+# 섀도 모드: 실제 트래픽으로 다른 엔진 설정 검증
+# 일부 /ws_stats 세션의 프레임을 두 번째 AIEngine(SHADOW_PROFILE)에도 보내고, 프레임별로 실서비스 엔진과
+# 표시 상태가 같은지와 추론 지연 차이를 기록합니다. 사용자 응답에는 영향을 주지 않습니다.
+# - SHADOW_SESSION_RATE 비율의 세션에만 섀도 엔진을 붙이고, 세션당 SHADOW_FRAME_FPS 까지만 복사합니다.
+# - 섀도 추론은 낮은 OS 우선순위(nice)의 전용 스레드에서만 돌고, 사용량이 SHADOW_CPU_CORES 를 넘거나
+#   이전 섀도 프레임이 아직 처리 중이면 복사하지 않고 버립니다 (대기열 없음).
+# - 섀도 엔진은 실서비스 엔진이 그 프레임에 쓴 과부하 단계(tier)로 같은 단계를 생략해 실행하므로, 기록된 차이는
+#   프로필 차이만 반영합니다. 단계는 행에 함께 남기고 단계별로 따로 집계합니다.
+# - 섀도 엔진은 DB 없이 실행되므로 얼굴 인증을 하지 않습니다. 실서비스 엔진이 낯선 사람으로 판정한 프레임
+#   (인증 차이)과 보정/초기화 중인 프레임은 집계에서 제외합니다.
+# - nice 는 섀도 작업/단계 스레드와, 그 스레드에서 만들어지는 섀도 엔진의 mediapipe 그래프 스레드에만 적용됩니다.
+#   YOLO 가 쓰는 torch intra-op(OpenMP) 스레드 풀은 프로세스 공용이라 낮은 우선순위가 되지 않으며, 이 몫은
+#   SHADOW_CPU_CORES 예산(지연 x 사용 스레드 수로 차감)으로만 제한됩니다.
+# - 기록은 timeline 과 같이 Parquet (SHADOW_DIR/date=YYYY-MM-DD/*.parquet) 으로 모아 씁니다.
+#
+# SHADOW_PROFILE 을 지정하지 않으면 비활성화됩니다.
+
+SHADOW_PROFILE = os.environ.get("SHADOW_PROFILE")
+SHADOW_SESSION_RATE = float(os.environ.get("SHADOW_SESSION_RATE", "0.1"))
+SHADOW_FRAME_FPS = float(os.environ.get("SHADOW_FRAME_FPS", "2"))
+SHADOW_CPU_CORES = float(os.environ.get("SHADOW_CPU_CORES", "0.25"))
+SHADOW_DIR = os.environ.get("SHADOW_DIR", "shadow_data")
+SHADOW_FLUSH_ROWS = int(os.environ.get("SHADOW_FLUSH_ROWS", "1024"))
+SHADOW_NICE = 19
+# 섀도 작업이 동시에 쓰는 스레드: YOLO 의 torch intra-op 스레드 + 단계(FaceMesh/Pose) 스레드 1개.
+# 지연 x 이 수를 CPU 사용량 추정치로 보고 예산에서 차감합니다 (mediapipe 내부 스레드는 포함되지 않음).
+_SHADOW_THREADS = THREAD_BUDGET.intra_op_threads + 1
+
+if SHADOW_PROFILE is not None and SHADOW_PROFILE not in PROFILES:
+    raise ValueError(f"Unknown SHADOW_PROFILE: {SHADOW_PROFILE} (choose from {', '.join(PROFILES)})")
+
+logger = logging.getLogger(__name__)
+
+_UNSCORED_STATUSES = (Status.INITIALIZING, Status.INITIALIZING_MODELS, Status.CALIBRATING)
+
+
+def _lower_thread_priority():
+    # Linux 에서는 nice 가 스레드 단위로 적용됩니다.
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), SHADOW_NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+class ShadowSession:
+    __slots__ = ("key", "engine", "last_copy_time", "busy")
+
+    def __init__(self, key: str, engine: AIEngine):
+        self.key = key
+        self.engine = engine
+        self.last_copy_time = 0.0
+        self.busy = False
+
+
+class ShadowRecorder:
+    """
+    프레임별 비교 결과를 열 단위로 모았다가 Parquet 파일 하나로 씁니다. 이벤트 루프에서만 추가합니다.
+    """
+    __slots__ = ("ts", "session", "live_profile", "shadow_profile", "live_tier", "live_unverified",
+                 "live_status", "shadow_status", "live_ms", "shadow_ms")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, [])
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, ts: float, session: str, live_profile: str, shadow_profile: str, live_tier: int, live_unverified: bool,
+               live_status: int, shadow_status: int, live_ms: float, shadow_ms: float):
+        self.ts.append(ts)
+        self.session.append(session)
+        self.live_profile.append(live_profile)
+        self.shadow_profile.append(shadow_profile)
+        self.live_tier.append(live_tier)
+        self.live_unverified.append(live_unverified)
+        self.live_status.append(live_status)
+        self.shadow_status.append(shadow_status)
+        self.live_ms.append(live_ms)
+        self.shadow_ms.append(shadow_ms)
+
+    def drain(self) -> pl.DataFrame:
+        frame = pl.DataFrame({
+            "ts": pl.Series(self.ts, dtype=pl.Float64),
+            "session": pl.Series(self.session, dtype=pl.Categorical),
+            "live_profile": pl.Series(self.live_profile, dtype=pl.Categorical),
+            "shadow_profile": pl.Series(self.shadow_profile, dtype=pl.Categorical),
+            "live_tier": pl.Series(self.live_tier, dtype=pl.UInt8),
+            "live_unverified": pl.Series(self.live_unverified, dtype=pl.Boolean),
+            "live_status": pl.Series(self.live_status, dtype=pl.UInt8),
+            "shadow_status": pl.Series(self.shadow_status, dtype=pl.UInt8),
+            "live_ms": pl.Series(self.live_ms, dtype=pl.Float32),
+            "shadow_ms": pl.Series(self.shadow_ms, dtype=pl.Float32),
+        })
+        for name in self.__slots__:
+            getattr(self, name).clear()
+        return frame
+
+
+def write_shadow_rows(frame: pl.DataFrame) -> int:
+    if frame.height == 0:
+        return 0
+    study_date = datetime.now(timezone.utc).date().isoformat()
+    partition_dir = os.path.join(SHADOW_DIR, f"date={study_date}")
+    os.makedirs(partition_dir, exist_ok=True)
+    file_path = os.path.join(partition_dir, f"{os.getpid()}-{int(time.time() * 1000)}.parquet")
+    frame.write_parquet(file_path, compression="zstd")
+    return frame.height
+
+
+def _run_shadow_frame(engine: AIEngine, frame, frame_time: float, tier: int):
+    # 첫 프레임의 모델 로드는 한 번뿐인 비용이라 추론 지연과 CPU 예산 차감에서 뺍니다.
+    # (넣으면 예산이 크게 음수가 되어 새 섀도 세션마다 한동안 표본이 끊깁니다)
+    engine._load_models_if_needed()
+    started = time.perf_counter()
+    engine.process(frame, frame_time, tier)
+    return engine.status, time.perf_counter() - started
+
+
+class ShadowRunner:
+    """
+    프로세스 전체의 섀도 실행기. 이벤트 루프에서만 호출되므로 잠금이 필요 없습니다.
+    """
+    def __init__(self, profile: str | None = SHADOW_PROFILE, session_rate: float = SHADOW_SESSION_RATE,
+                 frame_fps: float = SHADOW_FRAME_FPS, cpu_cores: float = SHADOW_CPU_CORES):
+        self.profile = get_profile(profile).name if profile is not None else None
+        self.session_rate = session_rate
+        self.min_interval = 1.0 / frame_fps if frame_fps > 0 else 0.0
+        self.cpu_cores = cpu_cores
+        # CPU 예산 (초). 초당 cpu_cores 만큼 채워지고 2초 분량까지 모입니다.
+        self.cpu_tokens = cpu_cores * 2
+        self.last_refill_time = time.monotonic()
+        self.recorder = ShadowRecorder()
+        self.executor = None
+        self.stage_executor = None
+        self.sessions = 0
+        self.copied = 0
+        self.dropped_busy = 0
+        self.dropped_budget = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.profile is not None and self.session_rate > 0
+
+    def attach(self, session_label: str) -> ShadowSession | None:
+        """
+        표본으로 뽑힌 세션에 섀도 엔진을 붙입니다. 뽑히지 않았으면 None.
+        """
+        if not self.enabled or random.random() >= self.session_rate:
+            return None
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow", initializer=_lower_thread_priority)
+            self.stage_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-stage", initializer=_lower_thread_priority)
+        engine = AIEngine(profile=self.profile, stage_executor=self.stage_executor)
+        engine.load_user_stats({}, None)
+        self.sessions += 1
+        key = hashlib.sha1(session_label.encode("utf-8")).hexdigest()[:16]
+        return ShadowSession(key, engine)
+
+    def detach(self, shadow: ShadowSession | None):
+        if shadow is not None:
+            shadow.engine.close()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.cpu_tokens = min(self.cpu_cores * 2, self.cpu_tokens + (now - self.last_refill_time) * self.cpu_cores)
+        self.last_refill_time = now
+
+    def offer(self, loop, shadow: ShadowSession, live_engine: AIEngine, frame, frame_time: float, live_seconds: float):
+        """
+        실서비스 엔진(live_engine)이 방금 처리한 프레임을 섀도 엔진에도 보낼지 정하고 보냅니다. 기다리지 않습니다.
+        프레임 배열은 읽기만 하므로 복사하지 않습니다.
+        """
+        if frame_time - shadow.last_copy_time < self.min_interval:
+            return
+        shadow.last_copy_time = frame_time
+        if shadow.busy:
+            self.dropped_busy += 1
+            return
+        self._refill()
+        if self.cpu_tokens <= 0:
+            self.dropped_budget += 1
+            return
+
+        live_status = live_engine.status
+        slot = live_engine.verification_slot
+        live_unverified = live_status == Status.AWAY_UNKNOWN_PERSON or (slot.active and not slot.result[0])
+        live = (live_engine.profile.name, live_engine.tier, live_unverified, int(live_status), live_seconds)
+
+        shadow.busy = True
+        self.copied += 1
+        future = loop.run_in_executor(self.executor, _run_shadow_frame, shadow.engine, frame, frame_time, live_engine.tier)
+        future.add_done_callback(partial(self._on_done, shadow, frame_time, live))
+
+    def _on_done(self, shadow: ShadowSession, frame_time: float, live: tuple, future):
+        shadow.busy = False
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.errors += 1
+            return
+        shadow_status, shadow_seconds = future.result()
+        self.cpu_tokens -= shadow_seconds * _SHADOW_THREADS
+        live_profile, live_tier, live_unverified, live_status, live_seconds = live
+        self.recorder.append(frame_time, shadow.key, live_profile, self.profile, live_tier, live_unverified,
+                             live_status, int(shadow_status), max(0.0, live_seconds) * 1000, shadow_seconds * 1000)
+
+    @property
+    def needs_flush(self) -> bool:
+        return len(self.recorder) >= SHADOW_FLUSH_ROWS
+
+    def drain(self) -> pl.DataFrame:
+        return self.recorder.drain()
+
+    def shutdown(self):
+        for executor in (self.executor, self.stage_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def counters(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "shadow_profile": self.profile,
+            "session_rate": self.session_rate,
+            "cpu_cores": self.cpu_cores,
+            "sessions": self.sessions,
+            "copied_frames": self.copied,
+            "dropped_busy": self.dropped_busy,
+            "dropped_budget": self.dropped_budget,
+            "errors": self.errors,
+            "buffered_rows": len(self.recorder),
+        }
+
+
+def summarize_shadow(start_date: str, status_labels) -> dict:
+    """
+    기록된 비교 결과를 (실서비스 프로필, 섀도 프로필, 과부하 단계) 별로 집계합니다.
+    둘 중 하나라도 보정/초기화 중인 프레임과, 실서비스 엔진이 낯선 사람으로 판정한 프레임은 제외합니다.
+    """
+    empty = {"comparisons": [], "disagreements": []}
+    if not os.path.isdir(SHADOW_DIR):
+        return empty
+    try:
+        lazy = pl.scan_parquet(os.path.join(SHADOW_DIR, "**", "*.parquet"), hive_partitioning=True)
+    except Exception:
+        return empty
+
+    unscored = [int(status) for status in _UNSCORED_STATUSES]
+    scored = (
+        lazy
+        .filter(pl.col("date").cast(pl.Utf8) >= start_date)
+        .filter(~pl.col("live_status").is_in(unscored) & ~pl.col("shadow_status").is_in(unscored))
+        .filter(~pl.col("live_unverified"))
+        .with_columns(
+            pl.col("live_profile").cast(pl.Utf8),
+            pl.col("shadow_profile").cast(pl.Utf8),
+            (pl.col("live_status") == pl.col("shadow_status")).alias("agree"),
+        )
+    )
+
+    comparisons = (
+        scored.group_by("live_profile", "shadow_profile", "live_tier")
+        .agg(
+            pl.len().alias("frames"),
+            pl.col("session").n_unique().alias("sessions"),
+            pl.col("agree").mean().alias("agreement"),
+            pl.col("live_ms").median().alias("live_ms_p50"),
+            pl.col("live_ms").quantile(0.95).alias("live_ms_p95"),
+            pl.col("shadow_ms").median().alias("shadow_ms_p50"),
+            pl.col("shadow_ms").quantile(0.95).alias("shadow_ms_p95"),
+            (pl.col("shadow_ms") - pl.col("live_ms")).mean().alias("latency_diff_ms_mean"),
+        )
+        .sort("frames", descending=True)
+        .collect()
+    )
+    disagreements = (
+        scored.filter(~pl.col("agree"))
+        .group_by("live_profile", "shadow_profile", "live_tier", "live_status", "shadow_status")
+        .agg(pl.len().alias("frames"))
+        .sort("frames", descending=True)
+        .head(20)
+        .collect()
+    )
+
+    return {
+        "comparisons": comparisons.to_dicts(),
+        "disagreements": [
+            {**row, "live": status_labels[row["live_status"]], "shadow": status_labels[row["shadow_status"]]}
+            for row in disagreements.to_dicts()
+        ],
+    }
@@ -0,0 +1,79 @@
+-- 주간/월간 공부 통계 사전 집계 (rollups.py / main.py 에서 사용)
+-- Supabase SQL Editor 에서 한 번 실행합니다.
+
+create table if not exists public.user_period_stats (
+    user_email            text             not null,
+    period_type           text             not null check (period_type in ('week', 'month')),
+    period_key            text             not null,   -- week: 2025-W07, month: 2025-02
+    user_name             text,
+    study_seconds         double precision not null default 0,
+    drowsy_count          bigint           not null default 0,
+    away_count            bigint           not null default 0,
+    lying_down_count      bigint           not null default 0,
+    leaning_back_count    bigint           not null default 0,
+    looking_away_count    bigint           not null default 0,
+    drowsy_seconds        double precision not null default 0,
+    away_seconds          double precision not null default 0,
+    lying_down_seconds    double precision not null default 0,
+    leaning_back_seconds  double precision not null default 0,
+    looking_away_seconds  double precision not null default 0,
+    updated_at            timestamptz      not null default now(),
+    primary key (user_email, period_type, period_key)
+);
+
+-- 기간별 랭킹 조회용 (period_type, period_key) 고정 후 study_seconds 내림차순
+create index if not exists user_period_stats_ranking_idx
+    on public.user_period_stats (period_type, period_key, study_seconds desc);
+
+
+-- 세션 종료 시 델타를 해당 주/월 행에 원자적으로 더합니다.
+-- p_period_keys: {"week": "2025-W07", "month": "2025-02"}
+-- p_deltas: {"study_seconds": 12.3, "drowsy_count": 1, "drowsy_seconds": 4.5, ...}
+create or replace function public.increment_period_stats(
+    p_user_email  text,
+    p_user_name   text,
+    p_period_keys jsonb,
+    p_deltas      jsonb
+) returns void
+language plpgsql
+as $$
+declare
+    period record;
+begin
+    for period in select key as period_type, value #>> '{}' as period_key from jsonb_each(p_period_keys) loop
+        insert into public.user_period_stats as s (
+            user_email, period_type, period_key, user_name,
+            study_seconds,
+            drowsy_count, away_count, lying_down_count, leaning_back_count, looking_away_count,
+            drowsy_seconds, away_seconds, lying_down_seconds, leaning_back_seconds, looking_away_seconds
+        ) values (
+            p_user_email, period.period_type, period.period_key, p_user_name,
+            coalesce((p_deltas ->> 'study_seconds')::double precision, 0),
+            coalesce((p_deltas ->> 'drowsy_count')::bigint, 0),
+            coalesce((p_deltas ->> 'away_count')::bigint, 0),
+            coalesce((p_deltas ->> 'lying_down_count')::bigint, 0),
+            coalesce((p_deltas ->> 'leaning_back_count')::bigint, 0),
+            coalesce((p_deltas ->> 'looking_away_count')::bigint, 0),
+            coalesce((p_deltas ->> 'drowsy_seconds')::double precision, 0),
+            coalesce((p_deltas ->> 'away_seconds')::double precision, 0),
+            coalesce((p_deltas ->> 'lying_down_seconds')::double precision, 0),
+            coalesce((p_deltas ->> 'leaning_back_seconds')::double precision, 0),
+            coalesce((p_deltas ->> 'looking_away_seconds')::double precision, 0)
+        )
+        on conflict (user_email, period_type, period_key) do update set
+            user_name            = excluded.user_name,
+            study_seconds        = s.study_seconds        + excluded.study_seconds,
+            drowsy_count         = s.drowsy_count         + excluded.drowsy_count,
+            away_count           = s.away_count           + excluded.away_count,
+            lying_down_count     = s.lying_down_count     + excluded.lying_down_count,
+            leaning_back_count   = s.leaning_back_count   + excluded.leaning_back_count,
+            looking_away_count   = s.looking_away_count   + excluded.looking_away_count,
+            drowsy_seconds       = s.drowsy_seconds       + excluded.drowsy_seconds,
+            away_seconds         = s.away_seconds         + excluded.away_seconds,
+            lying_down_seconds   = s.lying_down_seconds   + excluded.lying_down_seconds,
+            leaning_back_seconds = s.leaning_back_seconds + excluded.leaning_back_seconds,
+            looking_away_seconds = s.looking_away_seconds + excluded.looking_away_seconds,
+            updated_at           = now();
+    end loop;
+end;
+$$;
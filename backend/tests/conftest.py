@@ -0,0 +1,5 @@
+import os
+import sys
+
+# backend 디렉터리의 평면 모듈(frame_batch 등)을 그대로 import 합니다.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,55 @@
+import struct
+import pytest
+from frame_batch import (FRAME_BATCH_MAGIC, MAX_BATCH_FRAMES, MAX_BATCH_SPAN_SECONDS,
+                         batch_frame_times, is_frame_batch, pack_frame_batch, parse_frame_batch)
+
+RECEIVED = 1_000_000.0
+
+
+def test_pack_and_parse_round_trip():
+    data = pack_frame_batch([(10.0, b"aa"), (20.0, b"bbb")])
+    assert is_frame_batch(data)
+    assert [(ts, bytes(jpeg)) for ts, jpeg in parse_frame_batch(data)] == [(10.0, b"aa"), (20.0, b"bbb")]
+
+
+@pytest.mark.parametrize("data", [
+    FRAME_BATCH_MAGIC,                                                          # 헤더 잘림
+    struct.pack("<4sH", FRAME_BATCH_MAGIC, 0),                                  # 프레임 0장
+    struct.pack("<4sH", FRAME_BATCH_MAGIC, MAX_BATCH_FRAMES + 1),               # 프레임 수 초과
+    struct.pack("<4sH", FRAME_BATCH_MAGIC, 1) + b"\x00" * 4,                    # 프레임 헤더 잘림
+    struct.pack("<4sH", FRAME_BATCH_MAGIC, 1) + struct.pack("<dI", 0.0, 10) + b"abc",   # 본문 잘림
+    pack_frame_batch([(0.0, b"abc")]) + b"x",                                   # 뒤에 남는 바이트
+])
+def test_malformed_batch_raises(data):
+    with pytest.raises(ValueError):
+        parse_frame_batch(data)
+
+
+def test_last_frame_lands_on_receive_time():
+    times = batch_frame_times([0.0, 100.0, 200.0], RECEIVED, 0.0)
+    assert times == pytest.approx([RECEIVED - 0.2, RECEIVED - 0.1, RECEIVED])
+
+
+def test_far_past_offset_clamped_to_batch_span():
+    times = batch_frame_times([0.0, 1e12], RECEIVED, 0.0)
+    assert times == [RECEIVED - MAX_BATCH_SPAN_SECONDS, RECEIVED]
+
+
+def test_offsets_clamped_to_previous_frame_time():
+    previous = RECEIVED - 0.05
+    times = batch_frame_times([0.0, 100.0, 200.0], RECEIVED, previous)
+    assert all(previous <= t <= RECEIVED for t in times)
+    assert times[-1] == RECEIVED
+
+
+def test_future_timestamps_never_pass_receive_time():
+    # 이전 프레임 시각이 수신 시각보다 뒤여도(시계 오류) 수신 시각을 넘지 않습니다.
+    times = batch_frame_times([-5e12, 0.0, 5e12], RECEIVED, RECEIVED + 100.0)
+    assert times == [RECEIVED, RECEIVED, RECEIVED]
+
+
+def test_non_monotonic_times_within_batch_do_not_go_backwards():
+    times = batch_frame_times([0.0, 300.0, 100.0, 400.0], RECEIVED, 0.0)
+    assert times == sorted(times)
+    assert times[-1] == RECEIVED
+    assert all(RECEIVED - MAX_BATCH_SPAN_SECONDS <= t <= RECEIVED for t in times)
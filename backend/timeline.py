@@ -0,0 +1,158 @@
+import os
+import time
+import hashlib
+import numpy as np
+import polars as pl
+
+# 세션별 상태 전이 기록 (timestamp, from_status, to_status)
+# 상태가 바뀔 때만 기록되므로, 상태가 유지되는 프레임에는 비용이 없습니다.
+
+TIMELINE_CAPACITY = int(os.environ.get("TIMELINE_CAPACITY", "512"))
+TIMELINE_DIR = os.environ.get("TIMELINE_DIR", "timeline_data")
+
+
+class TransitionTimeline:
+    """
+    고정 크기 배열 기반 링 버퍼. 가득 차면 가장 오래된 전이부터 덮어씁니다.
+    """
+    __slots__ = ("capacity", "timestamps", "from_states", "to_states", "_head", "_size", "dropped")
+
+    def __init__(self, capacity: int = TIMELINE_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.from_states = np.zeros(capacity, dtype=np.uint8)
+        self.to_states = np.zeros(capacity, dtype=np.uint8)
+        self._head = 0      # 다음에 쓸 위치
+        self._size = 0
+        self.dropped = 0    # flush 전에 덮어써진 전이 수
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def needs_flush(self):
+        # 덮어쓰기 전에 체크포인트할 수 있도록 절반이 차면 flush 대상
+        return self._size >= self.capacity // 2
+
+    def record(self, timestamp: float, from_status: int, to_status: int):
+        head = self._head
+        self.timestamps[head] = timestamp
+        self.from_states[head] = from_status
+        self.to_states[head] = to_status
+        self._head = (head + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self.dropped += 1
+
+    def drain(self):
+        """
+        기록된 전이를 시간 순서대로 복사해 반환하고 버퍼를 비웁니다.
+        반환값: (timestamps, from_states, to_states)
+        """
+        start = (self._head - self._size) % self.capacity
+        order = (np.arange(self._size) + start) % self.capacity
+        result = (self.timestamps[order], self.from_states[order], self.to_states[order])
+        self._size = 0
+        return result
+
+    def clear(self):
+        self._size = 0
+        self._head = 0
+
+
+def _user_key(user_email: str) -> str:
+    return hashlib.sha1(user_email.encode('utf-8')).hexdigest()[:16]
+
+
+def flush_timeline(timeline: TransitionTimeline, user_email: str, study_date: str) -> int:
+    """
+    버퍼의 전이를 한 번에 Parquet 파일 하나로 기록합니다. (hive 파티션: date=YYYY-MM-DD)
+    반환값: 기록한 행 수
+    """
+    if len(timeline) == 0:
+        return 0
+
+    timestamps, from_states, to_states = timeline.drain()
+    frame = pl.DataFrame({
+        "user_email": pl.Series([user_email] * len(timestamps), dtype=pl.Categorical),
+        "ts": pl.Series(timestamps, dtype=pl.Float64),
+        "from_status": pl.Series(from_states, dtype=pl.UInt8),
+        "to_status": pl.Series(to_states, dtype=pl.UInt8),
+    })
+
+    partition_dir = os.path.join(TIMELINE_DIR, f"date={study_date}")
+    os.makedirs(partition_dir, exist_ok=True)
+    file_path = os.path.join(partition_dir, f"{_user_key(user_email)}-{int(time.time() * 1000)}.parquet")
+    frame.write_parquet(file_path, compression="zstd")
+    return frame.height
+
+
+def _user_partition_files(user_email: str, start_date: str) -> list[str]:
+    """
+    start_date 이후 날짜 파티션에서 이 사용자의 파일만 고릅니다. (파일 이름이 사용자 키로 시작)
+    다른 사용자의 파일은 열지 않으므로 조회 비용이 전체 사용자 수와 무관합니다.
+    """
+    if not os.path.isdir(TIMELINE_DIR):
+        return []
+    prefix = f"{_user_key(user_email)}-"
+    file_paths = []
+    for entry in os.scandir(TIMELINE_DIR):
+        if not entry.is_dir() or not entry.name.startswith("date=") or entry.name[len("date="):] < start_date:
+            continue
+        file_paths.extend(
+            os.path.join(entry.path, name) for name in os.listdir(entry.path)
+            if name.startswith(prefix) and name.endswith(".parquet")
+        )
+    return sorted(file_paths)
+
+
+def summarize_timeline(user_email: str, start_date: str, status_labels) -> dict:
+    """
+    사용자의 전이 기록을 집계합니다.
+    각 전이의 지속 시간 = 같은 날짜 안에서 다음 전이까지의 시간 (마지막 전이는 제외)
+    """
+    file_paths = _user_partition_files(user_email, start_date)
+    if not file_paths:
+        return {"by_status": [], "by_hour": [], "transitions": 0}
+
+    try:
+        lazy = pl.scan_parquet(file_paths, hive_partitioning=True)
+    except Exception:
+        return {"by_status": [], "by_hour": [], "transitions": 0}
+
+    spans = (
+        lazy
+        .filter((pl.col("user_email").cast(pl.Utf8) == user_email) & (pl.col("date").cast(pl.Utf8) >= start_date))
+        .sort("ts")
+        .with_columns(
+            (pl.col("ts").shift(-1).over("date") - pl.col("ts")).alias("duration"),
+            pl.from_epoch(pl.col("ts"), time_unit="s")
+              .dt.replace_time_zone("UTC").dt.convert_time_zone("Asia/Seoul")
+              .dt.hour().alias("hour"),
+        )
+        .filter(pl.col("duration").is_not_null())
+    )
+
+    by_status = (
+        spans.group_by("to_status")
+        .agg(pl.len().alias("entries"), pl.col("duration").sum().alias("seconds"), pl.col("duration").mean().alias("avg_seconds"))
+        .sort("seconds", descending=True)
+        .collect()
+    )
+    by_hour = (
+        spans.group_by("hour", "to_status")
+        .agg(pl.col("duration").sum().alias("seconds"))
+        .sort("hour", "to_status")
+        .collect()
+    )
+
+    return {
+        "by_status": [
+            {**row, "status": status_labels[row["to_status"]]} for row in by_status.to_dicts()
+        ],
+        "by_hour": [
+            {**row, "status": status_labels[row["to_status"]]} for row in by_hour.to_dicts()
+        ],
+        "transitions": int(by_status["entries"].sum()) if by_status.height else 0,
+    }
@@ -0,0 +1,222 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from fastapi import WebSocket, WebSocketDisconnect
+from log import HOT_PATH
+
+# 연속 영상 스트림 수신 (/ws_video)
+# 프레임마다 JPEG 을 보내는 대신 브라우저 MediaRecorder 의 WebM(VP8) 청크나 H.264 Annex-B 스트림을 그대로 받아
+# 서버에서 이어서 디코드합니다. 정적인 웹캠 화면은 프레임 간 압축 덕분에 대역폭과 디코드 비용이 크게 줄어듭니다.
+#
+# - 웹소켓 청크는 디코더 스레드가 파일처럼 읽고(PyAV), 디코드된 프레임 중 VIDEO_ANALYSIS_FPS 간격의 프레임만
+#   변환해 "최신 프레임" 한 칸에 둡니다. 추론이 밀리면 이전 프레임은 버려집니다 (JPEG 경로의 drop 과 같음).
+# - 프레임 시각은 스트림 시각(pts) 간격을 첫 디코드 시점의 서버 시각에 맞춰 씁니다 (서버 시각보다 앞서지 않음).
+# - PyAV 가 없으면 VIDEO_INGEST_AVAILABLE 이 False 이고 /ws_video 는 1003 으로 닫힙니다.
+
+logger = logging.getLogger(__name__)
+
+try:
+    import av
+    VIDEO_INGEST_AVAILABLE = True
+except ImportError as e:
+    VIDEO_INGEST_AVAILABLE = False
+    logger.info("Video ingest: PyAV 모듈이 없어 /ws_video 가 비활성화됩니다. (pip install av) %s", e)
+
+VIDEO_ANALYSIS_FPS = float(os.environ.get("VIDEO_ANALYSIS_FPS", "10"))
+VIDEO_DECODE_THREADS = int(os.environ.get("VIDEO_DECODE_THREADS", "1"))
+# 디코더가 아직 읽지 않은 청크 수 상한. 넘으면 (비정상적으로 빠른 송신) 스트림을 끊습니다.
+VIDEO_MAX_PENDING_CHUNKS = int(os.environ.get("VIDEO_MAX_PENDING_CHUNKS", "64"))
+# 디코더가 아직 읽지 않은 바이트 상한. 청크 크기는 클라이언트가 정하므로 개수와 함께 바이트로도 제한합니다.
+VIDEO_MAX_PENDING_BYTES = int(os.environ.get("VIDEO_MAX_PENDING_BYTES", str(8 * 1024 * 1024)))
+
+# 쿼리 파라미터 -> FFmpeg demuxer 이름. None 이면 스트림 앞부분으로 형식을 추정합니다.
+VIDEO_CONTAINER_FORMATS = {"webm": "webm", "h264": "h264"}
+
+
+class _ChunkReader:
+    """
+    PyAV 가 읽는 파일 객체. 받은 청크를 순서대로 내주고, 스트림이 끝나면 b"" (EOF) 를 돌려줍니다.
+    seek 가 없으므로 PyAV 는 스트림을 앞에서부터 한 번만 읽습니다.
+    """
+    def __init__(self, max_pending: int = VIDEO_MAX_PENDING_CHUNKS, max_pending_bytes: int = VIDEO_MAX_PENDING_BYTES):
+        self._chunks = queue.Queue(maxsize=max_pending)
+        self._pending = b""
+        self._eof = False
+        self._ended = False
+        self.max_pending_bytes = max_pending_bytes
+        # 대기열에 있는 청크의 바이트 합. feed(이벤트 루프)와 read(디코더 스레드)가 함께 갱신합니다.
+        self._queued_bytes = 0
+        self._lock = threading.Lock()
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        청크를 대기열에 넣습니다. 청크 수나 바이트 상한을 넘으면 넣지 않고 False (호출한 쪽이 스트림을 끊음).
+        """
+        with self._lock:
+            if self._queued_bytes + len(chunk) > self.max_pending_bytes:
+                return False
+            try:
+                self._chunks.put_nowait(chunk)
+            except queue.Full:
+                return False
+            self._queued_bytes += len(chunk)
+            return True
+
+    def end(self):
+        # 이벤트 루프에서 호출되므로 막히지 않아야 하고, 가득 찬 경우에도 EOF 는 반드시 전달되어야
+        # 디코더 스레드가 끝납니다. 자리가 없으면 아직 읽지 않은 청크를 버립니다 (어차피 종료 중).
+        if self._ended:
+            return
+        self._ended = True
+        while True:
+            try:
+                self._chunks.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._chunks.get_nowait()
+                except queue.Empty:
+                    continue
+                if dropped is not None:
+                    with self._lock:
+                        self._queued_bytes -= len(dropped)
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._pending and not self._eof:
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                with self._lock:
+                    self._queued_bytes -= len(chunk)
+                self._pending = chunk
+        if size is None or size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+class VideoStreamDecoder:
+    """
+    디코더 스레드 하나와 이벤트 루프 쪽 "최신 프레임" 칸을 잇습니다.
+    """
+    def __init__(self, container_format: str | None = None, analysis_fps: float = VIDEO_ANALYSIS_FPS):
+        self.container_format = container_format
+        self.min_interval = 1.0 / analysis_fps if analysis_fps > 0 else 0.0
+        self.decoded = 0
+        self.dropped = 0
+        self.error = None
+        self._reader = _ChunkReader()
+        self._loop = asyncio.get_running_loop()
+        self._latest = None
+        self._finished = False
+        self._ready = asyncio.Event()
+        self._thread = threading.Thread(target=self._run, name="video-decode", daemon=True)
+        self._thread.start()
+
+    def feed(self, chunk: bytes) -> bool:
+        return self._reader.feed(chunk)
+
+    def end(self):
+        self._reader.end()
+
+    def _run(self):
+        try:
+            with av.open(self._reader, mode="r", format=self.container_format) as container:
+                stream = container.streams.video[0]
+                stream.codec_context.thread_count = VIDEO_DECODE_THREADS
+                anchor = None
+                last_stream_time = None
+                for frame in container.decode(stream):
+                    self.decoded += 1
+                    stream_time = frame.time
+                    if stream_time is None:
+                        stream_time = time.time() - (anchor or 0.0)
+                    # 분석 간격보다 촘촘한 프레임은 변환하지 않습니다 (디코드는 참조 프레임 때문에 모두 필요).
+                    if last_stream_time is not None and stream_time - last_stream_time < self.min_interval:
+                        continue
+                    last_stream_time = stream_time
+
+                    now = time.time()
+                    if anchor is None:
+                        anchor = now - stream_time
+                    frame_time = min(now, anchor + stream_time)
+                    image = frame.to_ndarray(format="bgr24")
+                    self._loop.call_soon_threadsafe(self._publish, image, frame_time)
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                self._loop.call_soon_threadsafe(self._finish)
+            except RuntimeError:
+                # 이벤트 루프가 이미 닫힘 (서버 종료 중)
+                pass
+
+    def _publish(self, image, frame_time: float):
+        if self._latest is not None:
+            self.dropped += 1
+        self._latest = (image, frame_time)
+        self._ready.set()
+
+    def _finish(self):
+        self._finished = True
+        self._ready.set()
+
+    async def next_frame(self):
+        """
+        가장 최근에 디코드된 (BGR 프레임, 시각). 스트림이 끝났고 남은 프레임이 없으면 None.
+        """
+        while self._latest is None and not self._finished:
+            self._ready.clear()
+            await self._ready.wait()
+        latest, self._latest = self._latest, None
+        return latest
+
+
+class VideoFrameSource:
+    """
+    /ws_video 세션의 프레임 공급자. 첫 호출 때 웹소켓 수신 태스크를 시작하고, 호출마다 최신 프레임 하나를 돌려줍니다.
+    스트림이 끝나면(연결 종료, 디코드 오류) WebSocketDisconnect 를 올려 /ws_stats 와 같은 종료 처리를 따릅니다.
+    """
+    def __init__(self, websocket: WebSocket, container_format: str | None):
+        self.websocket = websocket
+        self.container_format = container_format
+        self.decoder = None
+        self._receive_task = None
+
+    async def __call__(self, last_frame_time: float) -> list:
+        if self.decoder is None:
+            self.decoder = VideoStreamDecoder(self.container_format)
+            self._receive_task = asyncio.create_task(self._receive_chunks())
+
+        latest = await self.decoder.next_frame()
+        if latest is None:
+            if self.decoder.error is not None:
+                logger.warning("Video ingest: stream decode failed: %s", self.decoder.error, extra=HOT_PATH)
+            raise WebSocketDisconnect(code=1000)
+        image, frame_time = latest
+        return [(image, max(frame_time, last_frame_time))]
+
+    async def _receive_chunks(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                chunk = message.get("bytes")
+                if chunk and not self.decoder.feed(chunk):
+                    logger.warning("Video ingest: decoder fell behind, closing stream.", extra=HOT_PATH)
+                    break
+        except Exception as e:
+            logger.warning("Video ingest: receive error: %s", e, extra=HOT_PATH)
+        finally:
+            self.decoder.end()
+
+    def close(self):
+        if self._receive_task is not None:
+            self._receive_task.cancel()
+        if self.decoder is not None:
+            self.decoder.end()
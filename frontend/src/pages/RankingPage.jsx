@@ -3,6 +3,10 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 
+// 연결이 끊기면 (서버 재시작 등) 이 간격부터 두 배씩 늘려 최대 RECONNECT_MAX_DELAY_MS 까지 기다렸다 재접속합니다.
+const RECONNECT_DELAY_MS = 2000;
+const RECONNECT_MAX_DELAY_MS = 30000;
+
 function formatTime(totalSeconds) {
     const hours = Math.floor(totalSeconds / 3600);
     const minutes = Math.floor((totalSeconds % 3600) / 60);
@@ -16,23 +20,61 @@ function RankingPage() {
     const [error, setError] = useState(null);
 
     useEffect(() => {
-        const fetchRanking = async () => {
-            try {
-                const response = await fetch("http://localhost:8000/ranking/top10");
-                if (!response.ok) {
-                    throw new Error("서버에서 랭킹을 불러오지 못했습니다.");
+        // 접속 시 snapshot 1회, 이후 서버가 합쳐서 보내는 순위 변경분(delta)만 반영합니다.
+        // 재접속하면 서버가 snapshot 을 다시 보내므로 그 사이 놓친 delta 는 따로 맞출 필요가 없습니다.
+        let ws = null;
+        let disposed = false;
+        let reconnectTimer = null;
+        let reconnectDelay = RECONNECT_DELAY_MS;
+
+        const applyDelta = (prevRanking, changed, removed) => {
+            const byEmail = new Map(prevRanking.map(user => [user.user_email, user]));
+            removed.forEach(email => byEmail.delete(email));
+            changed.forEach(user => byEmail.set(user.user_email, user));
+            return [...byEmail.values()].sort((a, b) => a.rank - b.rank);
+        };
+
+        const connect = () => {
+            ws = new WebSocket("ws://localhost:8000/ws_ranking");
+
+            ws.onmessage = (event) => {
+                try {
+                    const data = JSON.parse(event.data);
+                    if (data.type === 'snapshot') {
+                        setRanking(data.ranking);
+                        setError(null);
+                        reconnectDelay = RECONNECT_DELAY_MS;
+                    } else if (data.type === 'delta') {
+                        setRanking(prev => applyDelta(prev, data.changed, data.removed));
+                    }
+                    setLoading(false);
+                } catch (e) {
+                    console.error("Failed to parse ranking message", e);
                 }
-                const data = await response.json();
-                setRanking(data);
-            } catch (err) {
-                console.error("Error fetching ranking:", err);
-                setError(err.message);
-            } finally {
+            };
+
+            ws.onerror = (err) => {
+                console.error("Error receiving ranking:", err);
+            };
+
+            ws.onclose = () => {
+                if (disposed) return;
+                setError("서버에서 랭킹을 불러오지 못했습니다. 다시 연결하는 중...");
                 setLoading(false);
-            }
+                reconnectTimer = setTimeout(connect, reconnectDelay);
+                reconnectDelay = Math.min(reconnectDelay * 2, RECONNECT_MAX_DELAY_MS);
+            };
         };
 
-        fetchRanking();
+        connect();
+
+        return () => {
+            disposed = true;
+            clearTimeout(reconnectTimer);
+            if (ws) {
+                ws.close();
+            }
+        };
     }, []);
 
     const renderRanking = () => {
@@ -11,6 +11,24 @@ ChartJS.register(ArcElement, Tooltip, Legend, Title);
 const API_URL = "http://localhost:8000";
 const WS_URL = "ws://localhost:8000";
 
+// 얼굴 등록 시 연속 촬영할 프레임 수와 간격
+const ENROLL_FRAME_COUNT = 5;
+const ENROLL_FRAME_INTERVAL_MS = 200;
+// 비정상 종료 후 /ws_stats 재접속까지 대기 시간
+const RECONNECT_DELAY_MS = 2000;
+// true 이면 지원되는 브라우저에서 JPEG 프레임 대신 연속 영상(WebM/VP8)을 /ws_video 로 보냅니다.
+// 서버가 영상 수신을 지원하지 않으면(1003) JPEG 방식(/ws_stats)으로 다시 연결합니다.
+// 영상 방식은 서버의 "control"(캡처 fps/해상도 조절)을 따르지 않아 과부하 시 부하를 줄일 수 없으므로 기본값은 꺼둡니다.
+const USE_VIDEO_STREAM = false;
+const VIDEO_MIME_TYPE = 'video/webm;codecs=vp8';
+const VIDEO_CHUNK_MS = 250;
+const VIDEO_BITS_PER_SECOND = 300000;
+
+const getAuthHeaders = async () => {
+  const { data: { session } } = await supabase.auth.getSession();
+  return session ? { Authorization: `Bearer ${session.access_token}` } : {};
+};
+
 const formatNonStudyTime = (seconds) => {
   if (!seconds) seconds = 0;
   const mins = Math.floor(seconds / 60);
@@ -54,6 +72,14 @@ function SoloStudyPage() {
   const wsRef = useRef(null); 
   const canvasRef = useRef(null); 
   const isWsOpenRef = useRef(false); 
+  // 서버가 보내는 캡처 목표치 (/ws_stats 응답의 control 필드)
+  const captureRef = useRef({ fps: 10, width: 640, height: 480, quality: 0.9 });
+  const lastSendTimeRef = useRef(0);
+  // 서버 세션 상한으로 거절되었을 때 재접속까지 기다릴 시간(초)과 타이머
+  const retryAfterRef = useRef(null);
+  const reconnectTimerRef = useRef(null);
+  const recorderRef = useRef(null);
+  const videoUnsupportedRef = useRef(false);
 
   const sendFrame = useCallback(() => {
     if (!isWsOpenRef.current || !videoRef.current || videoRef.current.readyState < 3) {
@@ -62,14 +88,20 @@ function SoloStudyPage() {
     
     if (!canvasRef.current) {
       canvasRef.current = document.createElement('canvas');
-      canvasRef.current.width = videoRef.current.videoWidth;
-      canvasRef.current.height = videoRef.current.videoHeight;
+    }
+    const { width, height, quality } = captureRef.current;
+    const targetWidth = Math.min(width, videoRef.current.videoWidth);
+    const targetHeight = Math.min(height, videoRef.current.videoHeight);
+    if (canvasRef.current.width !== targetWidth || canvasRef.current.height !== targetHeight) {
+      canvasRef.current.width = targetWidth;
+      canvasRef.current.height = targetHeight;
     }
     
     const ctx = canvasRef.current.getContext('2d');
     if (!ctx) return;
 
     ctx.drawImage(videoRef.current, 0, 0, canvasRef.current.width, canvasRef.current.height);
+    lastSendTimeRef.current = performance.now();
     
     canvasRef.current.toBlob(
       (blob) => {
@@ -80,13 +112,20 @@ function SoloStudyPage() {
         }
       },
       'image/jpeg',
-      0.9 
+      quality
     );
   }, []); 
 
+  const scheduleNextFrame = useCallback(() => {
+    const interval = 1000 / captureRef.current.fps;
+    const elapsed = performance.now() - lastSendTimeRef.current;
+    setTimeout(sendFrame, Math.max(0, interval - elapsed));
+  }, [sendFrame]);
+
 
   useEffect(() => {
     let streamCache = null; 
+    let disposed = false;
 
     const startWebcam = async () => {
       try {
@@ -106,17 +145,42 @@ function SoloStudyPage() {
       }
     };
 
+    const startVideoRecorder = (ws) => {
+      if (!streamCache || ws.readyState !== WebSocket.OPEN) return;
+      const recorder = new MediaRecorder(streamCache, {
+        mimeType: VIDEO_MIME_TYPE,
+        videoBitsPerSecond: VIDEO_BITS_PER_SECOND
+      });
+      recorder.ondataavailable = (event) => {
+        if (event.data.size > 0 && ws.readyState === WebSocket.OPEN) {
+          ws.send(event.data);
+        }
+      };
+      recorder.start(VIDEO_CHUNK_MS);
+      recorderRef.current = recorder;
+    };
+
+    const stopVideoRecorder = () => {
+      if (recorderRef.current && recorderRef.current.state !== 'inactive') {
+        recorderRef.current.stop();
+      }
+      recorderRef.current = null;
+    };
+
     const connectWebSocket = async () => {
       let token = null;
       let wsStatsUrl;
       const { data: { session }, error } = await supabase.auth.getSession();
+      const useVideo = USE_VIDEO_STREAM && !videoUnsupportedRef.current &&
+        typeof MediaRecorder !== 'undefined' && MediaRecorder.isTypeSupported(VIDEO_MIME_TYPE);
+      const endpoint = useVideo ? 'ws_video' : 'ws_stats';
 
       if (session) {
         token = session.access_token;
-        wsStatsUrl = `${WS_URL}/ws_stats?token=${token}`; 
+        wsStatsUrl = `${WS_URL}/${endpoint}?token=${token}`; 
         console.log("Connecting WebSocket with Supabase token...");
       } else {
-        wsStatsUrl = `${WS_URL}/ws_stats`; 
+        wsStatsUrl = `${WS_URL}/${endpoint}`; 
         console.log("Connecting WebSocket as anonymous...");
       }
 
@@ -126,12 +190,20 @@ function SoloStudyPage() {
       ws.onopen = () => {
         console.log("WebSocket connected");
         isWsOpenRef.current = true;
-        sendFrame(); 
+        if (useVideo) {
+          webcamReady.then(() => startVideoRecorder(ws));
+        } else {
+          sendFrame(); 
+        }
       };
       
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+          if (data.error === "server_busy") {
+            retryAfterRef.current = data.retry_after;
+            return;
+          }
           if (data.time) setStudyTime(data.time);
           if (data.status) setCurrentStatus(data.status); 
           if (data.stats) {
@@ -140,7 +212,12 @@ function SoloStudyPage() {
           if (data.total_study_seconds !== undefined) {
             setTotalStudySecondsNum(data.total_study_seconds);
           }
-          sendFrame();
+          if (!useVideo) {
+            if (data.control) {
+              captureRef.current = { ...captureRef.current, ...data.control };
+            }
+            scheduleNextFrame();
+          }
         } catch (e) { console.error("Failed to parse WebSocket message", e); }
       };
       
@@ -152,22 +229,38 @@ function SoloStudyPage() {
       ws.onclose = (event) => {
         console.log("WebSocket disconnected:", event.reason);
         isWsOpenRef.current = false; 
+        stopVideoRecorder();
+        if (disposed) return;
         
-        if (event.code === 1008) { 
+        if (useVideo && event.code === 1003) {
+          // 서버가 영상 수신을 지원하지 않음: JPEG 방식으로 바로 재연결
+          videoUnsupportedRef.current = true;
+          connectWebSocket();
+        } else if (event.code === 1008) { 
           setCurrentStatus("Auth Error");
           alert("인증이 만료되었습니다. 다시 로그인해주세요.");
           navigate('/');
+        } else if (event.code === 1013) {
+          // 서버가 가득 찬 경우: 안내받은 시간 후 재접속
+          setCurrentStatus("Server Busy");
+          const retryAfter = retryAfterRef.current ?? 30;
+          reconnectTimerRef.current = setTimeout(connectWebSocket, retryAfter * 1000);
         } else {
+          // 일시적인 끊김: 서버가 세션을 잠시 보관하므로 곧바로 재접속하면 공부 상태가 그대로 이어집니다.
           setCurrentStatus("Disconnected");
+          reconnectTimerRef.current = setTimeout(connectWebSocket, RECONNECT_DELAY_MS);
         }
       };
     };
 
-    startWebcam();
+    const webcamReady = startWebcam();
     connectWebSocket();
 
     return () => {
+      disposed = true;
       isWsOpenRef.current = false; 
+      clearTimeout(reconnectTimerRef.current);
+      stopVideoRecorder();
       if (wsRef.current) {
         wsRef.current.close();
       }
@@ -178,7 +271,7 @@ function SoloStudyPage() {
         videoRef.current.srcObject = null;
       }
     };
-  }, [navigate, sendFrame]); 
+  }, [navigate, sendFrame, scheduleNextFrame]); 
 
   useEffect(() => {
     const nonStudyStates = [
@@ -274,51 +367,57 @@ function SoloStudyPage() {
       return;
     }
     
-    setRegistrationStatus('등록 중... 현재 프레임 캡처 중...');
+    setRegistrationStatus('등록 중... 프레임 캡처 중...');
     
-    if (!canvasRef.current) {
-        canvasRef.current = document.createElement('canvas');
-        canvasRef.current.width = videoRef.current.videoWidth;
-        canvasRef.current.height = videoRef.current.videoHeight;
-    }
-    const ctx = canvasRef.current.getContext('2d');
+    // 얼굴 등록은 서버 캡처 제어와 무관하게 원본 해상도로, 짧게 여러 장 캡처합니다.
+    // 서버가 품질이 좋은 프레임들을 골라 평균 인코딩을 등록합니다.
+    const captureCanvas = document.createElement('canvas');
+    captureCanvas.width = videoRef.current.videoWidth;
+    captureCanvas.height = videoRef.current.videoHeight;
+    const ctx = captureCanvas.getContext('2d');
     if (!ctx) return;
-    ctx.drawImage(videoRef.current, 0, 0, canvasRef.current.width, canvasRef.current.height);
-    
-    canvasRef.current.toBlob(async (blob) => {
-      if (!blob) {
-        alert("❌ 프레임 캡처에 실패했습니다.");
-        setRegistrationStatus('캡처 실패');
-        return;
-      }
 
-      const formData = new FormData();
-      formData.append('file', blob, 'face.jpg');
+    const blobs = [];
+    for (let i = 0; i < ENROLL_FRAME_COUNT; i++) {
+      if (i > 0) await new Promise(resolve => setTimeout(resolve, ENROLL_FRAME_INTERVAL_MS));
+      ctx.drawImage(videoRef.current, 0, 0, captureCanvas.width, captureCanvas.height);
+      const blob = await new Promise(resolve => captureCanvas.toBlob(resolve, 'image/jpeg', 0.9));
+      if (blob) blobs.push(blob);
+    }
+
+    if (blobs.length === 0) {
+      alert("❌ 프레임 캡처에 실패했습니다.");
+      setRegistrationStatus('캡처 실패');
+      return;
+    }
+
+    const formData = new FormData();
+    blobs.forEach((blob, index) => formData.append('files', blob, `face-${index}.jpg`));
 
-      setRegistrationStatus('서버로 전송 중...');
+    setRegistrationStatus('서버로 전송 중...');
+    
+    try {
+      const response = await fetch(`${API_URL}/api/enroll-face`, { 
+        method: "POST",
+        headers: await getAuthHeaders(),
+        body: formData, 
+      });
       
-      try {
-        const response = await fetch(`${API_URL}/api/register-face`, { 
-          method: "POST",
-          body: formData, 
-        });
-        
-        const data = await response.json();
+      const data = await response.json();
 
-        if (response.ok && data.success) {
-          alert("✅ 얼굴 등록 성공!");
-          setRegistrationStatus('등록됨');
-        } else {
-          const errorMessage = data.detail || data.message || "알 수 없는 오류";
-          alert(`❌ 얼굴 등록 실패:\n\n${errorMessage}`);
-          setRegistrationStatus(`등록 실패: ${errorMessage}`);
-        }
-      } catch (err) {
-        console.error("얼굴 등록 API 호출 오류:", err);
-        alert("❌ 서버 연결에 실패했습니다.");
-        setRegistrationStatus('API 호출 오류');
+      if (response.ok && data.success) {
+        alert("✅ 얼굴 등록 성공!");
+        setRegistrationStatus('등록됨');
+      } else {
+        const errorMessage = data.detail || data.message || "알 수 없는 오류";
+        alert(`❌ 얼굴 등록 실패:\n\n${errorMessage}`);
+        setRegistrationStatus(`등록 실패: ${errorMessage}`);
       }
-    }, 'image/jpeg', 0.9); 
+    } catch (err) {
+      console.error("얼굴 등록 API 호출 오류:", err);
+      alert("❌ 서버 연결에 실패했습니다.");
+      setRegistrationStatus('API 호출 오류');
+    }
   };
 
   const handleDeleteFace = async () => {
@@ -329,6 +428,7 @@ function SoloStudyPage() {
     try {
       const response = await fetch(`${API_URL}/api/delete-face`, { 
         method: "DELETE",
+        headers: await getAuthHeaders(),
       });
       const data = await response.json();
       
@@ -355,7 +455,9 @@ function SoloStudyPage() {
           return;
         }
         try {
-          const response = await fetch(`${API_URL}/api/check-face-registered`); 
+          const response = await fetch(`${API_URL}/api/check-face-registered`, {
+            headers: await getAuthHeaders(),
+          }); 
           const data = await response.json();
           setRegistrationStatus(data.registered ? '등록됨' : '등록되지 않음');
         } catch (err) {